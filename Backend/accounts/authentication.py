@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from audio_marketplace.metrics import CACHE_REQUESTS
+from audio_marketplace.timing import span
+
+from .models import UserProfile
+
+
+class UserCache:
+    """
+    A bounded, thread-safe LRU of raw column values with a per-entry TTL.
+    Rows are stored rather than model instances so every request gets its
+    own objects and a view mutating ``request.user`` can't leak into others.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+PROFILE_FIELDS = [field.attname for field in UserProfile._meta.concrete_fields]
+
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+
+def _load(user_id):
+    user = User.objects.select_related('user_profile').get(**{api_settings.USER_ID_FIELD: user_id})
+    profile = getattr(user, 'user_profile', None)
+    return (
+        [getattr(user, name) for name in USER_FIELDS],
+        [getattr(profile, name) for name in PROFILE_FIELDS] if profile else None,
+    )
+
+
+def _build(user_values, profile_values):
+    user = User.from_db(router.db_for_read(User), USER_FIELDS, user_values)
+    profile = None
+    if profile_values is not None:
+        profile = UserProfile.from_db(router.db_for_read(UserProfile), PROFILE_FIELDS, profile_values)
+        UserProfile.user.field.set_cached_value(profile, user)
+    # Caching None makes hasattr(user, 'user_profile') false without a query
+    User.user_profile.related.set_cached_value(user, profile)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user and profile from ``user_cache``
+    instead of querying on every request. A miss costs one joined query.
+
+    Saves invalidate entries in this process (see accounts.signals); other
+    processes see changes once the TTL expires. ``request.user`` is
+    therefore a snapshot for reading: views that write the user reload it
+    with select_for_update() and save with update_fields.
+    """
+
+    def authenticate(self, request):
+        with span('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        key = str(user_id)
+        row = user_cache.get(key)
+        CACHE_REQUESTS.inc(cache='auth_user', result='miss' if row is None else 'hit')
+        if row is None:
+            try:
+                row = _load(user_id)
+            except User.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            user_cache.set(key, row)
+        user = _build(*row)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,49 @@
+import statistics
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import CachedJWTAuthentication, user_cache
+from audio_marketplace.benchmark import rolled_back
+
+
+class Command(BaseCommand):
+    help = 'Compare queries and latency per JWT-authenticated request with and without the user cache (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+
+    def _measure(self, client, url, count):
+        queries, timings = [], []
+        for _ in range(count):
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            assert response.status_code == 200, response.status_code
+        return statistics.mean(queries), statistics.median(timings)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = User.objects.create_user('bench-auth-user', 'bench-auth@example.com', 'bench-password')
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+            urls = ['/api/auth/profile/', '/api/orders/', '/api/products/']
+            for url in urls:
+                # Stock simplejwt lookup: one user query per request, plus the profile when read
+                with mock.patch.object(CachedJWTAuthentication, 'get_user', JWTAuthentication.get_user):
+                    before_queries, before_ms = self._measure(client, url, options['requests'])
+                user_cache.clear()
+                after_queries, after_ms = self._measure(client, url, options['requests'])
+                self.stdout.write(
+                    f'{url:22} before {before_queries:5.2f} queries {before_ms:6.2f} ms   '
+                    f'after {after_queries:5.2f} queries {after_ms:6.2f} ms'
+                )
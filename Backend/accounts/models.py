@@ -18,9 +18,11 @@ class UserProfile(models.Model):
         return f"{self.user.username}'s profile"
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-    else:
+    # Saves naming their columns only write those; the profile attached to
+    # a cached request.user may be older than the row
+    elif update_fields is None:
         if hasattr(instance, 'user_profile'):
             instance.user_profile.save()
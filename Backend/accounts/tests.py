@@ -1,3 +1,67 @@
-from django.test import TestCase
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from audio_marketplace.testing import QueryBudgetTestCase
+from .models import UserProfile
+
+
+class CachedJWTAuthenticationTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('listener', 'listener@example.com', 'old-password-123')
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_user_and_role_are_resolved_once(self):
+        # User joined with its profile on the first request, nothing after
+        self.assertGetWithinBudget(1, '/api/auth/profile/')
+        response = self.assertGetWithinBudget(0, '/api/auth/profile/')
+        self.assertEqual(response.data['role'], 'customer')
+
+    def test_profile_save_invalidates(self):
+        self.client.get('/api/auth/profile/')
+        self.user.user_profile.role = 'content_manager'
+        self.user.user_profile.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').data['role'], 'content_manager')
+
+    def test_deactivation_invalidates(self):
+        self.client.get('/api/auth/profile/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_password_change_invalidates(self):
+        self.client.get('/api/auth/profile/')
+        response = self.client.post('/api/auth/change-password/', {
+            'current_password': 'old-password-123', 'new_password': 'new-password-456',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertGetWithinBudget(1, '/api/auth/profile/')
+
+    def test_stale_cached_user_cannot_overwrite_newer_rows(self):
+        self.client.get('/api/auth/profile/')
+        # Another process changes the row; this process's cache isn't told
+        User.objects.filter(pk=self.user.pk).update(password=make_password('newer-password-789'))
+        UserProfile.objects.filter(user=self.user).update(role='content_manager')
+
+        response = self.client.patch('/api/auth/update-profile/', {'first_name': 'Ada'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Ada')
+        self.assertTrue(self.user.check_password('newer-password-789'))
+        self.assertEqual(UserProfile.objects.get(user=self.user).role, 'content_manager')
+
+    def test_password_change_checks_the_current_row(self):
+        self.client.get('/api/auth/profile/')
+        User.objects.filter(pk=self.user.pk).update(password=make_password('newer-password-789'))
+
+        # The cached hash would accept the old password
+        response = self.client.post('/api/auth/change-password/', {
+            'current_password': 'old-password-123', 'new_password': 'new-password-456',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newer-password-789'))
@@ -7,6 +7,8 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from .authentication import invalidate_user
 
 
 @api_view(['POST'])
@@ -105,13 +107,22 @@ def profile_view(request):
         'role': role
     })
 
+def _locked_user(request):
+    """
+    A fresh, locked copy of the authenticated user to write through.
+    ``request.user`` may come from the auth cache, and another process can
+    have changed the row (password, is_active) since it was cached.
+    """
+    return User.objects.select_for_update().get(pk=request.user.pk)
+
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def update_profile_view(request):
     """
     Update user profile information
     """
-    user = request.user
+    user = _locked_user(request)
     allowed_fields = ['username', 'email', 'bio', 'first_name', 'last_name']
     update_data = {}
     
@@ -139,7 +150,9 @@ def update_profile_view(request):
     for key, value in update_data.items():
         setattr(user, key, value)
     
-    user.save()
+    # Only the columns edited here, so the profile signal leaves the role alone too
+    columns = {field.attname for field in User._meta.concrete_fields}
+    user.save(update_fields=[key for key in update_data if key in columns])
     
     # Return updated user data
     return Response({
@@ -155,11 +168,12 @@ def update_profile_view(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def change_password_view(request):
     """
     Change user password
     """
-    user = request.user
+    user = _locked_user(request)
     
     # Get password data from request
     current_password = request.data.get('current_password')
@@ -190,7 +204,9 @@ def change_password_view(request):
     
     # Set new password
     user.set_password(new_password)
-    user.save()
+    user.save(update_fields=['password'])
+    # The save signal does this too; be explicit since old credentials must not linger
+    invalidate_user(user.pk)
     
     return Response(
         {"message": "Password updated successfully."},
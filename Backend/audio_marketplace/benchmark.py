@@ -0,0 +1,283 @@
+"""
+Synthetic dataset and in-process load driver for the bench_load command.
+
+``seed_dataset`` fills the database with users, categories, products that
+reference a small set of generated WAVs, reviews and orders, in batches
+and without signals; the search index, rating aggregates and blob
+reference counts are filled in bulk alongside. The data is deterministic
+for a given scale, so runs on different commits compare.
+
+``run_endpoint`` sends requests through the real URLconf from a pool of
+worker threads, each with its own test client and database connection.
+
+``rolled_back`` wraps the bench commands that seed their own rows, so they
+leave the database as they found it.
+"""
+import hashlib
+import io
+import math
+import os
+import random
+import statistics
+import struct
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from categories.models import Category
+from orders.models import Order, OrderItem
+from products.audio_headers import AudioHeaderParser
+from products.blobs import rebuild_blob_counts
+from products.metadata import METADATA_FIELDS, PRODUCT_AUDIO_FIELDS
+from products.models import AudioMetadata, Product
+from products.search import index_products
+from products.storage import place_file
+from reviews.models import Review
+from reviews.ratings import reconcile_ratings
+
+# Products per scale; users, reviews and orders are derived from it
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+USERNAME = 'bench-user-{}'
+# Distinct generated WAVs the products share
+AUDIO_FILES = 50
+GENRES = ['Ambient', 'Techno', 'House', 'Drum and Bass', 'Hip Hop', 'Cinematic', 'Jazz', 'Rock', 'Foley', 'Vocals']
+STYLES = ['Dark', 'Warm', 'Lofi', 'Punchy', 'Dreamy', 'Gritty', 'Bright', 'Deep', 'Vintage', 'Glitchy']
+KINDS = ['Loop', 'Pad', 'Kick', 'Bassline', 'Chord Stack', 'Texture', 'Riser', 'Break', 'Melody', 'One Shot']
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run the block in a transaction that is always rolled back
+    """
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def dataset_size(products):
+    return {
+        'users': max(products // 20, 10),
+        'categories': len(GENRES) * 3,
+        'products': products,
+        'reviews': products * 3 // 2,
+        'orders': products // 2,
+    }
+
+
+def _bulk_create(model, objects, batch_size):
+    """
+    bulk_create that leaves primary keys set on every backend. MySQL can't
+    return them from a multi-row INSERT, but the ids one statement assigns
+    ascend in row order, so they are read back by position.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objects, batch_size=batch_size)
+    created = []
+    for start in range(0, len(objects), batch_size):
+        batch = objects[start:start + batch_size]
+        before = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        model.objects.bulk_create(batch)
+        ids = model.objects.filter(pk__gt=before).order_by('id').values_list('id', flat=True)[:len(batch)]
+        for obj, pk in zip(batch, ids):
+            obj.pk = pk
+        created.extend(batch)
+    return created
+
+
+def generate_wav(seconds, frequency, sample_rate=8000):
+    """
+    A mono 16-bit sine tone, small enough to generate at seed time
+    """
+    frames = b''.join(
+        struct.pack('<h', int(12000 * math.sin(2 * math.pi * frequency * i / sample_rate)))
+        for i in range(int(seconds * sample_rate))
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(frames)
+    return buffer.getvalue()
+
+
+def write_audio_files(count):
+    """
+    Store ``count`` distinct WAVs under MEDIA_ROOT. Returns [(name, metadata)].
+    The same count always yields the same files and names.
+    """
+    files = []
+    for i in range(count):
+        data = generate_wav(seconds=1 + i % 5, frequency=220 + 20 * i)
+        parser = AudioHeaderParser()
+        parser.feed(data)
+        with tempfile.NamedTemporaryFile(dir=settings.MEDIA_ROOT, delete=False) as tmp:
+            tmp.write(data)
+        name = place_file(tmp.name, hashlib.sha256(data).hexdigest(), 'wav', settings.MEDIA_ROOT)
+        files.append((name, parser.result()))
+    return files
+
+
+def seed_dataset(products, audio_files=AUDIO_FILES, batch_size=5000, log=lambda message: None):
+    """
+    Seed a dataset with ``products`` products. Returns the row counts.
+    """
+    rng = random.Random(products)
+    sizes = dataset_size(products)
+    User = get_user_model()
+
+    log(f"users: {sizes['users']}")
+    users = _bulk_create(
+        User, [User(username=USERNAME.format(i), password='!') for i in range(sizes['users'])], batch_size
+    )
+    # One in ten users sells, everyone buys and reviews
+    sellers = users[:max(len(users) // 10, 1)]
+
+    categories = []
+    for genre in GENRES:
+        root = Category.objects.create(name=genre)
+        categories.append(root.name)
+        for style in STYLES[:2]:
+            categories.append(Category.objects.create(name=f'{style} {genre}', parent=root).name)
+
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    audio = write_audio_files(audio_files)
+
+    log(f'products: {products}')
+    for start in range(0, products, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, products)):
+            name, metadata = audio[rng.randrange(len(audio))]
+            rows.append((Product(
+                title=f'{rng.choice(STYLES)} {rng.choice(KINDS)} {i}',
+                description=f'{rng.choice(STYLES)} {rng.choice(GENRES).lower()} {rng.choice(KINDS).lower()}',
+                price=rng.choice([0, 2, 5, 9, 12, 19, 29, 49, 99, 149]),
+                category=rng.choice(categories),
+                owner=sellers[i % len(sellers)],
+                audio_file=name,
+                **{column: metadata.get(field) for field, column in PRODUCT_AUDIO_FIELDS.items()},
+            ), metadata))
+        with transaction.atomic():
+            batch = _bulk_create(Product, [product for product, _ in rows], batch_size)
+            AudioMetadata.objects.bulk_create(
+                AudioMetadata(product_id=product.pk, status='ready',
+                              **{field: metadata.get(field) for field in METADATA_FIELDS})
+                for product, (_, metadata) in zip(batch, rows)
+            )
+            index_products(batch, batch_size=batch_size)
+    rebuild_blob_counts(batch_size=batch_size)
+
+    product_ids = list(Product.objects.order_by('id').values_list('id', 'price'))
+
+    log(f"reviews: {sizes['reviews']}")
+    reviews = []
+    for i in range(sizes['reviews']):
+        product_id = product_ids[i % products][0]
+        # Distinct reviewers per product: the n-th review of a product comes from a different user
+        user = users[(i % products * 7 + i // products) % len(users)]
+        reviews.append(Review(product_id=product_id, user=user, rating=rng.randint(1, 5), comment='Bench review'))
+        if len(reviews) == batch_size:
+            Review.objects.bulk_create(reviews)
+            reviews = []
+    Review.objects.bulk_create(reviews)
+    reconcile_ratings(batch_size=batch_size)
+
+    log(f"orders: {sizes['orders']}")
+    for start in range(0, sizes['orders'], batch_size):
+        carts = []
+        for i in range(start, min(start + batch_size, sizes['orders'])):
+            cart = rng.sample(product_ids, rng.randint(1, 3))
+            carts.append((Order(
+                user=users[i % len(users)], status='completed', total_amount=sum(price for _, price in cart)
+            ), cart))
+        with transaction.atomic():
+            orders = _bulk_create(Order, [order for order, _ in carts], batch_size)
+            OrderItem.objects.bulk_create(
+                OrderItem(order_id=order.pk, product_id=product_id, quantity=1, price=price)
+                for order, (_, cart) in zip(orders, carts) for product_id, price in cart
+            )
+    return sizes
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _server_timing(response, name):
+    """
+    Milliseconds ServerTimingMiddleware reported for ``name``; it times SQL
+    more finely than the query log does
+    """
+    for metric in response.get('Server-Timing', '').split(','):
+        metric_name, *params = metric.strip().split(';')
+        if metric_name == name:
+            for param in params:
+                if param.startswith('dur='):
+                    return float(param[4:])
+    return 0.0
+
+
+def run_endpoint(make_request, requests, workers):
+    """
+    Send ``requests`` requests built by ``make_request(i) -> (url, headers)``
+    from ``workers`` threads. Returns throughput, latency percentiles,
+    queries and SQL time per request and the mean response size.
+    """
+    def work(indexes):
+        client = Client(HTTP_HOST='localhost')
+        samples = []
+        try:
+            for i in indexes:
+                url, headers = make_request(i)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(url, **headers)
+                    elapsed = time.perf_counter() - started
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                samples.append((elapsed * 1000, len(queries), response.status_code, _server_timing(response, 'db'), size))
+        finally:
+            connection.close()
+        return samples
+
+    shares = [range(worker, requests, workers) for worker in range(workers)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        samples = [sample for share in executor.map(work, shares) for sample in share]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(sample[0] for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2] >= 400),
+        'rps': round(len(samples) / wall, 1),
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+        'queries_per_request': round(statistics.fmean(sample[1] for sample in samples), 2),
+        'sql_ms_per_request': round(statistics.fmean(sample[3] for sample in samples), 2),
+        'bytes_per_response': round(statistics.fmean(sample[4] for sample in samples)),
+    }
@@ -0,0 +1,161 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from .metrics import CACHE_REQUESTS
+
+GENERATION_KEY = 'respcache:gen:{}'
+STATS_KEY = 'respcache:{}:{}'
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def bump_generation(*namespaces):
+    """
+    Invalidate every cached response that depends on ``namespaces``. Runs
+    after the current transaction commits so a concurrent request can't
+    re-cache data from before the write under the new generation.
+    """
+    def bump():
+        cache = get_response_cache()
+        for namespace in namespaces:
+            key = GENERATION_KEY.format(namespace)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+    transaction.on_commit(bump)
+
+
+def get_generation(*namespaces):
+    """
+    Current generation of ``namespaces`` as a string for use in cache keys
+    """
+    generation_keys = [GENERATION_KEY.format(namespace) for namespace in namespaces]
+    generations = get_response_cache().get_many(generation_keys)
+    return '.'.join(str(generations.get(key, 0)) for key in generation_keys)
+
+
+def record(view_name, outcome):
+    CACHE_REQUESTS.inc(cache='response', result=outcome)
+    cache = get_response_cache()
+    key = STATS_KEY.format(outcome, view_name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def response_cache_stats(view_names):
+    """
+    Return {view_name: {'hits': n, 'misses': n, 'hit_ratio': r}}
+    """
+    cache = get_response_cache()
+    keys = [STATS_KEY.format(outcome, name) for name in view_names for outcome in ('hit', 'miss')]
+    counts = cache.get_many(keys)
+    stats = {}
+    for name in view_names:
+        hits = counts.get(STATS_KEY.format('hit', name), 0)
+        misses = counts.get(STATS_KEY.format('miss', name), 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return stats
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return etag in [tag.strip() for tag in header.split(',')] or header.strip() == '*'
+
+
+class ResponseCacheMixin:
+    """
+    Caches rendered responses of read-only actions for anonymous requests.
+
+    ``response_cache_namespaces`` maps an action to the namespaces whose
+    generation counters are part of the key; model signals bump those
+    counters, so stale entries are never read again and simply expire.
+    Cached and fresh responses carry a strong ETag and honour
+    If-None-Match with a 304. Only JSON is cached: bodies hold absolute
+    URLs, so the key includes scheme and host, and the browsable API
+    embeds a per-user CSRF token.
+    """
+    response_cache_namespaces = {}
+
+    def response_cache_name(self):
+        return f'{self.basename}-{self.action}'
+
+    def response_cache_key(self, request, namespaces):
+        params = urlencode(sorted(
+            (key, value) for key in request.query_params for value in request.query_params.getlist(key)
+        ))
+        fingerprint = hashlib.sha256(
+            f'{request.scheme}://{request.get_host()}{request.path}?{params}'.encode()
+        ).hexdigest()
+        return f'respcache:{self.response_cache_name()}:{get_generation(*namespaces)}:{fingerprint}'
+
+    def cached_response(self, request, build, *args, **kwargs):
+        namespaces = self.response_cache_namespaces.get(self.action)
+        self._response_cache_key = None
+        if (not namespaces or request.method != 'GET' or request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return build(request, *args, **kwargs)
+
+        key = self.response_cache_key(request, namespaces)
+        entry = get_response_cache().get(key)
+        if entry is None:
+            record(self.response_cache_name(), 'miss')
+            self._response_cache_key = key
+            return build(request, *args, **kwargs)
+
+        record(self.response_cache_name(), 'hit')
+        if _etag_matches(request, entry['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        if entry['vary']:
+            patch_vary_headers(response, entry['vary'].split(', '))
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_response_cache_key', None)
+        if not key or not isinstance(response, Response) or response.status_code != 200:
+            return response
+
+        response.render()
+        etag = f'"{hashlib.sha256(response.content).hexdigest()[:32]}"'
+        get_response_cache().set(
+            key,
+            {
+                'content': response.content, 'content_type': response['Content-Type'],
+                'etag': etag, 'vary': response.get('Vary', ''),
+            },
+            getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 600),
+        )
+        if _etag_matches(request, etag):
+            not_modified = HttpResponseNotModified()
+            not_modified['ETag'] = etag
+            if response.has_header('Vary'):
+                not_modified['Vary'] = response['Vary']
+            return not_modified
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
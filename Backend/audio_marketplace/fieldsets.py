@@ -0,0 +1,130 @@
+"""
+Sparse fieldsets for read endpoints: ``?fields=`` and ``?expand=``.
+
+``?fields=id,title,price`` renders only the named fields; a dotted name
+trims a nested serializer (``fields=id,items.quantity``). Nested fields a
+viewset lists in ``expandable_fields`` are left out of sparse responses
+unless they are named in ``fields`` or ``expand``
+(``expand=items.product_details``). Without either parameter responses
+are unchanged.
+
+Viewsets build their querysets from ``read_serializer()``, the trimmed
+serializer, so deferred columns and skipped joins and prefetches follow
+what is actually rendered.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def parse_fields(value):
+    """
+    ``'id,items.quantity'`` -> ``{'id': {}, 'items': {'quantity': {}}}``;
+    an empty subtree means every field below it
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def parse_expand(value):
+    """
+    Dotted paths to expand, each with its parents: ``'items.product_details'``
+    also expands ``items``
+    """
+    expand = set()
+    for path in filter(None, (path.strip() for path in value.split(','))):
+        parts = path.split('.')
+        expand.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return expand
+
+
+def _nested(field):
+    """
+    The serializer behind a nested field, or None for plain fields
+    """
+    field = field.child if isinstance(field, ListSerializer) else field
+    return field if isinstance(field, BaseSerializer) else None
+
+
+def trim_serializer(serializer, fields, expand, expandable, prefix=''):
+    """
+    Drop the fields of ``serializer`` (or of a many=True serializer's
+    child) that a sparse response leaves out
+    """
+    serializer = _nested(serializer)
+    unknown = set(fields or ()) - set(serializer.fields)
+    if unknown:
+        raise ValidationError({'fields': f"Unknown field: {prefix}{sorted(unknown)[0]}"})
+
+    for name, field in list(serializer.fields.items()):
+        path = prefix + name
+        requested = name in (fields or ()) or path in expand
+        if (fields and not requested) or (path in expandable and not requested):
+            serializer.fields.pop(name)
+        elif _nested(field) is not None:
+            trim_serializer(field, (fields or {}).get(name), expand, expandable, path + '.')
+
+
+def read_columns(serializer, field_columns=None):
+    """
+    ``only()`` columns and ``select_related`` relations behind the fields
+    ``serializer`` renders. Nested many=True serializers are left to the
+    caller to prefetch; ``field_columns`` names the columns of fields whose
+    source isn't one.
+    """
+    field_columns = field_columns or {}
+    columns, related = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only or isinstance(field, ListSerializer):
+            continue
+        if name in field_columns:
+            columns += field_columns[name]
+            continue
+        source = field.source.replace('.', '__')
+        if isinstance(field, BaseSerializer):
+            related.append(source)
+            columns.append(f'{source}__{field.Meta.model._meta.pk.name}')
+            columns += [f'{source}__{child.source}' for child in field.fields.values() if not child.write_only]
+        else:
+            columns.append(source)
+            if '__' in source:
+                related.append(source.rsplit('__', 1)[0])
+    return columns, related
+
+
+class SparseFieldsMixin:
+    """
+    ``?fields=`` / ``?expand=`` for a viewset's GET responses
+    """
+    # Dotted paths of nested fields that sparse responses only include on request
+    expandable_fields = ()
+
+    def sparse_fields(self):
+        """
+        (fields tree or None, expand paths) for a sparse GET, else None
+        """
+        params = self.request.query_params
+        if self.request.method != 'GET' or ('fields' not in params and 'expand' not in params):
+            return None
+        expand = parse_expand(params.get('expand', ''))
+        unknown = expand - set(self.expandable_fields)
+        if unknown:
+            raise ValidationError({'expand': f"Can't expand {sorted(unknown)[0]}"})
+        return parse_fields(params['fields']) if 'fields' in params else None, expand
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        sparse = self.sparse_fields()
+        if sparse is not None:
+            trim_serializer(serializer, *sparse, self.expandable_fields)
+        return serializer
+
+    def read_serializer(self):
+        """
+        The serializer of this response with sparse fields applied, for
+        deciding what to select
+        """
+        return self.get_serializer()
@@ -0,0 +1,40 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audio_marketplace.profiling import list_profiles, profile_dir
+
+
+class Command(BaseCommand):
+    help = 'Merge saved request profiles (see audio_marketplace.profiling) and print the hottest functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Only profiles of this view, e.g. product-list or category-tree')
+        parser.add_argument('--last', type=int, default=50, help='Merge this many of the newest profiles')
+        parser.add_argument('--sort', choices=['tottime', 'cumulative', 'ncalls'], default='tottime')
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--output', help='Also write the merged stats to this .prof file')
+
+    def handle(self, *args, **options):
+        records = list_profiles(view=options['view'], limit=options['last'])
+        paths = [os.path.join(profile_dir(), f"{record['name']}.prof") for record in records]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            raise CommandError('No saved profiles match')
+
+        stream = io.StringIO()
+        stats = pstats.Stats(*paths, stream=stream)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['top'])
+
+        durations = sorted(record['duration_ms'] for record in records)
+        views = sorted({record['view'] for record in records})
+        self.stdout.write(
+            f'{len(paths)} profiles of {", ".join(views)}; '
+            f'median request {durations[len(durations) // 2]:.1f} ms, slowest {durations[-1]:.1f} ms'
+        )
+        self.stdout.write(stream.getvalue())
+        if options['output']:
+            stats.dump_stats(options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Merged stats written to {options["output"]}'))
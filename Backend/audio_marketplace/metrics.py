@@ -0,0 +1,313 @@
+"""
+Process-safe metrics in the Prometheus text exposition format.
+
+Each process accumulates counters and histograms in memory and writes
+them to its own file in ``METRICS_DIR`` at most once per
+``METRICS_FLUSH_INTERVAL`` seconds and at exit. ``/metrics`` sums every
+file in the directory, so all gunicorn/uvicorn workers and management
+commands (such as the metadata extraction worker) report together. Files
+of processes that have exited are folded into one archive on scrape, so
+counters survive worker restarts without files piling up.
+
+Without ``METRICS_DIR`` values stay in memory and only the serving
+process is reported, which suits runserver and tests.
+
+``/metrics`` answers scrapers from ``METRICS_ALLOWED_IPS`` or bearing
+``METRICS_TOKEN``; anyone else gets a 403.
+"""
+import atexit
+import fcntl
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def key(self, labels):
+        return tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        store.add(self.name, self.key(labels), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        store.observe(self.name, self.key(labels), self.buckets, value)
+
+
+REGISTRY = {}
+
+
+class Store:
+    """
+    In-memory values of this process: {name: {label values: value}}. A
+    counter's value is a number; a histogram's is [bucket counts..., +Inf
+    count, sum], buckets not cumulative.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.values = {}
+        self.file_name = f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+        self.flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        # A forked worker starts over instead of re-reporting its parent's values
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def add(self, name, key, amount):
+        with self._lock:
+            self._check_fork()
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        self.maybe_flush()
+
+    def observe(self, name, key, buckets, value):
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self._lock:
+            self._check_fork()
+            series = self.values.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                name: [[list(key), value if not isinstance(value, list) else list(value)]
+                       for key, value in series.items()]
+                for name, series in self.values.items()
+            }
+
+    def maybe_flush(self):
+        if not getattr(settings, 'METRICS_DIR', None):
+            return
+        if time.monotonic() - self.flushed_at >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+            self.flush()
+
+    def flush(self):
+        directory = metrics_dir()
+        if not directory:
+            return
+        self.flushed_at = time.monotonic()
+        data = {'pid': os.getpid(), 'values': self.snapshot()}
+        _write_json(os.path.join(directory, self.file_name), data)
+
+
+store = Store()
+atexit.register(store.flush)
+
+
+def metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _write_json(path, data):
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), delete=False, suffix='.tmp') as f:
+        json.dump(data, f)
+    os.replace(f.name, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _merge(total, values):
+    for name, series in values.items():
+        merged = total.setdefault(name, {})
+        for key, value in series:
+            key = tuple(key)
+            if isinstance(value, list):
+                current = merged.get(key)
+                merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+
+def collect():
+    """
+    Values summed over every process: {name: {label values: value}}
+    """
+    directory = metrics_dir()
+    if not directory:
+        total = {}
+        _merge(total, store.snapshot())
+        return total
+
+    store.flush()
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = _read_json(archive_path) or {'values': {}}
+        archived = {}
+        _merge(archived, archive['values'])
+
+        total = {}
+        _merge(total, archive['values'])
+        dead = []
+        for file_name in os.listdir(directory):
+            if not file_name.endswith('.json') or file_name == ARCHIVE_FILE:
+                continue
+            path = os.path.join(directory, file_name)
+            data = _read_json(path)
+            if data is None:
+                continue
+            _merge(total, data['values'])
+            if not _alive(data['pid']):
+                _merge(archived, data['values'])
+                dead.append(path)
+
+        # Fold exited processes into the archive so their files don't accumulate
+        if dead:
+            _write_json(archive_path, {'values': {
+                name: [[list(key), value] for key, value in series.items()] for name, series in archived.items()
+            }})
+            for path in dead:
+                os.unlink(path)
+    return total
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition():
+    """
+    Render every registered metric in the text exposition format
+    """
+    values = collect()
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(values.get(name, {}).items()):
+            pairs = list(zip(metric.labelnames, key))
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(pairs)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*metric.buckets, float('inf')], value[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{name}_bucket{_labels([*pairs, ("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(pairs)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(pairs)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def view_label(request):
+    """
+    ``basename-action`` for DRF viewset routes (product-list,
+    order-create), the URL name otherwise. Unrouted requests share one
+    label so 404 scans can't grow the series count.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    actions = getattr(match.func, 'actions', None)
+    basename = getattr(match.func, 'initkwargs', {}).get('basename')
+    if actions and basename:
+        return f"{basename}-{actions.get(request.method.lower(), request.method.lower())}"
+    return match.url_name or 'unnamed'
+
+
+def observe_request(request, response, seconds, queries, sql_seconds):
+    view = view_label(request)
+    REQUEST_LATENCY.observe(seconds, view=view, method=request.method)
+    REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+    DB_QUERIES.inc(queries, view=view)
+    DB_SECONDS.inc(sql_seconds, view=view)
+
+
+def _scrape_allowed(request):
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    # Checked before collect(), which locks and reads every process's file
+    if not _scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by DRF view (basename-action) and method', ['view', 'method']
+)
+REQUESTS = Counter('http_requests_total', 'Requests by view, method and status', ['view', 'method', 'status'])
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed while serving requests, by view', ['view'])
+DB_SECONDS = Counter('db_query_seconds_total', 'Time spent in SQL while serving requests, by view', ['view'])
+METADATA_EXTRACTIONS = Counter(
+    'audio_metadata_extractions_total', 'Background metadata extractions by result', ['result']
+)
+UPLOAD_BYTES = Counter('audio_upload_bytes_total', 'Audio bytes received, by upload path', ['path'])
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result'])
@@ -0,0 +1,166 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the full ordering tuple, e.g. (created_at, id).
+    Each page is a range scan on the backing index: no COUNT(*) and no
+    OFFSET, so page 10,000 costs the same as page 1.
+
+    The ordering is taken from the queryset and must end in a unique
+    column. Annotations can take part (search results are keyed on
+    (search_score, id)); an unordered queryset falls back to ``ordering``.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_ordering_message = 'This ordering does not support cursor pagination.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.fields = self.get_ordering(queryset)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        values, reverse = self.decode_cursor(encoded, queryset) if encoded else (None, False)
+
+        order_by = [self._flip(field) for field in self.fields] if reverse else list(self.fields)
+        queryset = queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self.after(order_by, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_values = self.position(results[-1]) if results and (has_more or reverse) else None
+        self.previous_values = self.position(results[0]) if results and (values is not None and (not reverse or has_more)) else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_values))
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_values, reverse=True)
+        )
+
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by
+        if not ordering:
+            return self.ordering
+        # Replacing an expression ordering would silently reorder the results
+        if not all(isinstance(field, str) for field in ordering) or ordering[-1].lstrip('-') not in ('id', 'pk'):
+            raise ValidationError({'pagination': self.unsupported_ordering_message})
+        return tuple(ordering)
+
+    def position(self, instance):
+        # Rows of a values() queryset are dicts
+        if isinstance(instance, dict):
+            return [instance['id' if field.lstrip('-') == 'pk' else field.lstrip('-')] for field in self.fields]
+        return [getattr(instance, field.lstrip('-')) for field in self.fields]
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(order_by, values):
+        """
+        Build the row-value comparison (a, b) > (x, y) as an OR of prefixes.
+        The redundant a >= x bound in front gives MySQL and SQLite a range
+        to seek to on the leading index column.
+        """
+        condition = Q()
+        for i, field in enumerate(order_by):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            prefix = {order_by[j].lstrip('-'): values[j] for j in range(i)}
+            condition |= Q(**prefix, **{f'{name}__{lookup}': values[i]})
+
+        leading = order_by[0]
+        bound = 'lte' if leading.startswith('-') else 'gte'
+        return Q(**{f'{leading.lstrip("-")}__{bound}': values[0]}) & condition
+
+    def encode_cursor(self, values, reverse=False):
+        payload = {'v': [str(value) for value in values], 'r': int(reverse)}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    @staticmethod
+    def _output_field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field('id' if name == 'pk' else name)
+
+    def decode_cursor(self, encoded, queryset):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            raw_values = payload['v']
+            if len(raw_values) != len(self.fields):
+                raise ValueError
+            values = [
+                self._output_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.fields, raw_values)
+            ]
+            return values, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, for existing clients; switches to
+    keyset pagination when the request carries ``?cursor=`` or
+    ``?pagination=cursor``.
+    """
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            KeysetPagination.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = KeysetPagination() if self.use_cursor(request) else None
+        if self.keyset:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.keyset:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
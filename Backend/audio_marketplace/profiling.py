@@ -0,0 +1,181 @@
+"""
+Opt-in cProfile runs of live requests.
+
+A request is profiled when a staff user sends ``X-Profile: 1`` or, for
+paths under ``PROFILE_SAMPLE_PATHS``, with probability
+``PROFILE_SAMPLE_RATE``. Each run is saved to ``PROFILE_DIR`` as a pstats
+file plus a JSON sidecar describing the request, and only the newest
+``PROFILE_KEEP`` runs are kept. Admins list and download them through
+/api/profiles/; ``manage.py aggregate_profiles`` merges them into the
+hottest functions.
+
+Requests that aren't profiled pay for one header lookup and, when
+sampling is on, one random number.
+"""
+import cProfile
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.authentication import CachedJWTAuthentication
+from .metrics import view_label
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+NAME_RE = re.compile(r'^[\w.-]+$')
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate with a JWT, which DRF only checks inside the view
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def should_profile(request):
+    if request.META.get(PROFILE_HEADER) == '1':
+        return 'header' if _is_staff(request) else None
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        paths = getattr(settings, 'PROFILE_SAMPLE_PATHS', None)
+        if not paths or request.path.startswith(tuple(paths)):
+            return 'sample'
+    return None
+
+
+def save_profile(profiler, request, response, seconds, trigger):
+    """
+    Write the run to PROFILE_DIR and drop runs beyond PROFILE_KEEP.
+    Returns the profile's name.
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    view = view_label(request)
+    # Names sort by time, so the oldest are pruned first and listings read newest first
+    slug = re.sub(r'[^\w-]', '_', view)
+    name = f'{timezone.now():%Y%m%dT%H%M%S%f}-{slug}-{uuid.uuid4().hex[:8]}'
+    profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+    with open(os.path.join(directory, f'{name}.json'), 'w') as f:
+        json.dump({
+            'name': name,
+            'view': view,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 2),
+            'trigger': trigger,
+            'created_at': timezone.now().isoformat(),
+        }, f)
+
+    stems = sorted(file_name[:-5] for file_name in os.listdir(directory) if file_name.endswith('.prof'))
+    for stale in stems[:-getattr(settings, 'PROFILE_KEEP', 200)]:
+        for ext in ('.prof', '.json'):
+            try:
+                os.unlink(os.path.join(directory, stale + ext))
+            except FileNotFoundError:
+                pass
+    return name
+
+
+def list_profiles(view=None, limit=None):
+    """
+    Sidecar records of saved runs, newest first
+    """
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    records = []
+    for file_name in sorted(os.listdir(directory), reverse=True):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if view and record['view'] != view:
+            continue
+        records.append(record)
+        if limit and len(records) >= limit:
+            break
+    return records
+
+
+def profile_path(name):
+    if not NAME_RE.match(name):
+        return None
+    path = os.path.join(profile_dir(), f'{name}.prof')
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = should_profile(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        name = save_profile(profiler, request, response, time.perf_counter() - started, trigger)
+        # Only the staff member who asked learns the name; sampled runs stay silent
+        if trigger == 'header':
+            response['X-Profile-Name'] = name
+        return response
+
+
+class ProfileListView(APIView):
+    """
+    Recent profiles, newest first; ?view=product-list narrows them down
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            limit = 50
+        return Response(list_profiles(view=request.query_params.get('view'), limit=limit))
+
+
+class ProfileDownloadView(APIView):
+    """
+    The pstats file of one profile, for snakeviz or ``python -m pstats``
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, name):
+        path = profile_path(name)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.prof',
+                            content_type='application/octet-stream')
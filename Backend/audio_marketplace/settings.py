@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 
     
     # My-apps
+    # Project-wide management commands (aggregate_profiles)
+    'audio_marketplace',
     'accounts',
     'products',
     'categories',
@@ -53,12 +55,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total covers the rest of the stack
+    'audio_marketplace.timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'audio_marketplace.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -147,7 +152,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -164,6 +169,11 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Resolved JWT users are kept in a per-process LRU (accounts.authentication).
+# Saves invalidate the local entry; the TTL bounds staleness in other processes.
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TTL = 60
+
 # CORS settings
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
@@ -173,4 +183,81 @@ CORS_ALLOWED_ORIGINS = [
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
-]
\ No newline at end of file
+]
+# Cache backend. Local memory is per process; point this at Redis or
+# Memcached in production so all workers share cached responses and
+# invalidation generations.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a cached anonymous catalog response is kept (see
+# audio_marketplace.cache); writes invalidate entries before that.
+RESPONSE_CACHE_TIMEOUT = 600
+
+# Seconds computed facet counts (/api/products/facets/) are kept per filter set
+FACET_CACHE_TIMEOUT = 300
+
+# Seconds the category tree is cached; writes invalidate it before that
+CATEGORY_TREE_CACHE_TIMEOUT = 3600
+
+# Audio metadata extraction
+# When False, Product saves only queue AudioMetadata rows and
+# `manage.py extract_audio_metadata` processes them. Set to True (e.g. in
+# tests) to extract in-process right after the saving transaction commits.
+AUDIO_METADATA_EAGER = False
+
+# Largest accepted audio upload, enforced while the upload streams in
+MAX_AUDIO_UPLOAD_SIZE = 50 * 1024 * 1024
+
+# Resumable chunked uploads (/api/uploads/) for lossless masters: largest
+# file, default and largest chunk size, and how long an idle session lives
+# before `manage.py gc_upload_sessions` removes it
+MAX_AUDIO_MASTER_SIZE = 2 * 1024 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+# Waveform decoders by file format, as dotted paths to callables that take a
+# file path and yield (frames, channels) float32 arrays. Merged over
+# products.waveform.DEFAULT_DECODERS (native WAV, ffmpeg for the rest).
+WAVEFORM_DECODERS = {}
+
+# Request instrumentation (audio_marketplace.timing). Every response gets a
+# Server-Timing header; the JSON log line per request is written at INFO,
+# or at WARNING when one SQL statement ran N_PLUS_ONE_THRESHOLD times or
+# more. Lower the logger to INFO to log every request.
+N_PLUS_ONE_THRESHOLD = 10
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'audio_marketplace.timing': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Metrics served at /metrics (audio_marketplace.metrics). Every process
+# writes its values to its own file in METRICS_DIR, at most every
+# METRICS_FLUSH_INTERVAL seconds, and /metrics sums the files. Set it to a
+# directory shared by all workers on the host, emptied on deploy; when
+# None only the process answering the scrape is reported.
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 1.0
+# /metrics is served to these addresses, or to requests with
+# "Authorization: Bearer <METRICS_TOKEN>"; everyone else gets a 403
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = None
+
+# On-demand profiling (audio_marketplace.profiling). Staff requests with
+# "X-Profile: 1" are always profiled; other requests under
+# PROFILE_SAMPLE_PATHS (None for every path) with probability
+# PROFILE_SAMPLE_RATE. The newest PROFILE_KEEP runs stay in PROFILE_DIR.
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_SAMPLE_PATHS = None
+PROFILE_KEEP = 200
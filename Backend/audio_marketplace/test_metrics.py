@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from .metrics import CACHE_REQUESTS, REQUEST_LATENCY, collect, store
+
+
+def _count_in_child():
+    CACHE_REQUESTS.inc(5, cache='test', result='hit')
+    store.flush()
+
+
+class MetricsTests(TestCase):
+    def test_request_latency_is_labelled_by_viewset_action(self):
+        self.client.get('/api/products/')
+        self.client.get('/api/categories/tree/')
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="product-list",method="GET",le="+Inf"}', body)
+        self.assertIn('http_request_duration_seconds_count{view="category-tree",method="GET"}', body)
+        self.assertIn('db_queries_total{view="product-list"}', body)
+        self.assertIn('cache_requests_total{cache="response",result="miss"}', body)
+
+    def test_scrapes_are_limited_to_allowed_ips_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            for header, status in [('Bearer scrape-secret', 200), ('Bearer wrong', 403), ('', 403)]:
+                with self.subTest(header=header):
+                    response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION=header)
+                    self.assertEqual(response.status_code, status)
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.9']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 200)
+
+    def test_histogram_buckets_are_cumulative(self):
+        REQUEST_LATENCY.observe(0.02, view='test-histogram', method='GET')
+        REQUEST_LATENCY.observe(3, view='test-histogram', method='GET')
+        counts = collect()['http_request_duration_seconds'][('test-histogram', 'GET')]
+        self.assertEqual(sum(counts[:-1]), 2)
+        self.assertAlmostEqual(counts[-1], 3.02)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{view="test-histogram",method="GET",le="0.025"} 1', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="test-histogram",method="GET",le="5.0"} 2', body)
+
+    def test_values_from_other_processes_are_summed_and_archived(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            for _ in range(2):
+                child = multiprocessing.get_context('fork').Process(target=_count_in_child)
+                child.start()
+                child.join()
+
+            self.assertEqual(collect()['cache_requests_total'][('test', 'hit')], 10)
+            # Both children exited, so their files were folded into the archive
+            files = {name for name in os.listdir(directory) if not name.startswith('.')}
+            self.assertEqual(files, {'archive.json', store.file_name})
+            self.assertEqual(collect()['cache_requests_total'][('test', 'hit')], 10)
@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .profiling import list_profiles
+
+
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(PROFILE_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.staff = User.objects.create_user('ops', 'ops@example.com', 'pass', is_staff=True)
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def test_staff_header_profiles_the_request(self):
+        response = self.client.get('/api/categories/tree/', HTTP_X_PROFILE='1', **self.bearer(self.staff))
+        self.assertIn('X-Profile-Name', response)
+        [record] = list_profiles()
+        self.assertEqual((record['view'], record['trigger']), ('category-tree', 'header'))
+
+        listing = self.client.get('/api/profiles/', **self.bearer(self.staff))
+        self.assertEqual(listing.data[0]['name'], response['X-Profile-Name'])
+        download = self.client.get(f"/api/profiles/{record['name']}/", **self.bearer(self.staff))
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+
+        out = StringIO()
+        call_command('aggregate_profiles', '--view', 'category-tree', stdout=out)
+        self.assertIn('1 profiles of category-tree', out.getvalue())
+
+    def test_header_from_non_staff_is_ignored(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pass')
+        response = self.client.get('/api/categories/tree/', HTTP_X_PROFILE='1', **self.bearer(user))
+        self.assertNotIn('X-Profile-Name', response)
+        self.assertEqual(self.client.get('/api/profiles/', **self.bearer(user)).status_code, 403)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_SAMPLE_PATHS=['/api/products/'], PROFILE_KEEP=2)
+    def test_sampling_keeps_the_newest_runs(self):
+        for _ in range(3):
+            self.client.get('/api/products/')
+        self.client.get('/api/categories/tree/')
+        records = list_profiles()
+        self.assertEqual(len(records), 2)
+        # Anonymous clients aren't told they were sampled
+        self.assertNotIn('X-Profile-Name', self.client.get('/api/products/'))
+        self.assertEqual({record['view'] for record in records}, {'product-list'})
@@ -0,0 +1,95 @@
+"""
+EXPLAIN the queries the viewsets issue for their hot paths and fail when
+one stops using an index, so a new filter or ordering without a matching
+composite index is caught before it reaches a large table.
+"""
+from django.contrib.auth.models import User
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from orders.models import Order, OrderItem
+from orders.views import OrderViewSet
+from products.models import Product
+from products.views import ProductViewSet
+from reviews.models import Review
+from reviews.views import ReviewViewSet
+from .testing import QueryBudgetTestCase
+
+PAGE = 10
+
+
+class QueryPlanTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Enough rows that MySQL's optimizer doesn't prefer scanning a tiny table
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass')
+        Product.objects.bulk_create(
+            Product(title=f'Track {i}', description='Loop', price=i % 50, category=f'Genre {i % 8}',
+                    owner=cls.user, audio_format='wav', audio_duration=i, audio_sample_rate=44100)
+            for i in range(200)
+        )
+        cls.product = Product.objects.order_by('id').first()
+        reviewers = User.objects.bulk_create(User(username=f'reviewer-{i}') for i in range(20))
+        Review.objects.bulk_create(
+            Review(product=cls.product, user=reviewer, rating=4, comment='') for reviewer in reviewers
+        )
+        for _ in range(20):
+            order = Order.objects.create(user=cls.user, total_amount=10)
+            OrderItem.objects.create(order=order, product=cls.product, price=10)
+
+    def view_queryset(self, viewset, params=None, action='list', user=None):
+        view = viewset()
+        view.action = action
+        view.format_kwarg = None
+        view.request = Request(APIRequestFactory().get('/', params or {}))
+        view.request.user = user
+        queryset = view.get_queryset()
+        return queryset.filter(pk=self.product.pk) if action == 'retrieve' else queryset[:PAGE]
+
+    def assertIndexed(self, queryset, index_name=None):
+        self.assertNoFullScan(queryset)
+        if index_name:
+            self.assertUsesIndex(queryset, index_name)
+
+    def test_product_list_orderings(self):
+        for ordering, index_name in [
+            ('-created_at', 'product_created_id_idx'),
+            ('price', 'product_price_id_idx'),
+            ('-rating', 'product_rating_id_idx'),
+            ('-duration', 'product_duration_id_idx'),
+        ]:
+            with self.subTest(ordering=ordering):
+                self.assertIndexed(self.view_queryset(ProductViewSet, {'ordering': ordering}), index_name)
+
+    def test_product_category_filters(self):
+        self.assertIndexed(
+            self.view_queryset(ProductViewSet, {'category': 'Genre 3', 'ordering': 'price'}),
+            'product_category_price_idx',
+        )
+        self.assertIndexed(
+            self.view_queryset(ProductViewSet, {'category': 'Genre 3', 'minPrice': 10, 'maxPrice': 20}),
+            'product_category_price_idx',
+        )
+
+    def test_product_audio_filters(self):
+        self.assertIndexed(
+            self.view_queryset(ProductViewSet, {'fileFormat': 'wav', 'sampleRate': 44100, 'minDuration': 30}),
+            'product_audio_filter_idx',
+        )
+
+    def test_product_retrieve(self):
+        self.assertIndexed(self.view_queryset(ProductViewSet, action='retrieve'))
+
+    def test_reviews_for_product(self):
+        self.assertIndexed(
+            self.view_queryset(ReviewViewSet, {'product': self.product.pk}), 'review_product_created_idx'
+        )
+
+    def test_orders_for_user(self):
+        self.assertIndexed(self.view_queryset(OrderViewSet, user=self.user), 'order_user_created_id_idx')
+
+    def test_order_items(self):
+        # The items prefetch, and sales of a product, go through the ForeignKey indexes
+        orders = list(Order.objects.filter(user=self.user).values_list('id', flat=True)[:PAGE])
+        self.assertIndexed(OrderItem.objects.filter(order__in=orders))
+        self.assertIndexed(OrderItem.objects.filter(product=self.product))
@@ -0,0 +1,52 @@
+import json
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from products.models import Product
+from .timing import ServerTimingMiddleware, span
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for entry in header.split(','):
+        name, *params = entry.strip().split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        Product.objects.create(title='Track', description='Loop', price=5, owner=owner)
+
+    def test_header_reports_queries_and_spans(self):
+        response = self.client.get('/api/products/')
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(metrics['db']['desc'], '"2 queries"')
+        self.assertIn('serialize', metrics)
+        self.assertGreaterEqual(float(metrics['total']['dur']), float(metrics['db']['dur']))
+
+    @override_settings(N_PLUS_ONE_THRESHOLD=5)
+    def test_repeated_statements_are_logged_as_n_plus_one(self):
+        def view(request):
+            for _ in range(6):
+                Product.objects.filter(pk=1).exists()
+            with span('serialize'), span('serialize'):
+                pass
+            return HttpResponse()
+
+        with self.assertLogs('audio_marketplace.timing', 'WARNING') as logs:
+            response = ServerTimingMiddleware(view)(RequestFactory().get('/loop/'))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 6)
+        self.assertEqual(record['n_plus_one'][0]['count'], 6)
+        self.assertIn('serialize_ms', record)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    def test_span_outside_a_request_is_a_no_op(self):
+        with span('audio'):
+            pass
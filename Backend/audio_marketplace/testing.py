@@ -0,0 +1,79 @@
+import json
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from accounts.authentication import user_cache
+
+
+def full_scans(queryset):
+    """
+    Tables the plan for ``queryset`` reads row by row without an index.
+    Sorting the rows an index lookup returns is fine; scanning isn't.
+    """
+    if connection.vendor == 'mysql':
+        found = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    found.append(node.get('table_name'))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(json.loads(queryset.explain(format='json')))
+        return found
+
+    # SQLite: "SCAN <table>" without "USING ... INDEX" reads every row
+    return [match.group(1) for match in re.finditer(r'\bSCAN (\w+)$', queryset.explain(), re.MULTILINE)]
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Base class for pinning how many SQL queries an endpoint may issue.
+    Budgets are upper bounds, so an endpoint getting cheaper never fails,
+    but a new N+1 does, with the offending SQL in the failure message.
+    """
+
+    def setUp(self):
+        # Start every test with cold caches so budgets measure the database path
+        cache.clear()
+        user_cache.clear()
+
+    def assertQueryBudget(self, budget, method, url, data=None, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, **extra)
+
+        if len(queries) > budget:
+            statements = '\n'.join(f'  {query["sql"]}' for query in queries.captured_queries)
+            self.fail(
+                f'{method.upper()} {url} issued {len(queries)} queries, budget is {budget}:\n{statements}'
+            )
+        return response
+
+    def assertGetWithinBudget(self, budget, url, data=None, **extra):
+        response = self.assertQueryBudget(budget, 'get', url, data, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def assertUsesIndex(self, queryset, index_name):
+        """
+        Fail unless the database plans ``queryset`` through ``index_name``
+        """
+        plan = queryset.explain()
+        if index_name not in plan:
+            self.fail(f'Query does not use {index_name}:\n  {queryset.query}\nPlan:\n{plan}')
+
+    def assertNoFullScan(self, queryset):
+        """
+        Fail if the plan for ``queryset`` scans a whole table
+        """
+        tables = full_scans(queryset)
+        if tables:
+            self.fail(f'Query scans {", ".join(tables)}:\n  {queryset.query}\nPlan:\n{queryset.explain()}')
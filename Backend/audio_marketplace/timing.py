@@ -0,0 +1,132 @@
+"""
+Per-request performance instrumentation.
+
+``ServerTimingMiddleware`` installs a ``connection.execute_wrapper`` for
+the duration of each request and reports query count, SQL time, named
+spans (serialization, authentication, audio parsing) and total time in a
+``Server-Timing`` header and one structured log line. Queries are counted
+by SQL text, which still carries its placeholders, so the same statement
+run many times with different parameters shows up as a likely N+1.
+
+Outside a request ``span`` does nothing, so instrumented code can be
+called from management commands and worker processes as before.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'queries', 'sql_time', 'statements', 'spans', 'depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.spans = {}
+        self.depth = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated_statements(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent in the block to span ``name`` of the current
+    request. Nested spans of the same name count once, so a serializer
+    that renders nested serializers isn't counted twice.
+    """
+    timings = _current.get()
+    if timings is None or timings.depth[name]:
+        yield
+        return
+    timings.depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.depth[name] -= 1
+        timings.spans[name] = timings.spans.get(name, 0.0) + time.perf_counter() - started
+
+
+class TimedSerializerMixin:
+    """
+    Records ``to_representation`` as the ``serialize`` span. Lazy queries
+    a serializer triggers are counted in both ``serialize`` and ``db``.
+    """
+
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 10)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with ExitStack() as stack:
+                # Wrappers attach to this thread's DatabaseWrapper, connected or not
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - timings.started
+        observe_request(request, response, total, timings.queries, timings.sql_time)
+        repeated = timings.repeated_statements(self.threshold)
+        metrics = [('db', timings.sql_time, f'{timings.queries} queries')]
+        metrics += [(name, seconds, None) for name, seconds in sorted(timings.spans.items())]
+        metrics.append(('total', total, None))
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={seconds * 1000:.1f}' + (f';desc="{desc}"' if desc else '')
+            for name, seconds, desc in metrics
+        )
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(timings.sql_time * 1000, 2),
+            'queries': timings.queries,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.spans.items()},
+        }
+        if repeated:
+            record['n_plus_one'] = [{'sql': sql[:500], 'count': count} for sql, count in repeated]
+        level = logging.WARNING if repeated else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(record))
+        return response
+
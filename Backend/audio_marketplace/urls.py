@@ -19,8 +19,14 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+from .profiling import ProfileDownloadView, ProfileListView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiles/<str:name>/', ProfileDownloadView.as_view(), name='profile-download'),
     path('api/', include('accounts.urls')),
     path('api/', include('products.urls')),
     path('api/', include('categories.urls')),
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Category = apps.get_model('categories', 'Category')
+    categories = {category.pk: category for category in Category.objects.all()}
+
+    def path_for(category):
+        if not category.path:
+            parent = categories.get(category.parent_id)
+            prefix = path_for(parent) if parent else ''
+            category.path = f'{prefix}{category.pk:010d}/'
+        return category.path
+
+    for category in categories.values():
+        path_for(category)
+    Category.objects.bulk_update(categories.values(), ['path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,16 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+# Width of one zero-padded id segment in Category.path
+PATH_SEGMENT_WIDTH = 10
 
 # Create your models here.
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, blank=True, null=True, related_name='children')
+    # Materialized path of zero-padded ancestor ids, e.g. "0000000001/0000000004/"
+    path = models.CharField(max_length=255, editable=False, db_index=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -13,3 +19,41 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+
+    def _parent_path(self):
+        """
+        Path of the parent, refusing a parent inside this category's own subtree
+        """
+        if not self.parent_id:
+            return ''
+        parent_path = Category.objects.values_list('path', flat=True).get(pk=self.parent_id)
+        # Every path lists its own id, so the parent is in our subtree iff its path lists ours
+        if self.pk and f'{self.pk:0{PATH_SEGMENT_WIDTH}d}' in parent_path.split('/'):
+            raise ValidationError({'parent': 'A category cannot be moved under itself or its descendants.'})
+        return parent_path
+
+    def clean(self):
+        super().clean()
+        self._parent_path()
+
+    def save(self, *args, **kwargs):
+        # Path and subtree change in one transaction; the tree cache is
+        # invalidated when it commits (see categories.signals)
+        with transaction.atomic():
+            parent_path = self._parent_path()
+            old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() if self.pk else None
+            if self.pk:
+                self.path = f'{parent_path}{self.pk:0{PATH_SEGMENT_WIDTH}d}/'
+            super().save(*args, **kwargs)
+
+            if not self.path:
+                # New row: its id is only known now
+                self.path = f'{parent_path}{self.pk:0{PATH_SEGMENT_WIDTH}d}/'
+                Category.objects.filter(pk=self.pk).update(path=self.path)
+
+            # Re-root the subtree when the category moved
+            if old_path and old_path != self.path:
+                descendants = list(Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk))
+                for descendant in descendants:
+                    descendant.path = self.path + descendant.path[len(old_path):]
+                Category.objects.bulk_update(descendants, ['path'])
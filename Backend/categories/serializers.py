@@ -1,19 +1,25 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from .models import Category
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
+        exclude = ('path',)
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and self.instance.pk:
+            category = Category(pk=self.instance.pk, parent=value)
+            try:
+                category._parent_path()
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError(exc.message_dict['parent'])
+        return value
 
 class CategoryTreeSerializer(serializers.ModelSerializer):
-    children = serializers.SerializerMethodField()
-    
+    """
+    Serializes a single node; children are attached by categories.tree
+    """
     class Meta:
         model = Category
-        fields = ('id', 'name', 'description', 'children')
-    
-    def get_children(self, obj):
-        children = Category.objects.filter(parent=obj)
-        serializer = CategoryTreeSerializer(children, many=True)
-        return serializer.data
+        fields = ('id', 'name', 'description')
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from audio_marketplace.cache import bump_generation
+from .models import Category
+from .tree import invalidate_category_tree
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_tree_cache(sender, **kwargs):
+    # After commit, so a concurrent read can't re-cache the tree before the new paths exist
+    transaction.on_commit(invalidate_category_tree)
+    bump_generation('categories')
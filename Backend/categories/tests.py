@@ -1,3 +1,70 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 
-# Create your tests here.
+from audio_marketplace.testing import QueryBudgetTestCase
+from .models import Category
+from .tree import TREE_CACHE_KEY
+
+
+class CategoryQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            root = Category.objects.create(name=f'Root {i}')
+            child = Category.objects.create(name=f'Child {i}', parent=root)
+            Category.objects.create(name=f'Leaf {i}', parent=child)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list(self):
+        self.assertGetWithinBudget(2, '/api/categories/')
+
+    def test_tree_is_one_query_cold_and_none_warm(self):
+        response = self.assertGetWithinBudget(1, '/api/categories/tree/')
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]['children'][0]['children'][0]['name'], 'Leaf 0')
+        self.assertGetWithinBudget(0, '/api/categories/tree/')
+
+    def test_tree_is_rebuilt_after_a_write(self):
+        self.client.get('/api/categories/tree/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Root 5')
+        response = self.assertGetWithinBudget(1, '/api/categories/tree/')
+        self.assertEqual(len(response.json()), 6)
+
+    def test_tree_is_invalidated_when_the_write_commits(self):
+        self.client.get('/api/categories/tree/')
+        with self.captureOnCommitCallbacks(execute=True):
+            root = Category.objects.get(name='Root 0')
+            root.name = 'Renamed'
+            root.save()
+            # A read racing the transaction may still see the old tree, but can't outlive the commit
+            self.assertIsNotNone(cache.get(TREE_CACHE_KEY))
+        self.assertIsNone(cache.get(TREE_CACHE_KEY))
+
+    def test_moving_a_category_re_roots_its_subtree(self):
+        child = Category.objects.get(name='Child 0')
+        child.parent = Category.objects.get(name='Root 1')
+        child.save()
+        leaf = Category.objects.get(name='Leaf 0')
+        self.assertEqual(leaf.path, f'{child.path}{leaf.pk:010d}/')
+        self.assertTrue(child.path.startswith(child.parent.path))
+
+    def test_parent_cannot_be_itself_or_a_descendant(self):
+        root = Category.objects.get(name='Root 0')
+        path = root.path
+        for parent in [root, Category.objects.get(name='Leaf 0')]:
+            with self.subTest(parent=parent.name):
+                root.parent = parent
+                with self.assertRaises(ValidationError):
+                    root.save()
+        self.assertEqual(Category.objects.get(pk=root.pk).path, path)
+
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_authenticate(admin)
+        leaf = Category.objects.get(name='Leaf 0')
+        response = self.client.patch(f'/api/categories/{root.pk}/', {'parent': leaf.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.data)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category
+from .serializers import CategoryTreeSerializer
+
+TREE_CACHE_KEY = 'categories:tree'
+
+
+def build_category_tree():
+    """
+    Load every category in one query and assemble the nested tree in O(n).
+    Ordering by path keeps siblings in id order at every level.
+    """
+    categories = list(Category.objects.order_by('path'))
+    nodes = {
+        category.pk: dict(CategoryTreeSerializer(category).data, children=[])
+        for category in categories
+    }
+
+    roots = []
+    for category in categories:
+        if category.parent_id is None:
+            roots.append(nodes[category.pk])
+        elif category.parent_id in nodes:
+            nodes[category.parent_id]['children'].append(nodes[category.pk])
+    return roots
+
+
+def get_category_tree():
+    tree = cache.get(TREE_CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        # Writes invalidate it; the timeout bounds a tree cached from a racing read
+        cache.set(TREE_CACHE_KEY, tree, getattr(settings, 'CATEGORY_TREE_CACHE_TIMEOUT', 3600))
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(TREE_CACHE_KEY)
@@ -1,13 +1,16 @@
 from rest_framework import viewsets, permissions
+from audio_marketplace.cache import ResponseCacheMixin
 from .models import Category
-from .serializers import CategorySerializer, CategoryTreeSerializer
+from .serializers import CategorySerializer
+from .tree import get_category_tree
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 # Create your views here.
-class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+class CategoryViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
+    response_cache_namespaces = {'tree': ('categories',)}
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -18,6 +21,4 @@ class CategoryViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def tree(self, request):
-        root_categories = Category.objects.filter(parent=None)
-        serializer = CategoryTreeSerializer(root_categories, many=True)
-        return Response(serializer.data)
+        return self.cached_response(request, lambda request: Response(get_category_tree()))
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from audio_marketplace.benchmark import rolled_back
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout latency and query count for different cart sizes (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = get_user_model().objects.create(username='bench-checkout-buyer')
+            token = str(RefreshToken.for_user(user).access_token)
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {token}')
+            products = Product.objects.bulk_create(
+                Product(title=f'Track {i}', description='', price=i % 50 + 1, owner=user)
+                for i in range(max(options['sizes']))
+            )
+            product_ids = [p.pk for p in products]
+            if None in product_ids:
+                # No RETURNING (MySQL): the products are this user's only ones
+                product_ids = list(Product.objects.filter(owner=user).order_by('pk').values_list('pk', flat=True))
+
+            for size in options['sizes']:
+                payload = {'items': [{'product': pk, 'quantity': 1} for pk in product_ids[:size]]}
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.post('/api/orders/', payload, content_type='application/json')
+                        timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 201, response.content
+                self.stdout.write(
+                    f'{size:>4} items: p50 {statistics.median(timings):7.2f} ms, {len(queries)} queries'
+                )
@@ -1,16 +1,21 @@
 from rest_framework import serializers
+from audio_marketplace.timing import TimedSerializerMixin
 from .models import Order, OrderItem
-from products.serializers import ProductSerializer
+from .services import place_order
+from products.serializers import ProductSummarySerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_details = ProductSerializer(source='product', read_only=True)
+    # Plain id so validating a cart doesn't look products up one by one;
+    # place_order resolves them all in a single query
+    product = serializers.IntegerField(source='product_id', min_value=1)
+    product_details = ProductSummarySerializer(source='product', read_only=True)
     
     class Meta:
         model = OrderItem
         fields = ('id', 'product', 'product_details', 'quantity', 'price')
         read_only_fields = ('price',)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     
     class Meta:
@@ -21,26 +26,4 @@ class OrderSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         request = self.context.get('request')
-        validated_data['user'] = request.user
-        validated_data['total_amount'] = 0
-        
-        order = Order.objects.create(**validated_data)
-        
-        total_amount = 0
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
-            price = product.price
-            total_amount += price * quantity
-            
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                price=price
-            )
-        
-        order.total_amount = total_amount
-        order.save()
-        
-        return order
+        return place_order(request.user, items_data, **validated_data)
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.db import transaction
+from rest_framework import serializers
+
+from products.models import Product
+from .models import Order, OrderItem
+
+
+def place_order(user, items, **order_fields):
+    """
+    Create an order and its items atomically with a fixed number of
+    queries: one product lookup, one order insert and one bulk item insert.
+    ``items`` is a list of dicts with ``product_id`` and ``quantity``.
+    """
+    items = [{'product_id': item['product_id'], 'quantity': item.get('quantity', 1)} for item in items]
+    product_ids = {item['product_id'] for item in items}
+    if len(product_ids) != len(items):
+        seen, duplicates = set(), set()
+        for item in items:
+            (duplicates if item['product_id'] in seen else seen).add(item['product_id'])
+        raise serializers.ValidationError(
+            {'items': [f'Product {pk} appears more than once; set its quantity instead.' for pk in sorted(duplicates)]}
+        )
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                {'items': [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]}
+            )
+
+        total_amount = sum(
+            (products[item['product_id']].price * item['quantity'] for item in items), Decimal('0')
+        )
+        order = Order.objects.create(user=user, total_amount=total_amount, **order_fields)
+
+        order_items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=products[item['product_id']],
+                quantity=item['quantity'],
+                price=products[item['product_id']].price,
+            )
+            for item in items
+        ])
+
+        # Backends that can't return ids from a bulk insert (MySQL) need one read back
+        if any(order_item.pk is None for order_item in order_items):
+            order_items = list(order.items.all())
+            for order_item in order_items:
+                order_item.product = products[order_item.product_id]
+
+    # Serve the response from memory instead of re-querying items and products
+    order._prefetched_objects_cache = {'items': order_items}
+    return order
@@ -1,3 +1,115 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from audio_marketplace.testing import QueryBudgetTestCase
+from products.models import Product
+from .models import Order, OrderItem
+
+
+class OrderHistoryQueryTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass')
+        # Created one by one so primary keys are set on MySQL as well
+        products = [
+            Product.objects.create(title=f'Track {i}', description='', price=i + 1, owner=cls.user)
+            for i in range(5)
+        ]
+        orders = [Order.objects.create(user=cls.user, total_amount=0) for _ in range(200)]
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, price=product.price)
+            for order in orders
+            for product in products
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_list_query_count_is_constant(self):
+        # COUNT, one page of orders, and one prefetch of items joined with products
+        response = self.assertGetWithinBudget(3, '/api/orders/')
+        self.assertEqual(response.data['count'], 200)
+        self.assertEqual(len(response.data['results'][0]['items']), 5)
+
+    def test_cursor_list_query_count_is_constant(self):
+        self.assertGetWithinBudget(2, '/api/orders/', {'pagination': 'cursor'})
+
+    def test_order_lines_embed_product_summary(self):
+        response = self.client.get('/api/orders/')
+        details = response.data['results'][0]['items'][0]['product_details']
+        self.assertEqual(set(details), {'id', 'title', 'price', 'category', 'audio_file'})
+
+    def test_sparse_fields_skip_items(self):
+        # COUNT and the page of orders; no items prefetch
+        response = self.assertGetWithinBudget(2, '/api/orders/', {'fields': 'id,status,total_amount'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'total_amount'})
+
+    def test_expand_items_without_products(self):
+        response = self.assertGetWithinBudget(3, '/api/orders/', {'fields': 'id', 'expand': 'items'})
+        self.assertEqual(set(response.data['results'][0]['items'][0]), {'id', 'product', 'quantity', 'price'})
+        response = self.client.get('/api/orders/', {'fields': 'id', 'expand': 'items.product_details'})
+        self.assertIn('product_details', response.data['results'][0]['items'][0])
+        response = self.client.get('/api/orders/', {'fields': 'id,items.quantity'})
+        self.assertEqual(response.data['results'][0]['items'][0], {'quantity': 1})
+
+
+class PlaceOrderTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pass')
+        cls.products = [
+            Product.objects.create(title=f'Track {i}', description='', price=i + 1, owner=cls.user)
+            for i in range(100)
+        ]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def order(self, products, quantity=1):
+        return self.client.post('/api/orders/', {
+            'items': [{'product': product.pk, 'quantity': quantity} for product in products],
+        }, format='json')
+
+    def test_creates_order_with_items_and_total(self):
+        response = self.order(self.products[:3], quantity=2)
+        self.assertEqual(response.status_code, 201, response.data)
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, (1 + 2 + 3) * 2)
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity', 'price')),
+                         [(product.pk, 2, product.price) for product in self.products[:3]])
+        self.assertEqual(response.data['items'][0]['product_details']['title'], 'Track 0')
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        counts = []
+        for size in (1, 10, 100):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.order(self.products[:size])
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data['items']), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1], counts)
+        self.assertEqual(counts[0], counts[2], counts)
+
+    def test_unknown_product_creates_nothing(self):
+        response = self.client.post('/api/orders/', {
+            'items': [{'product': self.products[0].pk}, {'product': 999999}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', str(response.data['items']))
+        self.assertFalse(Order.objects.exists())
+
+    def test_duplicate_product_is_rejected(self):
+        response = self.order([self.products[0], self.products[1], self.products[0]])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'Product {self.products[0].pk} appears more than once', str(response.data['items']))
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_item_insert_rolls_back_the_order(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.order(self.products[:2])
+        self.assertFalse(Order.objects.exists())
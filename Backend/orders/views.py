@@ -1,13 +1,32 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
-from .models import Order
+from audio_marketplace.fieldsets import SparseFieldsMixin, read_columns
+from audio_marketplace.pagination import CatalogPagination
+from .models import Order, OrderItem
 from .serializers import OrderSerializer
 from .permissions import IsOrderOwner
 
 # Create your views here.
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated, IsOrderOwner]
+    pagination_class = CatalogPagination
+    # ?fields= responses skip the items prefetch and product join unless asked for them
+    expandable_fields = ('items', 'items.product_details')
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+        serializer = self.read_serializer()
+        if self.request.method == 'GET':
+            # Writes load whole rows: save() on a deferred instance skips the deferred columns
+            columns, _ = read_columns(serializer)
+            queryset = queryset.only(*columns)
+        if 'items' in serializer.fields:
+            # Items and their product summaries load in one extra query per page
+            columns, related = read_columns(serializer.fields['items'].child)
+            items = OrderItem.objects.only('order', *columns)
+            if related:
+                items = items.select_related(*related)
+            queryset = queryset.prefetch_related(Prefetch('items', queryset=items))
+        return queryset
@@ -0,0 +1,179 @@
+"""
+Incremental sniffing and header parsing for MP3, WAV and FLAC uploads.
+
+``AudioHeaderParser`` is fed the upload chunk by chunk and only ever keeps
+the first ``HEAD_SIZE`` bytes (plus a small window at the first MP3 frame
+when an ID3 tag pushes it further into the file), so memory use does not
+depend on the size of the upload.
+"""
+import struct
+
+HEAD_SIZE = 64 * 1024
+FRAME_WINDOW_SIZE = 4 * 1024
+
+# MPEG audio layer III tables, indexed by version id (bits 19-20 of the frame header)
+MPEG_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+MPEG_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+MPEG_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def sniff_format(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[:3] == b'ID3':
+        return 'mp3'
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return 'mp3'
+    return None
+
+
+def _id3_end(head):
+    if head[:3] != b'ID3' or len(head) < 10:
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def parse_wav(head, file_size):
+    info = {}
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', head, offset)
+        body = offset + 8
+        if chunk_id == b'fmt ' and body + 16 <= len(head):
+            _, channels, sample_rate, byte_rate, _, _ = struct.unpack_from('<HHIIHH', head, body)
+            info.update(channels=channels, sample_rate=sample_rate, bit_rate=byte_rate * 8)
+            info['_byte_rate'] = byte_rate
+        elif chunk_id == b'data':
+            # Streamed WAVs may carry a placeholder size; trust the bytes we saw
+            data_size = min(chunk_size, file_size - body)
+            if info.get('_byte_rate'):
+                info['duration'] = data_size / info['_byte_rate']
+            break
+        offset = body + chunk_size + (chunk_size & 1)
+    info.pop('_byte_rate', None)
+    return info
+
+
+def parse_flac(head, file_size):
+    offset = 4
+    while offset + 4 <= len(head):
+        block_header = head[offset]
+        block_type = block_header & 0x7F
+        block_length = int.from_bytes(head[offset + 1:offset + 4], 'big')
+        body = offset + 4
+        if block_type == 0 and body + 18 <= len(head):
+            packed = int.from_bytes(head[body + 10:body + 18], 'big')
+            sample_rate = packed >> 44
+            channels = ((packed >> 41) & 0x07) + 1
+            total_samples = packed & 0xFFFFFFFFF
+            info = {'sample_rate': sample_rate, 'channels': channels}
+            if sample_rate and total_samples:
+                info['duration'] = total_samples / sample_rate
+                info['bit_rate'] = int(file_size * 8 / info['duration'])
+            return info
+        if block_header & 0x80:
+            break
+        offset = body + block_length
+    return {}
+
+
+def parse_mp3_frame(frame, audio_start, file_size):
+    """
+    Parse the first MPEG layer III frame (and its Xing/Info header if any)
+    """
+    if len(frame) < 4 or frame[0] != 0xFF or frame[1] & 0xE0 != 0xE0:
+        return {}
+    header = int.from_bytes(frame[:4], 'big')
+    version = MPEG_VERSIONS.get((header >> 19) & 0x03)
+    layer = (header >> 17) & 0x03
+    bitrate_index = (header >> 12) & 0x0F
+    sample_rate_index = (header >> 10) & 0x03
+    channel_mode = (header >> 6) & 0x03
+    if version is None or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return {}
+
+    sample_rate = MPEG_SAMPLE_RATES[version][sample_rate_index]
+    bitrate = MPEG_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    channels = 1 if channel_mode == 3 else 2
+    info = {'sample_rate': sample_rate, 'channels': channels, 'bit_rate': bitrate}
+
+    # VBR files carry a frame count in a Xing/Info header after the side info
+    if version == 1:
+        side_info = 17 if channels == 1 else 32
+        samples_per_frame = 1152
+    else:
+        side_info = 9 if channels == 1 else 17
+        samples_per_frame = 576
+    xing = 4 + side_info
+    if frame[xing:xing + 4] in (b'Xing', b'Info') and len(frame) >= xing + 12:
+        flags = struct.unpack_from('>I', frame, xing + 4)[0]
+        if flags & 0x01:
+            frames = struct.unpack_from('>I', frame, xing + 8)[0]
+            info['duration'] = frames * samples_per_frame / sample_rate
+            if info['duration']:
+                info['bit_rate'] = int((file_size - audio_start) * 8 / info['duration'])
+            return info
+
+    info['duration'] = (file_size - audio_start) * 8 / bitrate
+    return info
+
+
+class AudioHeaderParser:
+    """
+    Feed chunks in order, then call ``result()`` once the upload is complete
+    """
+
+    def __init__(self):
+        self.head = bytearray()
+        self.size = 0
+        self.format = None
+        self._frame_offset = None
+        self._frame = bytearray()
+
+    @property
+    def sniffed(self):
+        return self.format is not None or len(self.head) >= 12
+
+    def feed(self, chunk):
+        start = self.size
+        self.size += len(chunk)
+
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+            if self.format is None and len(self.head) >= 12:
+                self.format = sniff_format(bytes(self.head[:12]))
+            if self.format == 'mp3' and self._frame_offset is None and len(self.head) >= 10:
+                self._frame_offset = _id3_end(self.head)
+
+        # Collect a small window at the first frame when it lies past the head
+        if self._frame_offset is not None and self._frame_offset >= HEAD_SIZE:
+            needed = FRAME_WINDOW_SIZE - len(self._frame)
+            relative = max(self._frame_offset - start, 0)
+            if needed > 0 and relative < len(chunk):
+                self._frame += chunk[relative:relative + needed]
+
+    def result(self):
+        info = {'file_format': self.format, 'file_size': self.size}
+        head = bytes(self.head)
+        if self.format == 'wav':
+            info.update(parse_wav(head, self.size))
+        elif self.format == 'flac':
+            info.update(parse_flac(head, self.size))
+        elif self.format == 'mp3':
+            offset = self._frame_offset or 0
+            frame = bytes(self._frame) if offset >= HEAD_SIZE else head[offset:offset + FRAME_WINDOW_SIZE]
+            info.update(parse_mp3_frame(frame, offset, self.size))
+        return info
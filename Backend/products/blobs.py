@@ -0,0 +1,193 @@
+"""
+Reference counting for content-addressed audio files.
+
+Each ``AudioBlob`` row counts the products whose ``audio_file`` names it.
+products.signals retains and releases references as products change, the
+bulk import retains them per chunk, and a file is deleted once its last
+reference is gone and no finalized upload is waiting to be attached.
+"""
+import hashlib
+import os
+import re
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+
+from audio_marketplace.cache import bump_generation
+from .models import AudioBlob, Product, UploadSession
+from .storage import AUDIO_DIR, audio_storage, content_name
+
+READ_SIZE = 64 * 1024
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _describe(name, storage):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    sha256 = stem if SHA256_RE.match(stem) else ''
+    size = storage.size(name) if storage.exists(name) else 0
+    return name, sha256, size
+
+
+def register_blobs(blobs):
+    """
+    Record stored files as (name, sha256, size) tuples, ignoring known ones
+    """
+    AudioBlob.objects.bulk_create(
+        [AudioBlob(name=name, sha256=sha256, size=size) for name, sha256, size in blobs],
+        ignore_conflicts=True,
+    )
+
+
+def retain_blobs(counts):
+    """
+    Add references: ``counts`` maps storage names to how many products
+    started using them
+    """
+    counts = {name: count for name, count in counts.items() if name}
+    if not counts:
+        return
+    known = set(AudioBlob.objects.filter(name__in=counts).values_list('name', flat=True))
+    storage = audio_storage()
+    register_blobs(_describe(name, storage) for name in counts if name not in known)
+    AudioBlob.objects.filter(name__in=counts).update(
+        ref_count=F('ref_count') + Case(*[When(name=name, then=count) for name, count in counts.items()])
+    )
+
+
+def hold_stored_blob(name, storage):
+    """
+    Keep the stored file ``name`` from being deleted until the current
+    transaction commits, by which time the product saving it holds its
+    own reference. The hold is taken under the blob's row lock, so a
+    concurrent delete_if_unreferenced either finishes first (and the file
+    is gone) or sees the hold. Returns whether the file is stored.
+    """
+    if AudioBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        transaction.on_commit(lambda: release_blob(name))
+    return storage.exists(name)
+
+
+def lock_blob(name, sha256='', size=0):
+    """
+    Take the row lock delete_if_unreferenced deletes under, registering
+    ``name`` first so there is a row to lock. A delete already in progress
+    finishes first (and the file is gone); later ones see whatever the
+    current transaction commits. Place a reused file under this lock.
+    """
+    register_blobs([(name, sha256, size)])
+    list(AudioBlob.objects.select_for_update().filter(name=name).values_list('pk', flat=True))
+
+
+def release_blob(name):
+    """
+    Drop one reference to ``name``. The file is deleted after commit if it
+    was the last one and nothing re-acquired it in the meantime.
+    """
+    if not name:
+        return
+    AudioBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: delete_if_unreferenced(name))
+
+
+def delete_if_unreferenced(name):
+    # ref_count is re-read under the lock that hold_stored_blob, lock_blob
+    # and retain_blobs wait on, and the file goes before the lock is released.
+    # A finalized upload holds its file until a product attaches it.
+    with transaction.atomic():
+        blob = AudioBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.ref_count > 0:
+            return False
+        if UploadSession.objects.filter(stored_name=name, status='complete').exists():
+            return False
+        blob.delete()
+        audio_storage().delete(name)
+    return True
+
+
+def rebuild_blob_counts(batch_size=1000):
+    """
+    Recompute every AudioBlob from the Product table. Returns the number of
+    referenced files.
+    """
+    storage = audio_storage()
+    rows = (
+        Product.objects.exclude(audio_file='').exclude(audio_file__isnull=True)
+        .values('audio_file').annotate(refs=Count('id')).order_by()
+    )
+    blobs = []
+    for row in rows.iterator():
+        name, sha256, size = _describe(row['audio_file'], storage)
+        blobs.append(AudioBlob(name=name, sha256=sha256, size=size, ref_count=row['refs']))
+    with transaction.atomic():
+        AudioBlob.objects.all().delete()
+        AudioBlob.objects.bulk_create(blobs, batch_size=batch_size)
+    return len(blobs)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _legacy_files(root):
+    for directory, _, files in os.walk(os.path.join(root, AUDIO_DIR)):
+        for file_name in sorted(files):
+            path = os.path.join(directory, file_name)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            stem, ext = os.path.splitext(file_name)
+            if not (SHA256_RE.match(stem) and name == content_name(stem, ext[1:])):
+                yield name, path
+
+
+def dedupe_audio_files(batch_size=500, dry_run=False):
+    """
+    Move every file under ``audio_files/`` that isn't content-addressed yet
+    into the content store, repoint products at it and delete duplicates.
+
+    Each batch hard-links files to their new names, updates products in
+    one transaction and only then unlinks the old names, so every product
+    keeps a readable file throughout. Returns a dict of counts and bytes.
+    """
+    root = audio_storage().location
+    stats = dict.fromkeys(['scanned', 'moved', 'duplicates', 'bytes_reclaimed'], 0)
+
+    def flush(batch):
+        if not dry_run and batch:
+            with transaction.atomic():
+                Product.objects.filter(audio_file__in=[old for old, _, _ in batch]).update(
+                    audio_file=Case(*[When(audio_file=old, then=Value(new)) for old, new, _ in batch])
+                )
+            for _, _, path in batch:
+                os.unlink(path)
+        batch.clear()
+
+    batch = []
+    planned = set()  # Targets a dry run would have created
+    for name, path in _legacy_files(root):
+        stats['scanned'] += 1
+        size = os.path.getsize(path)
+        new_name = content_name(_hash_file(path), os.path.splitext(name)[1][1:] or 'bin')
+        target = os.path.join(root, new_name)
+        if os.path.exists(target) or new_name in planned:
+            stats['duplicates'] += 1
+            stats['bytes_reclaimed'] += size
+        else:
+            stats['moved'] += 1
+            if dry_run:
+                planned.add(new_name)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.link(path, target)
+        batch.append((name, new_name, path))
+        if len(batch) >= batch_size:
+            flush(batch)
+    flush(batch)
+
+    if not dry_run:
+        rebuild_blob_counts()
+        bump_generation('products')
+    return stats
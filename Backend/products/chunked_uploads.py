@@ -0,0 +1,263 @@
+"""
+Resumable chunked uploads for audio masters.
+
+A session reserves ``MEDIA_ROOT/uploads/<id>.part``. Chunk ``n`` covers
+bytes ``[n * chunk_size, (n + 1) * chunk_size)`` and is written straight
+into the part file at its offset while its SHA-256 is checked, so nothing
+is assembled or re-read until finalize. Finalize hashes the file once and
+renames it into the content-addressed store (products.storage), where a
+product can reference it as is.
+"""
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from audio_marketplace.metrics import UPLOAD_BYTES
+
+from .audio_headers import AudioHeaderParser
+from .blobs import delete_if_unreferenced, lock_blob, register_blobs
+from .models import UploadSession
+from .storage import content_name, place_file
+from .uploads import SUPPORTED_AUDIO_FORMATS
+
+UPLOAD_DIR = 'uploads'
+READ_SIZE = 64 * 1024
+CHUNK_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def part_path(session):
+    return os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR, f'{session.pk}.part')
+
+
+def create_session(owner, file_name, total_size, chunk_size):
+    session = UploadSession.objects.create(
+        owner=owner, file_name=file_name, total_size=total_size, chunk_size=chunk_size
+    )
+    os.makedirs(os.path.dirname(part_path(session)), exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def chunk_bounds(session, number):
+    start = number * session.chunk_size
+    if start >= session.total_size:
+        raise UploadError(f"Chunk {number} is past the end of the file", status=416)
+    return start, min(start + session.chunk_size, session.total_size)
+
+
+def _claim_chunk(session_id, number, offset, length):
+    """
+    Check chunk ``number`` against the session and mark the session as
+    being written. Returns (session, claimed); ``claimed`` is False for a
+    chunk that was already stored. Only the row check runs under the lock.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if session.status in ('finalizing', 'complete'):
+            raise UploadError("Upload is already finalized", status=409)
+
+        start, end = chunk_bounds(session, number)
+        if offset != start:
+            raise UploadError(f"Chunk {number} starts at offset {start}, not {offset}")
+        if length != end - start:
+            raise UploadError(f"Chunk {number} must be {end - start} bytes, got {length}")
+        if end <= session.received:
+            return session, False
+        # A writer that died mid-chunk leaves the claim behind until it goes stale
+        if session.status == 'writing' and session.updated_at > timezone.now() - CHUNK_CLAIM_TIMEOUT:
+            raise UploadError(f"Chunk {session.next_chunk} is still being written", status=409)
+        if start != session.received:
+            raise UploadError(f"Expected chunk {session.next_chunk} at offset {session.received}", status=409)
+
+        session.status = 'writing'
+        session.save(update_fields=['status', 'updated_at'])
+        return session, True
+
+
+def _release_chunk(session, received):
+    """
+    Drop the claim taken by _claim_chunk, recording ``received`` bytes.
+    Returns False if the claim went stale and another writer took over.
+    """
+    return UploadSession.objects.filter(
+        pk=session.pk, status='writing', updated_at=session.updated_at,
+    ).update(status='open', received=received, updated_at=timezone.now()) == 1
+
+
+def write_chunk(session_id, number, offset, length, checksum, stream):
+    """
+    Write chunk ``number`` from ``stream`` at its offset in the part file.
+    Chunks must arrive in order; re-sending a chunk that was already stored
+    (say, after a lost response) is acknowledged without writing it again.
+    The body is streamed outside any transaction, so a slow client holds
+    neither a connection nor a row lock.
+    """
+    session, claimed = _claim_chunk(session_id, number, offset, length)
+    if not claimed:
+        return session
+
+    start, end = chunk_bounds(session, number)
+    digest = hashlib.sha256()
+    parser = AudioHeaderParser() if start == 0 else None
+    written = 0
+    try:
+        with open(part_path(session), 'r+b') as f:
+            f.seek(start)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                digest.update(data)
+                f.write(data)
+                written += len(data)
+                if parser:
+                    parser.feed(data)
+    except BaseException:
+        _release_chunk(session, start)
+        raise
+
+    error = None
+    if written != length:
+        error = UploadError(f"Chunk {number} ended after {written} of {length} bytes")
+    elif checksum and digest.hexdigest() != checksum.lower():
+        error = UploadError(f"Checksum mismatch for chunk {number}")
+    elif parser and parser.sniffed and parser.format not in SUPPORTED_AUDIO_FORMATS:
+        error = UploadError(
+            f"Unsupported audio format. supported formats are: {','.join(SUPPORTED_AUDIO_FORMATS)}"
+        )
+    # Bytes past ``received`` are left for the retry of this chunk to overwrite
+    if not _release_chunk(session, start if error else end):
+        raise UploadError(f"Chunk {number} took too long and was claimed by another request", status=409)
+    if error:
+        raise error
+
+    UPLOAD_BYTES.inc(written, path='chunked')
+    session.refresh_from_db()
+    return session
+
+
+def _claim_finalize(session_id):
+    """
+    Mark a fully received session as being finalized. Returns (session,
+    claimed); ``claimed`` is False if it was finalized already. Like
+    _claim_chunk, ``updated_at`` is the claim token.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id)
+        if session.status == 'complete':
+            return session, False
+        if session.received != session.total_size:
+            raise UploadError(
+                f"Upload is incomplete: {session.received} of {session.total_size} bytes received", status=409
+            )
+        if session.status == 'finalizing' and session.updated_at > timezone.now() - CHUNK_CLAIM_TIMEOUT:
+            raise UploadError("Upload is already being finalized", status=409)
+
+        session.status = 'finalizing'
+        session.save(update_fields=['status', 'updated_at'])
+        return session, True
+
+
+def finalize_session(session_id):
+    """
+    Verify a fully received upload, parse its headers and move it to its
+    content-addressed name. Finalizing twice returns the same result.
+    The file is hashed outside any transaction; the result is only saved
+    if this request still holds the claim.
+    """
+    session, claimed = _claim_finalize(session_id)
+    if not claimed:
+        return session
+    claim = UploadSession.objects.filter(pk=session.pk, status='finalizing', updated_at=session.updated_at)
+
+    path = part_path(session)
+    parser = AudioHeaderParser()
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            while data := f.read(READ_SIZE):
+                parser.feed(data)
+                digest.update(data)
+    except BaseException:
+        claim.update(status='open', updated_at=timezone.now())
+        raise
+    metadata = parser.result()
+    if metadata['file_format'] not in SUPPORTED_AUDIO_FORMATS:
+        claim.update(status='open', updated_at=timezone.now())
+        raise UploadError(
+            f"Unsupported audio format. supported formats are: {','.join(SUPPORTED_AUDIO_FORMATS)}"
+        )
+
+    name = content_name(digest.hexdigest(), metadata['file_format'])
+    with transaction.atomic():
+        # Locks the row, so the file is only moved by the request whose claim is current
+        if not claim.update(
+            status='complete', stored_name=name, sha256=digest.hexdigest(), audio_metadata=metadata,
+            updated_at=timezone.now(),
+        ):
+            raise UploadError("Finalize took too long and was claimed by another request", status=409)
+        # The completed session keeps the file once this commits
+        lock_blob(name, digest.hexdigest(), session.total_size)
+        place_file(path, digest.hexdigest(), metadata['file_format'], settings.MEDIA_ROOT)
+    session.refresh_from_db()
+    return session
+
+
+def attach_upload(product, session):
+    """
+    Point ``product.audio_file`` at a finalized upload without copying it.
+    The session is consumed, so call this in the transaction that saves
+    the product.
+    """
+    product.audio_file = session.stored_name
+    # Picked up by products.signals instead of queueing a metadata extraction
+    product._ingested_audio_metadata = session.audio_metadata
+    UploadSession.objects.filter(pk=session.pk).delete()
+
+
+def discard_session(session):
+    """
+    Delete ``session`` and its part file. A finalized file is deleted after
+    commit unless a product or another upload uses it.
+    """
+    if session.status == 'complete':
+        name = session.stored_name
+        # delete_if_unreferenced only deletes registered files, and sessions
+        # finalized before finalize registered them have no row
+        register_blobs([(name, session.sha256, session.total_size)])
+        session.delete()
+        transaction.on_commit(lambda: delete_if_unreferenced(name))
+    else:
+        # A chunk write or finalize still holding a claim fails its
+        # conditional update against the deleted row
+        path = part_path(session)
+        session.delete()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def collect_expired_sessions(ttl=None):
+    """
+    Delete sessions idle for longer than ``ttl`` seconds along with their
+    files. Finalized files are kept if a product already references them.
+    Returns the number of sessions removed.
+    """
+    if ttl is None:
+        ttl = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60)
+    expired = UploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=ttl))
+
+    removed = 0
+    for session in expired.iterator():
+        discard_session(session)
+        removed += 1
+    return removed
@@ -0,0 +1,109 @@
+"""
+Facet counts for the product list.
+
+All facets come from one query: products are grouped by category and
+every other facet value is a conditional COUNT in the same pass. Each
+facet is counted with every active filter except its own, so picking a
+category still shows how many results the other categories would give.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from audio_marketplace.cache import get_generation, get_response_cache
+from audio_marketplace.metrics import CACHE_REQUESTS
+from .models import Product
+from .search import match_products, term_frequencies, tokenize
+from .uploads import SUPPORTED_AUDIO_FORMATS
+
+# (min, max) ranges, min inclusive and max exclusive; None is open-ended
+PRICE_BUCKETS = [(None, 5), (5, 10), (10, 25), (25, 50), (50, 100), (100, None)]
+DURATION_BUCKETS = [(None, 30), (30, 60), (60, 180), (180, 600), (600, None)]  # Seconds
+
+
+def _range_q(field, low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(**{f'{field}__gte': low})
+    if high is not None:
+        q &= Q(**{f'{field}__lt': high})
+    return q
+
+
+def _count(*conditions):
+    condition = Q()
+    for q in conditions:
+        condition &= q
+    return Count('id', filter=condition if condition else None)
+
+
+def compute_facets(queryset, filters):
+    """
+    ``filters`` maps a facet name ('category', 'price', 'format',
+    'duration') to the Q of its active filter
+    """
+    def others(facet):
+        return [q for name, q in filters.items() if name != facet]
+
+    annotations = {
+        'total': _count(*filters.values()),
+        'category_count': _count(*others('category')),
+    }
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        annotations[f'price_{i}'] = _count(*others('price'), _range_q('price', low, high))
+    for file_format in SUPPORTED_AUDIO_FORMATS:
+        annotations[f'format_{file_format}'] = _count(
+            *others('format'), Q(audio_format=file_format)
+        )
+    for i, (low, high) in enumerate(DURATION_BUCKETS):
+        annotations[f'duration_{i}'] = _count(*others('duration'), _range_q('audio_duration', low, high))
+
+    rows = list(queryset.values('category').annotate(**annotations).order_by())
+
+    def total(key):
+        return sum(row[key] for row in rows)
+
+    categories = sorted(
+        ({'value': row['category'], 'count': row['category_count']} for row in rows if row['category_count']),
+        key=lambda facet: (-facet['count'], facet['value'] or ''),
+    )
+    return {
+        'count': total('total'),
+        'category': categories,
+        'price': [
+            {'min': low, 'max': high, 'count': total(f'price_{i}')}
+            for i, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'format': [
+            {'value': file_format, 'count': total(f'format_{file_format}')}
+            for file_format in SUPPORTED_AUDIO_FORMATS
+        ],
+        'duration': [
+            {'min': low, 'max': high, 'count': total(f'duration_{i}')}
+            for i, (low, high) in enumerate(DURATION_BUCKETS)
+        ],
+    }
+
+
+def get_facets(filters, search=None):
+    """
+    Facet counts for the filter set, cached per normalized combination of
+    filters until the next product write
+    """
+    terms = ' '.join(tokenize(search)) if search else ''
+    fingerprint = hashlib.sha256(
+        repr((sorted((name, str(q)) for name, q in filters.items()), terms)).encode()
+    ).hexdigest()
+    key = f"facets:{get_generation('products')}:{fingerprint}"
+
+    cache = get_response_cache()
+    facets = cache.get(key)
+    CACHE_REQUESTS.inc(cache='facets', result='miss' if facets is None else 'hit')
+    if facets is None:
+        queryset = Product.objects.all()
+        if terms:
+            queryset = match_products(queryset, term_frequencies(search))
+        facets = compute_facets(queryset, filters)
+        cache.set(key, facets, getattr(settings, 'FACET_CACHE_TIMEOUT', 300))
+    return facets
@@ -0,0 +1,270 @@
+"""
+Bulk catalog import from a CSV or JSONL manifest plus a directory of audio.
+
+Rows are read lazily and handled ``chunk_size`` at a time: the audio files
+of a chunk are validated (and copied into the content-addressed store) in a process
+pool, then the chunk's products and metadata are inserted with
+``bulk_create`` in one transaction that also advances the import's
+``CatalogImport.rows_done`` checkpoint. A crashed import resumes after the
+last committed chunk, and memory use depends on the chunk size only.
+"""
+import csv
+import hashlib
+import itertools
+from collections import Counter, defaultdict
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from audio_marketplace.cache import bump_generation
+from audio_marketplace.metrics import UPLOAD_BYTES
+from .audio_headers import AudioHeaderParser
+from .blobs import retain_blobs
+from .metadata import METADATA_FIELDS, PRODUCT_AUDIO_FIELDS
+from .models import AudioMetadata, CatalogImport, Product
+from .search import index_products
+from .storage import audio_storage, place_file
+from .uploads import SUPPORTED_AUDIO_FORMATS, ingest_temp_dir
+
+READ_SIZE = 64 * 1024
+TEXT_FIELDS = ('title', 'description', 'category', 'owner', 'audio_file')
+# Columns that identify a product inserted by an import chunk, see _read_back_ids
+READ_BACK_FIELDS = ('title', 'description', 'price', 'category', 'owner_id', 'audio_file', 'created_at')
+
+
+def read_manifest(path):
+    """
+    Yield (line number, row dict) from a .csv or .jsonl manifest. A JSONL
+    line that isn't a JSON object yields an error message instead of a
+    row, so it is rejected like any other bad row.
+    """
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield number, f'invalid JSON: {e}'
+                    continue
+                yield number, row if isinstance(row, dict) else 'row is not a JSON object'
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def clean_row(row):
+    """
+    Validate the product fields of a manifest row. Returns (fields, error).
+    """
+    if isinstance(row, str):
+        return None, row
+    # JSONL values can be numbers, lists or objects; CSV cells are always strings
+    for field in TEXT_FIELDS:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return None, f'{field} must be a string, got {row[field]!r}'
+    title = (row.get('title') or '').strip()
+    if not title:
+        return None, 'title is required'
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        return None, f"invalid price {row.get('price')!r}"
+    if not price.is_finite() or price < 0 or price >= 10 ** 8 or price.as_tuple().exponent < -2:
+        return None, f"invalid price {row.get('price')!r}"
+    return {
+        'title': title[:255],
+        'description': row.get('description') or '',
+        'price': price,
+        'category': (row.get('category') or '').strip() or None,
+        'owner': (row.get('owner') or '').strip() or None,
+        'audio_file': (row.get('audio_file') or '').strip() or None,
+    }, None
+
+
+def ingest_audio(job):
+    """
+    Stream one audio file through the header parser into media storage,
+    named by content hash. Runs in worker processes: no database access.
+    Returns (index, stored name, metadata, error).
+    """
+    index, source, max_size = job
+    try:
+        parser = AudioHeaderParser()
+        digest = hashlib.sha256()
+        with open(source, 'rb') as src, tempfile.NamedTemporaryFile(dir=ingest_temp_dir(), delete=False) as tmp:
+            try:
+                while chunk := src.read(READ_SIZE):
+                    parser.feed(chunk)
+                    if parser.sniffed and parser.format not in SUPPORTED_AUDIO_FORMATS:
+                        raise ValueError('unsupported audio format')
+                    if parser.size > max_size:
+                        raise ValueError(f'file size exceeds {max_size / (1024 * 1024):g}MB limit')
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                if parser.format is None:
+                    raise ValueError('file is too small to be an audio file')
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+        name = place_file(tmp.name, digest.hexdigest(), parser.format, settings.MEDIA_ROOT)
+        return index, name, parser.result(), None
+    except Exception as e:
+        return index, None, None, str(e)
+
+
+class CatalogImporter:
+    """
+    Import a manifest. ``on_chunk(job, rows)`` is called after every committed chunk.
+    """
+
+    def __init__(self, manifest, audio_dir, default_owner=None, chunk_size=1000, workers=None,
+                 restart=False, on_error=None, on_chunk=None):
+        self.manifest = os.path.abspath(manifest)
+        self.audio_dir = audio_dir
+        self.default_owner = default_owner
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.restart = restart
+        self.on_error = on_error or (lambda line, error: None)
+        self.on_chunk = on_chunk or (lambda job, rows: None)
+        self.max_size = getattr(settings, 'MAX_AUDIO_UPLOAD_SIZE', 50 * 1024 * 1024)
+
+    def run(self):
+        job, _ = CatalogImport.objects.get_or_create(manifest=self.manifest)
+        if self.restart:
+            job.rows_done = job.rows_imported = job.rows_failed = 0
+            job.finished_at = None
+            job.save()
+
+        rows = itertools.islice(read_manifest(self.manifest), job.rows_done, None)
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers and self.workers > 1 else None
+        try:
+            while chunk := list(itertools.islice(rows, self.chunk_size)):
+                self._import_chunk(job, chunk, executor)
+                self.on_chunk(job, len(chunk))
+        finally:
+            if executor:
+                executor.shutdown()
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['finished_at', 'updated_at'])
+        return job
+
+    def _import_chunk(self, job, chunk, executor):
+        cleaned, errors = [], []
+        for line, row in chunk:
+            fields, error = clean_row(row)
+            if error:
+                errors.append((line, error))
+            else:
+                cleaned.append((line, fields))
+
+        owners = self._resolve_owners(cleaned, errors)
+        cleaned = [(line, fields) for line, fields in cleaned if (fields['owner'] or self.default_owner) in owners]
+
+        jobs = [
+            (i, os.path.join(self.audio_dir, fields['audio_file']), self.max_size)
+            for i, (line, fields) in enumerate(cleaned) if fields['audio_file']
+        ]
+        if executor:
+            results = executor.map(ingest_audio, jobs, chunksize=max(1, len(jobs) // (self.workers * 4)))
+        else:
+            results = map(ingest_audio, jobs)
+        audio, sources = {}, {}
+        for index, name, metadata, error in results:
+            if error:
+                errors.append((cleaned[index][0], f"{cleaned[index][1]['audio_file']}: {error}"))
+            else:
+                audio[index] = (name, metadata)
+                sources[name] = os.path.join(self.audio_dir, cleaned[index][1]['audio_file'])
+                UPLOAD_BYTES.inc(metadata.get('file_size') or 0, path='import')
+
+        products, metadata = [], []
+        for i, (line, fields) in enumerate(cleaned):
+            if fields['audio_file'] and i not in audio:
+                continue
+            name, values = audio.get(i, (None, None))
+            products.append(Product(
+                title=fields['title'], description=fields['description'], price=fields['price'],
+                category=fields['category'], owner=owners[fields['owner'] or self.default_owner],
+                audio_file=name,
+                **{column: (values or {}).get(field) for field, column in PRODUCT_AUDIO_FIELDS.items()},
+            ))
+            metadata.append(values)
+
+        with transaction.atomic():
+            before = self._max_product_id() if not connection.features.can_return_rows_from_bulk_insert else None
+            Product.objects.bulk_create(products)
+            if before is not None:
+                self._read_back_ids(products, before)
+            AudioMetadata.objects.bulk_create(
+                AudioMetadata(product_id=product.pk, status='ready',
+                              **{field: values.get(field) for field in METADATA_FIELDS})
+                for product, values in zip(products, metadata) if values
+            )
+            index_products(products)
+            names = Counter(product.audio_file.name for product in products if product.audio_file)
+            retain_blobs(names)
+            # A worker that found a file already stored took no hold on it, so
+            # it may have been deleted since; the references now keep a copy
+            storage = audio_storage()
+            for name in names:
+                if not storage.exists(name):
+                    ingest_audio((None, sources[name], self.max_size))
+            CatalogImport.objects.filter(pk=job.pk).update(
+                rows_done=F('rows_done') + len(chunk),
+                rows_imported=F('rows_imported') + len(products),
+                rows_failed=F('rows_failed') + len(errors),
+                updated_at=timezone.now(),
+            )
+            bump_generation('products')
+        job.refresh_from_db()
+
+        for line, error in sorted(errors):
+            self.on_error(line, error)
+
+    def _resolve_owners(self, cleaned, errors):
+        usernames = {fields['owner'] or self.default_owner for _, fields in cleaned} - {None}
+        owners = get_user_model().objects.in_bulk(usernames, field_name='username')
+        for line, fields in cleaned:
+            username = fields['owner'] or self.default_owner
+            if username not in owners:
+                errors.append((line, f'unknown owner {username!r}' if username else 'owner is required'))
+        return owners
+
+    @staticmethod
+    def _max_product_id():
+        return Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+    @staticmethod
+    def _read_back_ids(products, before):
+        # MySQL can't return ids from a multi-row INSERT, and with concurrent
+        # inserts or interleaved auto-increment locking they needn't follow
+        # row order. Match rows on the columns this chunk wrote instead;
+        # rows that agree on all of them are identical, so either id will do.
+        def key(values):
+            # An empty FileField reads back as '' or NULL
+            return tuple(str(value or '') if field == 'audio_file' else value
+                         for field, value in zip(READ_BACK_FIELDS, values))
+
+        ids = defaultdict(list)
+        rows = Product.objects.filter(
+            pk__gt=before, owner_id__in={product.owner_id for product in products},
+        ).order_by('-id').values_list('id', *READ_BACK_FIELDS)
+        for pk, *values in rows:
+            ids[key(values)].append(pk)
+        for product in products:
+            product.pk = ids[key(getattr(product, field) for field in READ_BACK_FIELDS)].pop()
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from audio_marketplace.benchmark import rolled_back
+from products.models import AudioMetadata, Product
+
+
+FORMATS = ['wav', 'mp3', 'flac', 'aiff', 'ogg']
+SAMPLE_RATES = [44100, 48000, 96000]
+
+# (label, filter through the audio_metadata join, same filter on the mirrored columns, ordering pair)
+QUERIES = [
+    (
+        'wav 48k 30-60s',
+        {'audio_metadata__file_format': 'wav', 'audio_metadata__sample_rate': 48000,
+         'audio_metadata__duration__gte': 30, 'audio_metadata__duration__lte': 60},
+        {'audio_format': 'wav', 'audio_sample_rate': 48000, 'audio_duration__gte': 30, 'audio_duration__lte': 60},
+        (('-created_at', '-id'), ('-created_at', '-id')),
+    ),
+    (
+        'longest first',
+        {'audio_metadata__duration__isnull': False},
+        {'audio_duration__isnull': False},
+        (('-audio_metadata__duration', '-id'), ('-audio_duration', '-id')),
+    ),
+    (
+        'bit rate <= 320 kbps',
+        {'audio_metadata__bit_rate__lte': 320000},
+        {'audio_bit_rate__lte': 320000},
+        (('audio_metadata__bit_rate', 'id'), ('audio_bit_rate', 'id')),
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare audio property filters through the metadata join and on Product columns (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def _p50(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        batch = 10000
+
+        with rolled_back():
+            owner = get_user_model().objects.create(username='bench-audio-owner')
+            for start in range(0, options['products'], batch):
+                rows = [
+                    (rng.choice(FORMATS), rng.choice(SAMPLE_RATES), round(rng.uniform(5, 600), 2),
+                     rng.choice([128000, 192000, 320000, 1411200, 2304000]))
+                    for _ in range(min(batch, options['products'] - start))
+                ]
+                products = Product.objects.bulk_create(
+                    Product(
+                        title=f'Track {start + i}', description='', price=i % 100, owner=owner,
+                        audio_format=file_format, audio_sample_rate=sample_rate,
+                        audio_duration=duration, audio_bit_rate=bit_rate, audio_channels=2,
+                    )
+                    for i, (file_format, sample_rate, duration, bit_rate) in enumerate(rows)
+                )
+                if products[0].pk is None:
+                    # No RETURNING (MySQL): read the ids of the batch back
+                    ids = Product.objects.filter(owner=owner).order_by('-id').values_list('id', flat=True)[:len(rows)]
+                    for product, pk in zip(products, reversed(list(ids))):
+                        product.pk = pk
+                AudioMetadata.objects.bulk_create(
+                    AudioMetadata(
+                        product_id=product.pk, file_format=file_format, sample_rate=sample_rate,
+                        duration=duration, bit_rate=bit_rate, channels=2, status='ready',
+                    )
+                    for product, (file_format, sample_rate, duration, bit_rate) in zip(products, rows)
+                )
+
+            self.stdout.write(f'{options["products"]} products, p50 of {options["repeat"]} runs, '
+                              f'first page of {options["page_size"]}')
+            size = options['page_size']
+            for label, joined, mirrored, (joined_order, mirrored_order) in QUERIES:
+                before = self._p50(Product.objects.filter(**joined).order_by(*joined_order)[:size], options['repeat'])
+                after = self._p50(Product.objects.filter(**mirrored).order_by(*mirrored_order)[:size], options['repeat'])
+                self.stdout.write(
+                    f'{label:16} join {before:8.2f} ms   columns {after:8.2f} ms   {before / max(after, 1e-6):6.1f}x'
+                )
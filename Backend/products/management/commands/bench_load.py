@@ -0,0 +1,144 @@
+import json
+import subprocess
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, setup_test_environment, teardown_databases
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from audio_marketplace.benchmark import (
+    AUDIO_FILES, KINDS, SCALES, STYLES, USERNAME, run_endpoint, seed_dataset, write_audio_files
+)
+from products.models import Product
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset into a throwaway test database and load the API from concurrent workers. '
+        'Prints requests/sec, p50/p95/p99 latency and queries per request for each endpoint as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='10k')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+        parser.add_argument('--endpoints', nargs='+', help='Only run these endpoints')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database and reuse its data on the next run')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Disable the shared cache so every request takes the database path')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def endpoints(self, products, categories, tokens):
+        def pick(values, i):
+            return values[i * 7919 % len(values)]
+
+        def anonymous(url):
+            return url, {}
+
+        return {
+            'product-list': lambda i: anonymous(f'/api/products/?page={i % 20 + 1}'),
+            'product-list-cursor': lambda i: anonymous('/api/products/?pagination=cursor&ordering=-rating'),
+            'product-list-filtered': lambda i: anonymous(
+                f'/api/products/?category={pick(categories, i)}&ordering=price&pagination=cursor'
+            ),
+            'product-list-audio': lambda i: anonymous(
+                f'/api/products/?fileFormat=wav&minDuration={i % 4 + 1}&pagination=cursor'
+            ),
+            # What a grid of tiles needs, against product-list's full payload
+            'product-list-grid': lambda i: anonymous(
+                f'/api/products/?page={i % 20 + 1}&fields=id,title,price,audio_file'
+            ),
+            'product-search': lambda i: anonymous(f'/api/products/?search={pick(STYLES, i)}+{pick(KINDS, i + 3)}'),
+            'product-facets': lambda i: anonymous(f'/api/products/facets/?category={pick(categories, i)}'),
+            'product-detail': lambda i: anonymous(f'/api/products/{pick(products, i)}/'),
+            'product-stream': lambda i: (
+                f'/api/products/{pick(products, i)}/stream/', {'HTTP_RANGE': 'bytes=0-65535'}
+            ),
+            'category-tree': lambda i: anonymous('/api/categories/tree/'),
+            'review-list': lambda i: anonymous(f'/api/reviews/?product={pick(products, i)}'),
+            'review-list-summary': lambda i: anonymous(
+                f'/api/reviews/?product={pick(products, i)}&fields=id,username,rating'
+            ),
+            'order-list': lambda i: ('/api/orders/', {'HTTP_AUTHORIZATION': f'Bearer {pick(tokens, i)}'}),
+            # Order history table: no lines; then lines without the embedded products
+            'order-list-summary': lambda i: (
+                '/api/orders/?fields=id,status,total_amount,created_at',
+                {'HTTP_AUTHORIZATION': f'Bearer {pick(tokens, i)}'},
+            ),
+            'order-list-items': lambda i: (
+                '/api/orders/?fields=id,status,total_amount,created_at&expand=items',
+                {'HTTP_AUTHORIZATION': f'Bearer {pick(tokens, i)}'},
+            ),
+        }
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        scale = SCALES[options['scale']]
+
+        def log(message):
+            if verbosity:
+                self.stderr.write(message)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        overrides = {'MEDIA_ROOT': tempfile.mkdtemp(prefix='bench-load-'), 'DEBUG': False}
+        if options['no_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        try:
+            with override_settings(**overrides):
+                # The audio files are regenerated each run; a kept database finds them under the same names
+                existing = Product.objects.count()
+                if existing and existing != scale:
+                    raise CommandError(f'Kept database holds {existing} products, not {scale}; run without --keepdb')
+                if existing:
+                    write_audio_files(AUDIO_FILES)
+                else:
+                    seed_dataset(scale, log=log)
+
+                # Same sample every run so reports diff cleanly
+                ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+                products = ids[::max(len(ids) // 1000, 1)]
+                categories = list(Product.objects.values_list('category', flat=True).distinct().order_by('category'))
+                buyers = get_user_model().objects.filter(username__in=[USERNAME.format(i) for i in range(50)])
+                tokens = [str(RefreshToken.for_user(user).access_token) for user in buyers]
+
+                endpoints = self.endpoints(products, categories, tokens)
+                selected = options['endpoints'] or list(endpoints)
+                unknown = set(selected) - set(endpoints)
+                if unknown:
+                    raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+                results = {}
+                for name in selected:
+                    log(f'{name}: {options["requests"]} requests, {options["workers"]} workers')
+                    results[name] = run_endpoint(endpoints[name], options['requests'], options['workers'])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'commit': _git_commit(),
+            'database': connection.vendor,
+            'scale': options['scale'],
+            'workers': options['workers'],
+            'requests_per_endpoint': options['requests'],
+            'cache': not options['no_cache'],
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,45 @@
+import os
+import struct
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from products.metadata import _extract
+
+
+def write_wav(path, seconds=1, sample_rate=44100, channels=2):
+    data_size = seconds * sample_rate * channels * 2
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                      sample_rate * channels * 2, channels * 2, 16))
+        f.write(b'data' + struct.pack('<I', data_size))
+        f.write(b'\0' * data_size)
+
+
+class Command(BaseCommand):
+    help = 'Measure metadata extraction throughput for a synthetic backlog at several worker counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            jobs = []
+            for i in range(options['files']):
+                path = os.path.join(directory, f'{i}.wav')
+                write_wav(path)
+                jobs.append((i, path))
+
+            worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+            for workers in worker_counts:
+                started = time.perf_counter()
+                if workers == 1:
+                    list(map(_extract, jobs))
+                else:
+                    with ProcessPoolExecutor(max_workers=workers) as executor:
+                        list(executor.map(_extract, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'workers={workers}: {len(jobs) / elapsed:.0f} files/s ({elapsed:.2f}s)')
@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from audio_marketplace.benchmark import rolled_back
+from audio_marketplace.pagination import KeysetPagination
+from products.models import Product
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare page-number and keyset pagination latency at shallow and deep pages (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _measure(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        page_size = KeysetPagination.page_size
+        ordering = ProductViewSet.orderings[ProductViewSet.default_ordering]
+
+        with rolled_back():
+            owner = get_user_model().objects.create(username='bench-pagination-owner')
+            Product.objects.bulk_create(
+                (
+                    Product(title=f'Track {i}', description='', price=i % 100, owner=owner)
+                    for i in range(options['products'])
+                ),
+                batch_size=10000,
+            )
+
+            deep = options['page']
+            # Position of the last row before the deep page, as a client would have it
+            anchor = Product.objects.order_by(*ordering)[(deep - 1) * page_size - 1]
+            paginator = KeysetPagination()
+            paginator.fields = ordering
+            cursor = paginator.encode_cursor(paginator.position(anchor))
+
+            rows = [
+                ('page-number', 1, '/api/products/?page=1'),
+                ('page-number', deep, f'/api/products/?page={deep}'),
+                ('keyset', 1, '/api/products/?pagination=cursor'),
+                ('keyset', deep, f'/api/products/?cursor={cursor}'),
+            ]
+            self.stdout.write(f'{options["products"]} products, page size {page_size}')
+            for mode, page, url in rows:
+                self.stdout.write(f'{mode:12} page {page:>6}: {self._measure(client, url, options["repeat"]):8.2f} ms')
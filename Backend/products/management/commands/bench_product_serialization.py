@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from audio_marketplace.benchmark import rolled_back
+from audio_marketplace.fieldsets import read_columns
+from products.models import AudioMetadata, Product
+from products.projections import product_projection
+from products.serializers import ProductSerializer
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = 'Compare product list serialization through ProductSerializer and the values() projection (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def _p50_us(self, render, count, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1e6 / count)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        count = options['products']
+        request = RequestFactory().get('/api/products/')
+
+        with rolled_back():
+            owner = get_user_model().objects.create(username='bench-serialization-owner')
+            for i in range(count):
+                product = Product.objects.create(
+                    title=f'Track {i}', description='Warm pad loop ' * 10, price=i % 100,
+                    category='Ambient', owner=owner, audio_file=f'audio_files/{i % 10:02x}/track.wav',
+                )
+                AudioMetadata.objects.update_or_create(product=product, defaults={
+                    'file_format': 'wav', 'duration': 30 + i % 60, 'sample_rate': 48000,
+                    'bit_rate': 1536000, 'channels': 2, 'status': 'ready',
+                })
+
+            columns, related = read_columns(ProductSerializer(), ProductViewSet.field_columns)
+            queryset = (Product.objects.filter(owner=owner).select_related(*related)
+                        .only(*columns).order_by('-id'))
+            instances = list(queryset)
+            projection = product_projection(request)
+            rows = list(queryset.values(*projection.columns))
+
+            def serializer():
+                return ProductSerializer(instances, many=True, context={'request': request}).data
+
+            def projected():
+                # Compiling the mappers is part of every request
+                projection = product_projection(request)
+                return [projection(row) for row in rows]
+
+            assert list(serializer()) == projected()
+            before = self._p50_us(serializer, count, options['repeat'])
+            after = self._p50_us(projected, count, options['repeat'])
+            self.stdout.write(f'{count} products, p50 of {options["repeat"]} runs, rows already fetched')
+            self.stdout.write(f'serializer  {before:8.1f} us/product')
+            self.stdout.write(f'projection  {after:8.1f} us/product   {before / max(after, 1e-9):6.1f}x')
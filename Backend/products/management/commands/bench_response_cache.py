@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from audio_marketplace.benchmark import rolled_back
+from audio_marketplace.cache import get_response_cache, response_cache_stats
+from categories.models import Category
+from products.models import Product
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = 'Measure anonymous catalog latency with a cold and a warm response cache (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def _percentiles(self, client, url, count, cold):
+        cache = get_response_cache()
+        timings = []
+        for _ in range(count):
+            if cold:
+                cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.status_code
+        quantiles = statistics.quantiles(timings, n=100)
+        return quantiles[49], quantiles[98]
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+
+        with rolled_back():
+            owner = get_user_model().objects.create(username='bench-cache-owner')
+            for i in range(20):
+                root = Category.objects.create(name=f'Bench root {i}')
+                Category.objects.create(name=f'Bench child {i}', parent=root)
+            Product.objects.bulk_create(
+                (
+                    Product(title=f'Track {i}', description='', price=i % 100, owner=owner)
+                    for i in range(options['products'])
+                ),
+                batch_size=10000,
+            )
+            product = Product.objects.filter(owner=owner).first()
+            reviewers = get_user_model().objects.bulk_create(
+                get_user_model()(username=f'bench-cache-reviewer-{i}') for i in range(50)
+            )
+            for i, reviewer in enumerate(reviewers):
+                Review.objects.create(product=product, user=reviewer, rating=i % 5 + 1, comment='')
+
+            urls = [
+                ('product-list', '/api/products/?ordering=price&minPrice=10'),
+                ('product-retrieve', f'/api/products/{product.pk}/'),
+                ('category-tree', '/api/categories/tree/'),
+                ('review-list', f'/api/reviews/?product={product.pk}'),
+            ]
+            self.stdout.write(f'{options["products"]} products, {options["requests"]} requests per run')
+            for name, url in urls:
+                cold_p50, cold_p99 = self._percentiles(client, url, options['requests'], cold=True)
+                warm_p50, warm_p99 = self._percentiles(client, url, options['requests'], cold=False)
+                # Cold runs clear the counters, so this covers the warm run only
+                hit_ratio = response_cache_stats([name])[name]['hit_ratio']
+                self.stdout.write(
+                    f'{name:16} cold p50 {cold_p50:7.2f} ms  p99 {cold_p99:7.2f} ms   '
+                    f'warm p50 {warm_p50:7.2f} ms  p99 {warm_p99:7.2f} ms   hit ratio {hit_ratio:.1%}'
+                )
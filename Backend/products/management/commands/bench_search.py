@@ -0,0 +1,71 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models.signals import post_save
+
+from audio_marketplace.benchmark import rolled_back
+from products.models import Product
+from products.search import rebuild_index, search_product_ids
+from products.signals import update_search_index
+
+WORDS = (
+    'ambient deep house techno drum bass loop vocal chill lofi cinematic guitar piano '
+    'synth pad kick snare hat groove dark bright warm analog vintage modern trap jazz'
+).split()
+# Long tail of rarer terms so postings lists look like a real catalog
+VOCABULARY = WORDS + [f'tag{i}' for i in range(20000)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark indexed search against title__icontains on a synthetic catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50)
+
+    def _timed(self, fn, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            fn(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), max(timings)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        queries = [' '.join(rng.sample(WORDS, rng.randint(1, 2))) for _ in range(options['queries'])]
+
+        post_save.disconnect(update_search_index, sender=Product)
+        try:
+            with rolled_back():
+                owner = get_user_model().objects.create(username='bench-search-owner')
+                Product.objects.bulk_create(
+                    (
+                        Product(
+                            title=' '.join(rng.sample(WORDS, 3)),
+                            description=' '.join(rng.choices(VOCABULARY, k=30)),
+                            category=rng.choice(WORDS),
+                            price=1,
+                            owner=owner,
+                        )
+                        for _ in range(options['products'])
+                    ),
+                    batch_size=5000,
+                )
+
+                started = time.perf_counter()
+                rebuild_index(batch_size=5000)
+                self.stdout.write(f'index build: {time.perf_counter() - started:.2f}s for {options["products"]} products')
+
+                p50, worst = self._timed(search_product_ids, queries)
+                self.stdout.write(f'indexed search: p50 {p50:.2f} ms, max {worst:.2f} ms')
+                p50, worst = self._timed(
+                    lambda q: list(Product.objects.filter(title__icontains=q).values_list('id', flat=True)[:1000]),
+                    queries,
+                )
+                self.stdout.write(f'title__icontains: p50 {p50:.2f} ms, max {worst:.2f} ms')
+        finally:
+            post_save.connect(update_search_index, sender=Product)
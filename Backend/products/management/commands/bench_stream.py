@@ -0,0 +1,60 @@
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Measure time-to-first-byte and memory per concurrent listener on the stream endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('--listeners', type=int, default=20)
+        parser.add_argument('--range', default='', help='Range header to send, e.g. "bytes=0-"')
+
+    def handle(self, *args, **options):
+        try:
+            product = Product.objects.get(pk=options['product_id'])
+        except Product.DoesNotExist:
+            raise CommandError('Product not found')
+        if not product.audio_file:
+            raise CommandError('Product has no audio file')
+
+        url = reverse('product-stream', args=[product.pk])
+        headers = {'HTTP_RANGE': options['range']} if options['range'] else {}
+        listeners = options['listeners']
+        ttfb = []
+        barrier = threading.Barrier(listeners)
+
+        def listen():
+            client = Client(HTTP_HOST='localhost')
+            barrier.wait()
+            started = time.perf_counter()
+            response = client.get(url, **headers)
+            body = iter(response.streaming_content)
+            next(body, None)
+            ttfb.append(time.perf_counter() - started)
+            for _ in body:
+                pass
+            response.close()
+
+        tracemalloc.start()
+        threads = [threading.Thread(target=listen) for _ in range(listeners)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        ttfb.sort()
+        self.stdout.write(f'listeners: {listeners}')
+        self.stdout.write(f'ttfb p50: {statistics.median(ttfb) * 1000:.2f} ms')
+        self.stdout.write(f'ttfb max: {ttfb[-1] * 1000:.2f} ms')
+        self.stdout.write(f'peak memory per listener: {peak / listeners / 1024:.1f} KiB')
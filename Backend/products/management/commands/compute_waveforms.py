@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.waveform import compute_waveforms
+
+
+class Command(BaseCommand):
+    help = 'Precompute waveform peaks for products with audio files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--all', action='store_true', help='Recompute products that already have waveforms')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(audio_file='').exclude(audio_file__isnull=True)
+        if not options['all']:
+            products = products.filter(waveforms__isnull=True)
+        product_ids = list(products.values_list('id', flat=True).distinct().order_by('id'))
+
+        started = time.perf_counter()
+        succeeded = failed = 0
+        batch_size = options['batch_size']
+        for offset in range(0, len(product_ids), batch_size):
+            ok, errors = compute_waveforms(product_ids[offset:offset + batch_size], workers=options['workers'])
+            succeeded += ok
+            failed += errors
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Computed waveforms for {succeeded} products ({failed} failed) in {elapsed:.2f}s'
+        )
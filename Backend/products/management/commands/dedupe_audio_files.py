@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from products.blobs import dedupe_audio_files
+
+
+class Command(BaseCommand):
+    help = 'Move media/audio_files into the content-addressed store, deduplicating identical files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = dedupe_audio_files(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        prefix = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(
+            f"Scanned {stats['scanned']} files: {stats['moved']} moved, {stats['duplicates']} duplicates removed "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {filesizeformat(stats['bytes_reclaimed'])}"))
@@ -0,0 +1,33 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.metadata import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Extract audio metadata for queued products using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            succeeded, failed = process_pending(
+                batch_size=options['batch_size'], workers=options['workers']
+            )
+            elapsed = time.perf_counter() - started
+            processed = succeeded + failed
+            if processed:
+                self.stdout.write(
+                    f'Extracted {succeeded} ok, {failed} failed in {elapsed:.2f}s '
+                    f'({processed / elapsed:.0f} files/s)'
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.chunked_uploads import collect_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned chunked upload sessions and their files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl', type=int, help='Idle seconds before a session expires (default UPLOAD_SESSION_TTL)')
+
+    def handle(self, *args, **options):
+        removed = collect_expired_sessions(options['ttl'])
+        self.stdout.write(f'Removed {removed} expired upload sessions')
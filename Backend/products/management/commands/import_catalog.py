@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Import products from a CSV or JSONL manifest and a directory of audio files (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='CSV (with a header row) or .jsonl file; columns: '
+                                             'title, description, price, category, owner, audio_file')
+        parser.add_argument('--audio-dir', default='.', help='Directory the audio_file column is relative to')
+        parser.add_argument('--owner', help='Username for rows without an owner column')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--restart', action='store_true', help='Ignore the saved checkpoint and start over')
+        parser.add_argument('--errors', help='Write rejected rows as "line,error" CSV to this file')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['manifest']):
+            raise CommandError(f"Manifest {options['manifest']} does not exist")
+
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+        started = time.perf_counter()
+        processed = 0
+
+        def on_error(line, error):
+            if errors_file:
+                errors_file.write(f'{line},"{error.replace(chr(34), chr(39))}"\n')
+
+        def on_chunk(job, rows):
+            nonlocal processed
+            processed += rows
+            self.stdout.write(
+                f'{job.rows_done} rows ({job.rows_imported} imported, {job.rows_failed} rejected), '
+                f'{processed / (time.perf_counter() - started):.0f} rows/s'
+            )
+
+        importer = CatalogImporter(
+            options['manifest'], options['audio_dir'], default_owner=options['owner'],
+            chunk_size=options['chunk_size'], workers=options['workers'], restart=options['restart'],
+            on_error=on_error, on_chunk=on_chunk,
+        )
+        try:
+            job = importer.run()
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {job.rows_imported} imported, {job.rows_failed} rejected of {job.rows_done} rows '
+            f'in {elapsed:.1f}s'
+        ))
+        self.stdout.write('Run compute_waveforms to generate waveforms for the imported tracks.')
@@ -0,0 +1,179 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import mutagen
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from audio_marketplace.cache import bump_generation
+from audio_marketplace.metrics import METADATA_EXTRACTIONS
+from audio_marketplace.timing import span
+
+from .models import AudioMetadata, Product
+
+METADATA_FIELDS = ('duration', 'sample_rate', 'bit_rate', 'channels', 'file_format', 'file_size')
+
+# AudioMetadata column -> Product column it is mirrored to for filtering
+PRODUCT_AUDIO_FIELDS = {
+    'file_format': 'audio_format',
+    'duration': 'audio_duration',
+    'sample_rate': 'audio_sample_rate',
+    'bit_rate': 'audio_bit_rate',
+    'channels': 'audio_channels',
+}
+
+# Rows left in 'processing' longer than this are assumed to belong to a dead worker
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def read_audio_metadata(path):
+    """
+    Read container metadata for the file at ``path``. Runs inside worker
+    processes, so it must not touch the database.
+    """
+    metadata = dict.fromkeys(METADATA_FIELDS)
+    metadata['file_format'] = os.path.splitext(path)[1][1:].lower()
+    metadata['file_size'] = os.path.getsize(path)
+
+    with span('audio'):
+        audio = mutagen.File(path)
+    if audio is not None and hasattr(audio, 'info'):
+        metadata['duration'] = getattr(audio.info, 'length', None)
+        metadata['sample_rate'] = getattr(audio.info, 'sample_rate', None)
+        metadata['bit_rate'] = getattr(audio.info, 'bitrate', None)
+        metadata['channels'] = getattr(audio.info, 'channels', None)
+    return metadata
+
+
+def _extract(job):
+    metadata_id, path = job
+    try:
+        return metadata_id, read_audio_metadata(path), None
+    except Exception as e:
+        # Keep what can be known without parsing, as the lazy path used to
+        values = dict.fromkeys(METADATA_FIELDS)
+        values['file_format'] = os.path.splitext(path)[1][1:].lower()
+        if os.path.exists(path):
+            values['file_size'] = os.path.getsize(path)
+        return metadata_id, values, str(e)
+
+
+def copy_to_products(metadata_rows, clear=False):
+    """
+    Mirror the filterable columns of ``metadata_rows`` onto their products,
+    or reset them when ``clear`` is set (the metadata was deleted)
+    """
+    products = [
+        Product(pk=metadata.product_id, **{
+            column: None if clear else getattr(metadata, source) for source, column in PRODUCT_AUDIO_FIELDS.items()
+        })
+        for metadata in metadata_rows
+    ]
+    Product.objects.bulk_update(products, list(PRODUCT_AUDIO_FIELDS.values()))
+
+
+def enqueue_extraction(product, ingested=None):
+    """
+    Reset the product's metadata row to pending so a worker picks it up.
+    ``ingested`` metadata from AudioIngestUploadHandler skips the queue.
+    """
+    defaults = {field: None for field in METADATA_FIELDS}
+    if ingested:
+        defaults.update({field: ingested.get(field) for field in METADATA_FIELDS})
+        defaults.update(status='ready', claimed_at=None)
+    else:
+        defaults.update(status='pending', claimed_at=None)
+    AudioMetadata.objects.update_or_create(product=product, defaults=defaults)
+
+    if not ingested and getattr(settings, 'AUDIO_METADATA_EAGER', False):
+        transaction.on_commit(lambda: process_pending(product_ids=[product.pk]))
+
+
+def claim_pending(batch_size, product_ids=None):
+    """
+    Atomically mark up to ``batch_size`` pending rows as processing and
+    return them. ``skip_locked`` lets several workers share the queue;
+    only the metadata rows are locked, so product edits don't wait on (or
+    hide jobs from) a claim.
+    """
+    stale = timezone.now() - CLAIM_TIMEOUT
+    with transaction.atomic():
+        queryset = AudioMetadata.objects.filter(status='pending') | AudioMetadata.objects.filter(
+            status='processing', claimed_at__lt=stale
+        )
+        if product_ids is not None:
+            queryset = queryset.filter(product_id__in=product_ids)
+        claimed = list(
+            queryset.select_for_update(skip_locked=True, of=('self',))
+            .select_related('product')
+            .order_by('id')[:batch_size]
+        )
+        now = timezone.now()
+        AudioMetadata.objects.filter(pk__in=[m.pk for m in claimed]).update(status='processing', claimed_at=now)
+    # The claim is the token process_pending writes back against
+    for metadata in claimed:
+        metadata.status, metadata.claimed_at = 'processing', now
+    return claimed
+
+
+def _write_back(metadata, values, status):
+    """
+    Store the extraction result unless the row was re-queued (the audio was
+    replaced) or reclaimed since it was claimed. Returns whether it was.
+    """
+    return AudioMetadata.objects.filter(
+        pk=metadata.pk, status='processing', claimed_at=metadata.claimed_at,
+    ).update(**values, status=status) == 1
+
+
+def process_pending(batch_size=500, workers=None, product_ids=None):
+    """
+    Drain the pending queue. With ``workers`` > 1 the file parsing runs in
+    a process pool; otherwise it runs in this process. Returns the number
+    of (succeeded, failed) rows.
+    """
+    succeeded = failed = 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        while True:
+            claimed = claim_pending(batch_size, product_ids)
+            if not claimed:
+                break
+
+            jobs = [
+                (metadata.pk, os.path.join(settings.MEDIA_ROOT, metadata.product.audio_file.name))
+                for metadata in claimed
+            ]
+            if executor:
+                results = executor.map(_extract, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+            else:
+                results = map(_extract, jobs)
+
+            # Parse everything before the write-back transaction opens
+            results = list(results)
+            by_id = {metadata.pk: metadata for metadata in claimed}
+            written = []
+            with transaction.atomic():
+                for metadata_id, values, error in results:
+                    metadata = by_id[metadata_id]
+                    status = 'ready' if error is None else 'failed'
+                    if not _write_back(metadata, {field: values[field] for field in METADATA_FIELDS}, status):
+                        continue
+                    for field in METADATA_FIELDS:
+                        setattr(metadata, field, values[field])
+                    metadata.status = status
+                    written.append(metadata)
+                    if error is None:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    METADATA_EXTRACTIONS.inc(result='success' if error is None else 'failure')
+                copy_to_products(written)
+            # bulk_update sends no signals
+            bump_generation('products')
+    finally:
+        if executor:
+            executor.shutdown()
+    return succeeded, failed
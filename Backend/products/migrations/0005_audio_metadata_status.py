@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+def queue_existing(apps, schema_editor):
+    AudioMetadata = apps.get_model('products', 'AudioMetadata')
+    Product = apps.get_model('products', 'Product')
+
+    # Rows that exist were extracted by the old lazy path
+    AudioMetadata.objects.update(status='ready')
+    missing = Product.objects.exclude(audio_file='').exclude(audio_file__isnull=True).filter(audio_metadata__isnull=True)
+    AudioMetadata.objects.bulk_create(
+        [AudioMetadata(product_id=pk, status='pending') for pk in missing.values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiometadata',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audiometadata',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.RunPython(queue_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_audio_metadata_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioWaveform',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.PositiveIntegerField()),
+                ('bits', models.PositiveSmallIntegerField()),
+                ('peaks', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waveforms', to='products.product')),
+            ],
+            options={
+                'unique_together': {('product', 'resolution')},
+            },
+        ),
+    ]
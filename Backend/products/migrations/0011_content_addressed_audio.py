@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:43
+
+import products.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_references(apps, schema_editor):
+    # Existing files keep their names; dedupe_audio_files moves them into the content store
+    Product = apps.get_model('products', 'Product')
+    AudioBlob = apps.get_model('products', 'AudioBlob')
+    rows = (
+        Product.objects.exclude(audio_file='').exclude(audio_file__isnull=True)
+        .values('audio_file').annotate(refs=Count('id')).order_by()
+    )
+    AudioBlob.objects.bulk_create(
+        (AudioBlob(name=row['audio_file'], ref_count=row['refs']) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='audio_file',
+            field=models.FileField(blank=True, null=True, storage=products.storage.audio_storage, upload_to='audio_files/'),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
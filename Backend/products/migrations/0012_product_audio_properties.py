@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_audio_metadata(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    AudioMetadata = apps.get_model('products', 'AudioMetadata')
+    columns = {
+        'audio_format': 'file_format',
+        'audio_duration': 'duration',
+        'audio_sample_rate': 'sample_rate',
+        'audio_bit_rate': 'bit_rate',
+        'audio_channels': 'channels',
+    }
+    metadata = AudioMetadata.objects.filter(product=OuterRef('pk'))
+    Product.objects.update(**{
+        column: Subquery(metadata.values(source)[:1]) for column, source in columns.items()
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_content_addressed_audio'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='audio_bit_rate',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='audio_channels',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='audio_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='audio_format',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='audio_sample_rate',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['audio_duration', 'id'], name='product_duration_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['audio_bit_rate', 'id'], name='product_bitrate_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['audio_format', 'audio_sample_rate', 'audio_duration', 'id'], name='product_audio_filter_idx'),
+        ),
+        migrations.RunPython(copy_audio_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_category_price_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('writing', 'Writing a chunk'), ('complete', 'Complete')], db_index=True, default='open', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_upload_session_writing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('writing', 'Writing a chunk'), ('finalizing', 'Finalizing'), ('complete', 'Complete')], db_index=True, default='open', max_length=20),
+        ),
+    ]
@@ -1,6 +1,12 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import audio_storage
+
 User = get_user_model()
 
 class Category(models.Model):
@@ -18,20 +24,153 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
-    audio_file = models.FileField(upload_to='audio_files/', null=True, blank=True)
+    # Stored by content hash, see products.storage
+    audio_file = models.FileField(upload_to='audio_files/', storage=audio_storage, null=True, blank=True)
+    
+    # Review aggregates, maintained incrementally by reviews.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_average = models.FloatField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    
+    # Copy of the filterable AudioMetadata columns, kept in sync by
+    # products.metadata.copy_to_products, so audio filters need no join
+    audio_format = models.CharField(max_length=50, null=True, blank=True)
+    audio_duration = models.FloatField(null=True, blank=True)
+    audio_sample_rate = models.IntegerField(null=True, blank=True)
+    audio_bit_rate = models.IntegerField(null=True, blank=True)
+    audio_channels = models.IntegerField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination orderings (see ProductViewSet.orderings)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['rating_average', 'rating_count', 'id'], name='product_rating_id_idx'),
+            # ?category= browsing, filtered or sorted by price
+            models.Index(fields=['category', 'price', 'id'], name='product_category_price_idx'),
+            models.Index(fields=['audio_duration', 'id'], name='product_duration_id_idx'),
+            models.Index(fields=['audio_bit_rate', 'id'], name='product_bitrate_id_idx'),
+            # Equality filters first, then the duration range ("WAV, 48 kHz, 30-60 s")
+            models.Index(
+                fields=['audio_format', 'audio_sample_rate', 'audio_duration', 'id'],
+                name='product_audio_filter_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
 
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
 class AudioMetadata(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='audio_metadata')
     duration = models.FloatField(null=True, blank=True)  # Duration in seconds
     sample_rate = models.IntegerField(null=True, blank=True)  # Sample rate in Hz
-    bit_rate = models.IntegerField(null=True, blank=True)  # Bit rate in kbps
+    bit_rate = models.IntegerField(null=True, blank=True)  # Bit rate in bits per second
     file_format = models.CharField(max_length=50, null=True, blank=True)  # e.g., 'mp3', 'wav'
     channels = models.IntegerField(null=True, blank=True)  # Number of audio channels
     file_size = models.IntegerField(null=True, blank=True)  # Size in bytes
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When a worker picked the row up
     
     def __str__(self):
         return f"Audio metadata for {self.product.title}"
 
+class SearchDocument(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='search_document')
+    length = models.PositiveIntegerField(default=0)  # Weighted token count, used for BM25 length normalisation
+
+    def __str__(self):
+        return f"Search document for {self.product.title}"
+
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_postings')
+    weight = models.PositiveIntegerField()  # Field-weighted term frequency
+
+    class Meta:
+        unique_together = ('term', 'product')
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+class AudioWaveform(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='waveforms')
+    resolution = models.PositiveIntegerField()  # Number of min/max peak pairs across the track
+    bits = models.PositiveSmallIntegerField()  # 8 or 16, sample width of the packed peaks
+    peaks = models.BinaryField()  # Interleaved min/max pairs, little-endian signed ints
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('product', 'resolution')
+
+    def __str__(self):
+        return f"{self.resolution}-peak waveform for {self.product_id}"
+
+class CatalogImport(models.Model):
+    manifest = models.CharField(max_length=500, unique=True)  # Absolute path of the manifest file
+    rows_done = models.PositiveIntegerField(default=0)  # Manifest rows committed, imported or rejected
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import of {self.manifest} ({self.rows_done} rows)"
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('writing', 'Writing a chunk'),
+        ('finalizing', 'Finalizing'),
+        ('complete', 'Complete'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    file_name = models.CharField(max_length=255)  # Client's name for the file
+    total_size = models.BigIntegerField()  # Declared size in bytes
+    chunk_size = models.PositiveIntegerField()  # Every chunk but the last has exactly this size
+    received = models.BigIntegerField(default=0)  # Contiguous bytes written so far
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', db_index=True)
+    stored_name = models.CharField(max_length=255, blank=True)  # Storage name once finalized
+    sha256 = models.CharField(max_length=64, blank=True)
+    audio_metadata = models.JSONField(null=True, blank=True)  # Header metadata parsed at finalize
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.file_name}"
+
+    @property
+    def next_chunk(self):
+        return self.received // self.chunk_size
+
+    @property
+    def expires_at(self):
+        return self.updated_at + timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+class AudioBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # Storage name of the file
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.BigIntegerField(default=0)  # Bytes on disk
+    ref_count = models.PositiveIntegerField(default=0)  # Products whose audio_file is this file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
@@ -0,0 +1,211 @@
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import (
+    Avg, Case, Count, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+)
+from django.db.models.functions import Coalesce
+
+from audio_marketplace.cache import bump_generation
+from .models import Product, SearchDocument, SearchPosting
+
+# Field weights applied to term frequencies (a simplified BM25F)
+FIELD_WEIGHTS = {
+    'title': 3,
+    'category': 2,
+    'owner': 2,
+    'description': 1,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Completions of a partially typed last term that take part in a search,
+# most common first; keeps the scoring expression small for short prefixes
+PREFIX_EXPANSIONS = 50
+
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = frozenset({'a', 'an', 'and', 'the', 'of', 'in', 'on', 'for', 'to', 'with', 'by'})
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def _product_fields(product, owner_username):
+    return {
+        'title': product.title,
+        'category': product.category,
+        'owner': owner_username,
+        'description': product.description,
+    }
+
+
+def build_postings(product, owner_username):
+    """
+    Return (document length, {term: weight}) for a product
+    """
+    weights = Counter()
+    for field, text in _product_fields(product, owner_username).items():
+        for token in tokenize(text):
+            weights[token] += FIELD_WEIGHTS[field]
+    return sum(weights.values()), weights
+
+
+def index_product(product):
+    """
+    Replace the index entries of a single product
+    """
+    owner_username = product.owner.username if product.owner_id else ''
+    length, weights = build_postings(product, owner_username)
+
+    with transaction.atomic():
+        SearchPosting.objects.filter(product=product).delete()
+        SearchPosting.objects.bulk_create([
+            SearchPosting(term=term, product=product, weight=weight)
+            for term, weight in weights.items()
+        ])
+        SearchDocument.objects.update_or_create(product=product, defaults={'length': length})
+
+
+def index_products(products, batch_size=1000):
+    """
+    Replace the index entries of many products in a handful of statements.
+    Each product's owner must already be loaded.
+    """
+    documents, postings = [], []
+    for product in products:
+        length, weights = build_postings(product, product.owner.username)
+        documents.append(SearchDocument(product_id=product.pk, length=length))
+        postings.extend(
+            SearchPosting(term=term, product_id=product.pk, weight=weight)
+            for term, weight in weights.items()
+        )
+
+    with transaction.atomic():
+        SearchPosting.objects.filter(product__in=products).delete()
+        SearchDocument.objects.filter(product__in=products).delete()
+        SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+        SearchPosting.objects.bulk_create(postings, batch_size=batch_size)
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Rebuild the whole index from scratch. Returns the number of products indexed.
+    """
+    indexed = 0
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+
+        products = (
+            Product.objects
+            .only('id', 'title', 'description', 'category', 'owner__username')
+            .select_related('owner')
+            .order_by('id')
+        )
+        documents, postings = [], []
+        for product in products.iterator(chunk_size=batch_size):
+            length, weights = build_postings(product, product.owner.username)
+            documents.append(SearchDocument(product_id=product.pk, length=length))
+            postings.extend(
+                SearchPosting(term=term, product_id=product.pk, weight=weight)
+                for term, weight in weights.items()
+            )
+            indexed += 1
+
+            if len(documents) >= batch_size:
+                SearchDocument.objects.bulk_create(documents)
+                SearchPosting.objects.bulk_create(postings, batch_size=batch_size)
+                documents, postings = [], []
+
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=batch_size)
+        # Search ranking feeds cached list responses
+        bump_generation('products')
+
+    return indexed
+
+
+def term_frequencies(query):
+    """
+    {term: document frequency} of the indexed terms ``query`` matches. The
+    last query term is matched as a prefix so partially typed words still
+    hit, expanded to its PREFIX_EXPANSIONS most common completions.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return {}
+
+    *exact_terms, last_term = terms
+    rows = (
+        SearchPosting.objects.filter(Q(term__in=exact_terms) | Q(term__startswith=last_term))
+        .values('term').annotate(frequency=Count('id')).values_list('term', 'frequency')
+    )
+    frequencies, completions = {}, []
+    for term, frequency in rows:
+        # The typed word itself always counts, however many completions it has
+        if term in exact_terms or term == last_term:
+            frequencies[term] = frequency
+        else:
+            completions.append((term, frequency))
+    completions.sort(key=lambda item: (-item[1], item[0]))
+    frequencies.update(completions[:PREFIX_EXPANSIONS])
+    return frequencies
+
+
+def match_products(queryset, frequencies):
+    """
+    Narrow ``queryset`` to products with a posting for one of the terms
+    """
+    return queryset.filter(pk__in=SearchPosting.objects.filter(term__in=frequencies).values('product_id'))
+
+
+def rank_products(queryset, query):
+    """
+    Narrow ``queryset`` to products matching ``query`` and annotate each with
+    its BM25 ``search_score``. Scoring runs in the database over the rows
+    the queryset's own filters leave, so filtered searches, counts and
+    pages cover every match.
+    """
+    frequencies = term_frequencies(query)
+    stats = SearchDocument.objects.aggregate(total=Count('id'), avg_length=Avg('length'))
+    total_documents = stats['total']
+    if not frequencies or not total_documents:
+        return queryset.none()
+    avg_length = stats['avg_length'] or 1
+
+    # Inverse document frequencies over the whole catalog, not the filtered rows
+    idf = Case(*[
+        When(term=term, then=Value(math.log(1 + (total_documents - frequency + 0.5) / (frequency + 0.5))))
+        for term, frequency in frequencies.items()
+    ], output_field=FloatField())
+    length = Coalesce(OuterRef('search_document__length'), 0)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / Value(float(avg_length)))
+    score = ExpressionWrapper(
+        idf * F('weight') * (BM25_K1 + 1) / (F('weight') + norm), output_field=FloatField()
+    )
+    scores = (
+        SearchPosting.objects.filter(product=OuterRef('pk'), term__in=frequencies)
+        .values('product').annotate(score=Sum(score)).values('score')
+    )
+    return match_products(queryset, frequencies).annotate(search_score=Subquery(scores, output_field=FloatField()))
+
+
+def search_product_ids(query, limit=None):
+    """
+    Ids of all products matching ``query``, best match first
+    """
+    ranked = rank_products(Product.objects.all(), query).order_by('-search_score', 'id')
+    return list(ranked.values_list('id', flat=True)[:limit])
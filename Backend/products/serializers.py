@@ -1,5 +1,83 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import Product, AudioMetadata, Category
+from audio_marketplace.timing import TimedSerializerMixin
+from .chunked_uploads import attach_upload
+from .models import Product, AudioMetadata, Category, UploadSession
+from .utils import validate_audio_file
+
+def validate_audio_upload(value):
+    if value:
+        valid, error = validate_audio_file(value)
+        if not valid:
+            raise serializers.ValidationError(error)
+    return value
+
+class AttachUploadMixin:
+    """
+    Lets product writes reference a finalized chunked upload (``upload``)
+    instead of sending the audio file itself
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['upload'] = serializers.PrimaryKeyRelatedField(
+            queryset=UploadSession.objects.filter(status='complete'), write_only=True, required=False
+        )
+        return fields
+
+    def validate_upload(self, value):
+        request = self.context.get('request')
+        if request is not None and value.owner_id != request.user.id:
+            raise serializers.ValidationError("Upload not found.")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('upload') and attrs.get('audio_file'):
+            raise serializers.ValidationError("Send either audio_file or upload, not both.")
+        return super().validate(attrs)
+
+    def create(self, validated_data):
+        upload = validated_data.pop('upload', None)
+        if upload is None:
+            return super().create(validated_data)
+        with transaction.atomic():
+            product = Product(**validated_data)
+            attach_upload(product, upload)
+            product.save()
+        return product
+
+    def update(self, instance, validated_data):
+        upload = validated_data.pop('upload', None)
+        with transaction.atomic():
+            if upload is not None:
+                attach_upload(instance, upload)
+            return super().update(instance, validated_data)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(required=False, min_value=256 * 1024)
+    next_chunk = serializers.IntegerField(read_only=True)
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'file_name', 'total_size', 'chunk_size', 'received', 'next_chunk',
+                  'status', 'sha256', 'expires_at']
+        read_only_fields = ['id', 'received', 'status', 'sha256']
+
+    def validate_total_size(self, value):
+        max_size = getattr(settings, 'MAX_AUDIO_MASTER_SIZE', 2 * 1024 * 1024 * 1024)
+        if value <= 0:
+            raise serializers.ValidationError("total_size must be positive")
+        if value > max_size:
+            raise serializers.ValidationError(f"File size exceeds {max_size / (1024 * 1024):g}MB limit")
+        return value
+
+    def validate_chunk_size(self, value):
+        max_chunk = getattr(settings, 'MAX_UPLOAD_CHUNK_SIZE', 64 * 1024 * 1024)
+        if value > max_chunk:
+            raise serializers.ValidationError(f"chunk_size must be at most {max_chunk} bytes")
+        return value
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,16 +89,34 @@ class AudioMetadataSerializer(serializers.ModelSerializer):
         model = AudioMetadata
         fields = ['duration', 'sample_rate', 'bit_rate', 'file_format', 'channels', 'file_size']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, AttachUploadMixin, serializers.ModelSerializer):
     audio_details = AudioMetadataSerializer(source='audio_metadata', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
         fields = ['id', 'title', 'description', 'price', 'category', 'created_at', 
-                 'updated_at', 'owner', 'audio_file', 'audio_details']
+                 'updated_at', 'owner', 'audio_file', 'audio_details',
+                 'rating_count', 'rating_average', 'rating_histogram']
+        read_only_fields = ['rating_count', 'rating_average']
+
+    def validate_audio_file(self, value):
+        return validate_audio_upload(value)
 
-class ProductCreateSerializer(serializers.ModelSerializer):
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """
+    Slim read-only projection for embedding products in other resources
+    """
+    class Meta:
+        model = Product
+        fields = ['id', 'title', 'price', 'category', 'audio_file']
+        read_only_fields = fields
+
+class ProductCreateSerializer(AttachUploadMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['title', 'description', 'price', 'category', 'audio_file']
 
+    def validate_audio_file(self, value):
+        return validate_audio_upload(value)
+
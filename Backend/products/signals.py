@@ -0,0 +1,92 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from audio_marketplace.cache import bump_generation
+
+from .blobs import release_blob, retain_blobs
+from .metadata import copy_to_products, enqueue_extraction
+from .models import AudioMetadata, AudioWaveform, Product
+from .search import index_product
+
+
+def _loaded_audio_file(instance):
+    # Read the raw attribute so deferred fields don't trigger a query
+    value = instance.__dict__.get('audio_file')
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Product)
+def remember_audio_file(sender, instance, **kwargs):
+    instance._original_audio_file = _loaded_audio_file(instance)
+
+
+@receiver(pre_save, sender=Product)
+def capture_ingested_metadata(sender, instance, **kwargs):
+    # Saving the field replaces the upload with its stored name, so grab
+    # the metadata parsed during upload before that happens. Finalized
+    # chunked uploads set it directly (see chunked_uploads.attach_upload).
+    value = instance.__dict__.get('audio_file')
+    upload = getattr(value, '_file', value)
+    metadata = getattr(upload, 'audio_metadata', None)
+    if metadata is not None:
+        instance._ingested_audio_metadata = metadata
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    # Fixture loading (raw) goes through rebuild_search_index instead
+    if raw:
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def audio_file_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or 'audio_file' not in instance.__dict__:
+        return
+    if update_fields is not None and 'audio_file' not in update_fields:
+        return
+
+    audio_file = _loaded_audio_file(instance)
+    previous = instance._original_audio_file
+    if not created and audio_file == previous:
+        return
+    instance._original_audio_file = audio_file
+
+    # Move the reference; a file nobody references any more is deleted after commit
+    retain_blobs({audio_file: 1})
+    if not created:
+        release_blob(previous)
+
+    # Peaks for the previous file are stale; compute_waveforms picks the product up again
+    if not created:
+        AudioWaveform.objects.filter(product=instance).delete()
+
+    if audio_file:
+        enqueue_extraction(instance, ingested=instance.__dict__.pop('_ingested_audio_metadata', None))
+    else:
+        AudioMetadata.objects.filter(product=instance).delete()
+
+
+@receiver(post_save, sender=AudioMetadata)
+def mirror_audio_metadata(sender, instance, raw=False, **kwargs):
+    if not raw:
+        copy_to_products([instance])
+
+
+@receiver(post_delete, sender=AudioMetadata)
+def clear_audio_metadata(sender, instance, **kwargs):
+    copy_to_products([instance], clear=True)
+
+
+@receiver(post_delete, sender=Product)
+def release_audio_file(sender, instance, **kwargs):
+    release_blob(_loaded_audio_file(instance))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=AudioMetadata)
+@receiver(post_delete, sender=AudioMetadata)
+def invalidate_product_responses(sender, **kwargs):
+    bump_generation('products')
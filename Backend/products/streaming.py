@@ -0,0 +1,144 @@
+import mimetypes
+import os
+import uuid
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import renderers
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class PassthroughRenderer(renderers.JSONRenderer):
+    """
+    Lets audio responses through content negotiation for clients that only
+    accept audio/* (e.g. the <audio> element behind Howler's html5 mode)
+    """
+    media_type = '*/*'
+    format = None
+
+
+def file_etag(stat_result):
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range_header(header, size):
+    """
+    Parse a ``Range: bytes=...`` header into a list of inclusive (start, end)
+    tuples. Returns None when the header should be ignored and an empty list
+    when none of the ranges can be satisfied.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+
+    ranges = []
+    for part in header[len('bytes='):].split(','):
+        part = part.strip()
+        if '-' not in part:
+            return None
+        start, end = part.split('-', 1)
+        try:
+            if start == '':
+                # Suffix range: the last N bytes
+                length = int(end)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start)
+                end = int(end) if end else size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        if start > end:
+            return None
+        ranges.append((start, min(end, size - 1)))
+
+    # Merge overlapping/adjacent ranges so clients can't multiply the body size
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _read_multipart(path, ranges, size, content_type, boundary):
+    for start, end in ranges:
+        yield (
+            f'\r\n--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'
+        ).encode()
+        yield from _read_range(path, start, end)
+    yield f'\r\n--{boundary}--\r\n'.encode()
+
+
+def _if_range_matches(if_range, etag, mtime):
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    # A date validator only matches the exact Last-Modified (RFC 9110 13.1.5)
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(mtime) == if_range_date
+
+
+def stream_file(request, path):
+    """
+    Build a response for ``path`` honouring Range, If-Range and
+    If-None-Match. Full-body responses go through FileResponse so the server
+    can use wsgi.file_wrapper/sendfile; partial responses are streamed in
+    fixed-size chunks so memory stays flat per listener.
+    """
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        ranges = None
+        if _if_range_matches(request.META.get('HTTP_IF_RANGE'), etag, stat_result.st_mtime):
+            ranges = parse_range_header(request.META.get('HTTP_RANGE'), size)
+
+        if ranges is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        elif not ranges:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = StreamingHttpResponse(
+                _read_range(path, start, end), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            boundary = uuid.uuid4().hex
+            response = StreamingHttpResponse(
+                _read_multipart(path, ranges, size, content_type, boundary),
+                status=206,
+                content_type=f'multipart/byteranges; boundary={boundary}',
+            )
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat_result.st_mtime)
+    return response
@@ -1,3 +1,990 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import wave
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models.functions import Lower
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from audio_marketplace.pagination import KeysetPagination
+from audio_marketplace.testing import QueryBudgetTestCase
+from .audio_headers import AudioHeaderParser
+from .blobs import delete_if_unreferenced, retain_blobs
+from .chunked_uploads import (
+    CHUNK_CLAIM_TIMEOUT, UploadError, collect_expired_sessions, create_session, finalize_session, part_path,
+    write_chunk,
+)
+from . import metadata as metadata_module
+from .importer import CatalogImporter
+from .metadata import CLAIM_TIMEOUT, claim_pending, process_pending
+from .models import AudioBlob, AudioMetadata, Product, UploadSession
+from .views import ProductViewSet
+from .search import PREFIX_EXPANSIONS, search_product_ids, term_frequencies
+from .storage import audio_storage, content_name
+from .waveform import WAVEFORM_LEVELS, compute_peaks, compute_waveforms
+from .streaming import stream_file
+
+
+class ProductQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        for i in range(30):
+            product = Product.objects.create(title=f'Track {i}', description='', price=i + 1, owner=cls.owner)
+            AudioMetadata.objects.create(product=product, duration=30, file_format='wav', status='ready')
+        cls.product = product
+
+    def test_list(self):
+        # COUNT and one page joined with audio metadata
+        response = self.assertGetWithinBudget(2, '/api/products/')
+        self.assertEqual(response.data['results'][0]['audio_details']['file_format'], 'wav')
+
+    def test_list_cursor(self):
+        self.assertGetWithinBudget(1, '/api/products/', {'pagination': 'cursor'})
+
+    def test_list_filtered_and_sorted(self):
+        self.assertGetWithinBudget(2, '/api/products/', {'minPrice': 5, 'ordering': '-price'})
+
+    def test_search(self):
+        # Term frequencies, index statistics, COUNT and the page
+        self.assertGetWithinBudget(4, '/api/products/', {'search': 'track'})
+
+    def test_retrieve(self):
+        self.assertGetWithinBudget(1, f'/api/products/{self.product.pk}/')
+
+
+class ProductSearchTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        cls.title_match = Product.objects.create(title='Granular pad', description='', price=5, owner=cls.owner)
+        cls.description_match = Product.objects.create(
+            title='Evening', description='A slow granular texture', price=50, category='Ambient', owner=cls.owner
+        )
+        cls.other = Product.objects.create(title='Kick', description='Punchy', price=1, owner=cls.owner)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/products/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.data['results']]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('granular'), [self.title_match.pk, self.description_match.pk])
+        self.assertEqual(search_product_ids('granular'), [self.title_match.pk, self.description_match.pk])
+
+    def test_last_term_matches_as_prefix(self):
+        self.assertEqual(self.search('gran'), [self.title_match.pk, self.description_match.pk])
+        self.assertEqual(self.search('slow gra'), [self.description_match.pk, self.title_match.pk])
+        self.assertEqual(self.search('gra slow'), [self.description_match.pk])
+
+    def test_prefix_expands_to_the_most_common_completions(self):
+        for i in range(PREFIX_EXPANSIONS + 5):
+            Product.objects.create(title=f'Zed{i:03d}', description='', price=1, owner=self.owner)
+        Product.objects.create(title='Zed', description='', price=1, owner=self.owner)
+        frequencies = term_frequencies('zed')
+        self.assertEqual(len(frequencies), PREFIX_EXPANSIONS + 1)
+        self.assertIn('zed', frequencies)
+
+    def test_filters_apply_before_ranking(self):
+        self.assertEqual(self.search('granular', category='Ambient'), [self.description_match.pk])
+        response = self.client.get('/api/products/', {'search': 'granular', 'minPrice': 10})
+        self.assertEqual(response.data['count'], 1)
+        facets = self.client.get('/api/products/facets/', {'search': 'granular'}).data
+        self.assertEqual(sum(bucket['count'] for bucket in facets['category']), 2)
+
+    def test_cursor_pages_keep_the_ranking(self):
+        for i in range(5):
+            Product.objects.create(title=f'Granular {"granular " * i}take', description='', price=1, owner=self.owner)
+        ranked = search_product_ids('granular')
+        self.assertEqual(len(ranked), 7)
+
+        seen, url = [], '/api/products/?search=granular&pagination=cursor'
+        with mock.patch.object(KeysetPagination, 'page_size', 3):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                seen += [product['id'] for product in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(seen, ranked)
+        self.assertEqual(self.search('granular'), ranked)
+
+    def test_cursor_refuses_expression_orderings(self):
+        queryset = Product.objects.order_by(Lower('title'), 'id')
+        with self.assertRaises(ValidationError):
+            KeysetPagination().get_ordering(queryset)
+
+    def test_index_follows_saves_and_deletes(self):
+        # Writes invalidate cached responses on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = 'Granular kick'
+            self.other.save()
+        self.assertIn(self.other.pk, self.search('granular'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.delete()
+        self.assertNotIn(self.other.pk, self.search('granular'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.title_match.title = 'Pad'
+            self.title_match.save()
+        self.assertEqual(self.search('granular'), [self.description_match.pk])
+
+
+class ProductResponseCacheTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        cls.product = Product.objects.create(title='Track', description='', price=5, owner=cls.owner)
+
+    def test_anonymous_reads_are_served_from_cache(self):
+        cold = self.assertGetWithinBudget(2, '/api/products/', {'minPrice': 1, 'ordering': 'price'})
+        # Same parameters in another order hit the same entry
+        warm = self.assertGetWithinBudget(0, '/api/products/', {'ordering': 'price', 'minPrice': 1})
+        self.assertEqual(warm.content, cold.content)
+        self.assertEqual(warm['ETag'], cold['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        etag = self.client.get(f'/api/products/{self.product.pk}/')['ETag']
+        response = self.client.get(f'/api/products/{self.product.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_hits_keep_the_vary_and_allow_headers(self):
+        cold = self.client.get('/api/products/')
+        warm = self.assertGetWithinBudget(0, '/api/products/')
+        self.assertIn('Accept', warm['Vary'])
+        self.assertEqual(warm['Vary'], cold['Vary'])
+        self.assertEqual(warm['Allow'], cold['Allow'])
+        not_modified = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=cold['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn('Accept', not_modified['Vary'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'mirror.example.com'])
+    def test_entries_are_per_host_and_scheme(self):
+        # A second page, so the body carries an absolute next link
+        Product.objects.bulk_create(
+            Product(title=f'Track {i}', description='', price=5, owner=self.owner) for i in range(10)
+        )
+        self.assertTrue(self.client.get('/api/products/').json()['next'].startswith('http://testserver/'))
+        mirror = self.assertGetWithinBudget(2, '/api/products/', HTTP_HOST='mirror.example.com')
+        self.assertTrue(mirror.json()['next'].startswith('http://mirror.example.com/'))
+        secure = self.assertGetWithinBudget(2, '/api/products/', secure=True)
+        self.assertTrue(secure.json()['next'].startswith('https://testserver/'))
+
+    def test_browsable_api_is_not_cached(self):
+        self.client.get('/api/products/', HTTP_ACCEPT='text/html')
+        response = self.client.get('/api/products/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertNotIn('ETag', response)
+
+    def test_write_invalidates_cached_responses(self):
+        self.client.get(f'/api/products/{self.product.pk}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).update(title='Renamed')
+            self.product.refresh_from_db()
+            self.product.save()
+        response = self.assertGetWithinBudget(1, f'/api/products/{self.product.pk}/')
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+    def test_authenticated_reads_bypass_cache(self):
+        self.client.force_authenticate(self.owner)
+        self.client.get('/api/products/')
+        response = self.assertGetWithinBudget(2, '/api/products/')
+        self.assertNotIn('ETag', response)
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.audio_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.audio_dir)
+        User.objects.create_user('seller', 'seller@example.com', 'pass')
+
+        with wave.open(os.path.join(self.audio_dir, 'loop.wav'), 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b'\0\0' * 16000)
+        self.manifest = os.path.join(self.audio_dir, 'manifest.csv')
+        with open(self.manifest, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['title', 'description', 'price', 'category', 'audio_file'])
+            writer.writerow(['Loop', 'A loop', '4.99', 'Loops', 'loop.wav'])
+            writer.writerow(['Broken price', '', 'free', '', ''])
+            writer.writerow(['Sketch', '', '1.00', '', ''])
+
+    def test_import_and_resume(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            job = CatalogImporter(self.manifest, self.audio_dir, default_owner='seller', chunk_size=2).run()
+            self.assertEqual((job.rows_done, job.rows_imported, job.rows_failed), (3, 2, 1))
+
+            loop = Product.objects.get(title='Loop')
+            self.assertTrue(os.path.exists(loop.audio_file.path))
+            self.assertEqual(loop.audio_metadata.status, 'ready')
+            self.assertEqual(loop.audio_metadata.duration, 2)
+            self.assertIn(loop.pk, search_product_ids('loop'))
+
+            # A finished import has nothing left to do
+            CatalogImporter(self.manifest, self.audio_dir, default_owner='seller').run()
+            self.assertEqual(Product.objects.count(), 2)
+
+    def test_reused_file_deleted_before_the_chunk_commits_is_copied_again(self):
+        real_retain = retain_blobs
+
+        def retain(counts):
+            # The last product sharing the file was deleted after the worker found it stored
+            for name in counts:
+                os.unlink(os.path.join(self.media_root, name))
+            real_retain(counts)
+
+        with self.settings(MEDIA_ROOT=self.media_root), mock.patch('products.importer.retain_blobs', retain):
+            CatalogImporter(self.manifest, self.audio_dir, default_owner='seller').run()
+            loop = Product.objects.get(title='Loop')
+            self.assertTrue(os.path.exists(loop.audio_file.path))
+            self.assertEqual(AudioBlob.objects.get(name=loop.audio_file.name).ref_count, 1)
+
+    def test_malformed_jsonl_lines_are_rejected(self):
+        manifest = os.path.join(self.audio_dir, 'manifest.jsonl')
+        with open(manifest, 'w') as f:
+            f.write('{"title": "Loop", "price": "1.00"}\n{"title": "Cut off\n[1, 2]\n{"title": "Pad", "price": "2.00"}\n')
+        errors = []
+        job = CatalogImporter(manifest, self.audio_dir, default_owner='seller',
+                              on_error=lambda line, error: errors.append((line, error))).run()
+        self.assertEqual((job.rows_done, job.rows_imported, job.rows_failed), (4, 2, 2))
+        self.assertEqual([line for line, _ in errors], [2, 3])
+        self.assertTrue(errors[0][1].startswith('invalid JSON'))
+
+    def test_non_string_values_are_rejected(self):
+        manifest = os.path.join(self.audio_dir, 'manifest.jsonl')
+        rows = [
+            {'title': 123, 'price': 1}, {'title': 'Pad', 'price': 1, 'description': ['warm']},
+            {'title': 'Kick', 'price': 1, 'owner': {'name': 'seller'}}, {'title': 'Loop', 'price': 2},
+        ]
+        with open(manifest, 'w') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        errors = []
+        job = CatalogImporter(manifest, self.audio_dir, default_owner='seller',
+                              on_error=lambda line, error: errors.append((line, error))).run()
+        self.assertEqual((job.rows_done, job.rows_imported, job.rows_failed), (4, 1, 3))
+        self.assertEqual(errors, [
+            (1, 'title must be a string, got 123'),
+            (2, "description must be a string, got ['warm']"),
+            (3, "owner must be a string, got {'name': 'seller'}"),
+        ])
+
+    def test_ids_are_read_back_by_row_not_position(self):
+        owner = User.objects.get()
+        before = CatalogImporter._max_product_id()
+        # Another writer's row lands between this chunk's ids
+        Product.objects.create(title='Concurrent', description='', price=1, owner=owner)
+        products = [
+            Product(title=title, description='', price=price, owner=owner, audio_file=audio_file)
+            for title, price, audio_file in [('A', 1, 'a.wav'), ('B', 2, None), ('B', 2, None)]
+        ]
+        Product.objects.bulk_create(products)
+        expected = [product.pk for product in products]
+        for product in products:
+            product.pk = None
+
+        CatalogImporter._read_back_ids(products, before)
+        self.assertEqual(products[0].pk, expected[0])
+        self.assertEqual({product.pk for product in products[1:]}, set(expected[1:]))
+
+
+def wav_header(data_size, channels=2, sample_rate=44100, bits=16):
+    byte_rate = sample_rate * channels * bits // 8
+    return (
+        b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, channels * bits // 8, bits)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+class AudioHeaderParserTests(SimpleTestCase):
+    def parse(self, data, chunk_size=7):
+        parser = AudioHeaderParser()
+        for start in range(0, len(data), chunk_size):
+            parser.feed(data[start:start + chunk_size])
+        return parser.result()
+
+    def test_wav(self):
+        info = self.parse(wav_header(176400) + bytes(176400), chunk_size=4096)
+        self.assertEqual(info['file_format'], 'wav')
+        self.assertEqual((info['channels'], info['sample_rate'], info['bit_rate']), (2, 44100, 1411200))
+        self.assertEqual(info['duration'], 1.0)
+
+    def test_flac(self):
+        # STREAMINFO: 44.1 kHz, 2 channels, 16 bits, 88200 samples
+        packed = (44100 << 44) | (1 << 41) | (15 << 36) | 88200
+        streaminfo = bytes(10) + packed.to_bytes(8, 'big') + bytes(16)
+        info = self.parse(b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo + bytes(1000))
+        self.assertEqual((info['file_format'], info['sample_rate'], info['channels'], info['duration']),
+                         ('flac', 44100, 2, 2.0))
+
+    def test_mp3_after_id3_tag(self):
+        # MPEG-1 layer III, 128 kbps, 44.1 kHz, stereo, behind a 10-byte ID3v2 tag
+        frame = b'\xff\xfb\x90\x00' + bytes(15996)
+        info = self.parse(b'ID3\x04\x00\x00\x00\x00\x00\x0a' + bytes(10) + frame)
+        self.assertEqual((info['file_format'], info['bit_rate'], info['sample_rate'], info['channels']),
+                         ('mp3', 128000, 44100, 2))
+        self.assertEqual(info['duration'], 1.0)
+
+    def test_truncated_headers_parse_what_they_can(self):
+        for data, expected in [
+            (wav_header(176400)[:20], {'file_format': 'wav', 'file_size': 20}),
+            (b'fLaC\x80\x00\x00\x22' + bytes(6), {'file_format': 'flac', 'file_size': 14}),
+            (b'ID3\x04\x00\x00\x00\x00\x01\x00' + bytes(4), {'file_format': 'mp3', 'file_size': 14}),
+            (b'\xff\xfb\x90', {'file_format': None, 'file_size': 3}),
+            (b'', {'file_format': None, 'file_size': 0}),
+        ]:
+            with self.subTest(data=data[:12]):
+                self.assertEqual(self.parse(data), expected)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.parse(b'OggS' + bytes(100))['file_format'], None)
+
+
+class AudioUploadHandlerTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_authenticate(User.objects.create_user('seller', 'seller@example.com', 'pass'))
+
+    def upload(self, data, name='take.wav'):
+        upload = io.BytesIO(data)
+        upload.name = name
+        return self.client.post('/api/products/', {
+            'title': 'Take', 'description': 'Take', 'price': '1.00', 'audio_file': upload,
+        }, format='multipart')
+
+    def test_metadata_is_parsed_while_streaming(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(wav_header(88200) + bytes(88200))
+        self.assertEqual(response.status_code, 201, response.data)
+        metadata = Product.objects.get().audio_metadata
+        self.assertEqual((metadata.status, metadata.duration, metadata.sample_rate), ('ready', 0.5, 44100))
+
+    def test_unsupported_format_is_rejected(self):
+        response = self.upload(b'OggS' + bytes(100_000))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unsupported audio format', str(response.data['audio_file']))
+        self.assertFalse(Product.objects.exists())
+
+    def test_oversize_upload_is_rejected_mid_stream(self):
+        with self.settings(MAX_AUDIO_UPLOAD_SIZE=100_000):
+            response = self.upload(wav_header(300_000) + bytes(300_000))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('File size exceeds', str(response.data['audio_file']))
+        self.assertFalse(Product.objects.exists())
+        # Nothing past the limit was kept on disk
+        temp_dir = os.path.join(self.media_root, 'tmp')
+        self.assertEqual(os.listdir(temp_dir) if os.path.isdir(temp_dir) else [], [])
+
+
+class MetadataExtractionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        with wave.open(os.path.join(self.media_root, 'good.wav'), 'wb') as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(b'\0\0\0\0' * 8000)
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        # Saving a product with audio queues its metadata row
+        self.good = Product.objects.create(title='Good', description='', price=1, owner=owner, audio_file='good.wav')
+        self.missing = Product.objects.create(
+            title='Missing', description='', price=1, owner=owner, audio_file='missing.wav'
+        )
+
+    def test_claims_are_exclusive_until_they_go_stale(self):
+        claimed = claim_pending(10)
+        self.assertEqual({metadata.product_id for metadata in claimed}, {self.good.pk, self.missing.pk})
+        self.assertEqual(set(AudioMetadata.objects.values_list('status', flat=True)), {'processing'})
+        self.assertEqual(claim_pending(10), [])
+
+        # A worker that died mid-batch leaves its rows to be reclaimed
+        AudioMetadata.objects.filter(product=self.good).update(
+            claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(seconds=1)
+        )
+        self.assertEqual([metadata.product_id for metadata in claim_pending(10)], [self.good.pk])
+
+    def test_process_pending(self):
+        self.assertEqual(process_pending(), (1, 1))
+
+        good = AudioMetadata.objects.get(product=self.good)
+        self.assertEqual((good.status, good.duration, good.channels, good.file_format), ('ready', 1.0, 2, 'wav'))
+        self.assertEqual(Product.objects.get(pk=self.good.pk).audio_duration, 1.0)
+        missing = AudioMetadata.objects.get(product=self.missing)
+        self.assertEqual((missing.status, missing.file_format, missing.duration), ('failed', 'wav', None))
+        self.assertEqual(process_pending(), (0, 0))
+
+    def test_audio_replaced_mid_extraction_is_extracted_again(self):
+        extract = metadata_module._extract
+        paths = []
+
+        def replace_while_parsing(job):
+            paths.append(os.path.basename(job[1]))
+            if len(paths) == 1:
+                self.good.audio_file = 'replaced.wav'
+                self.good.save()
+            return extract(job)
+
+        with mock.patch.object(metadata_module, '_extract', replace_while_parsing):
+            # The stale result for good.wav is dropped; replaced.wav is queued and parsed next
+            self.assertEqual(process_pending(product_ids=[self.good.pk]), (0, 1))
+        self.assertEqual(paths, ['good.wav', 'replaced.wav'])
+        good = AudioMetadata.objects.get(product=self.good)
+        self.assertEqual((good.status, good.duration), ('failed', None))
+
+
+class ChunkedUploadTests(APITestCase):
+    chunk_size = 256 * 1024
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        self.client.force_authenticate(self.owner)
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(os.urandom(16000 * 40))
+        self.audio = buffer.getvalue()
+
+    def put_chunk(self, session_id, number, body=None, checksum=None):
+        body = self.audio[number * self.chunk_size:(number + 1) * self.chunk_size] if body is None else body
+        return self.client.put(
+            f'/api/uploads/{session_id}/chunks/{number}/', body, content_type='application/octet-stream',
+            HTTP_X_UPLOAD_OFFSET=str(number * self.chunk_size),
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(body).hexdigest(),
+        )
+
+    def upload(self):
+        session = create_session(self.owner, 'master.wav', len(self.audio), self.chunk_size)
+        for number in range(3):
+            body = self.audio[number * self.chunk_size:(number + 1) * self.chunk_size]
+            write_chunk(session.pk, number, number * self.chunk_size, len(body), None, io.BytesIO(body))
+        return session
+
+    def test_upload_resume_finalize_and_attach(self):
+        response = self.client.post('/api/uploads/', {
+            'file_name': 'master.wav', 'total_size': len(self.audio), 'chunk_size': self.chunk_size,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        session_id = response.data['id']
+
+        self.assertEqual(self.put_chunk(session_id, 0).data['next_chunk'], 1)
+        # A retried chunk is acknowledged without being written twice
+        self.assertEqual(self.put_chunk(session_id, 0).data['received'], self.chunk_size)
+        self.assertEqual(self.put_chunk(session_id, 2).status_code, 409)
+        self.assertEqual(self.put_chunk(session_id, 1, checksum='0' * 64).status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{session_id}/').data['received'], self.chunk_size)
+
+        self.assertEqual(self.client.post(f'/api/uploads/{session_id}/finalize/').status_code, 409)
+        self.put_chunk(session_id, 1)
+        self.put_chunk(session_id, 2)
+        response = self.client.post(f'/api/uploads/{session_id}/finalize/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(self.audio).hexdigest())
+        self.assertEqual(response.data['audio_details']['duration'], 40)
+
+        response = self.client.post('/api/products/', {
+            'title': 'Master', 'description': 'Lossless master', 'price': '9.99', 'upload': session_id,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        product = Product.objects.get(title='Master')
+        self.assertEqual(product.audio_file.name, content_name(hashlib.sha256(self.audio).hexdigest(), 'wav'))
+        self.assertEqual(AudioBlob.objects.get(name=product.audio_file.name).ref_count, 1)
+        self.assertEqual(product.audio_metadata.status, 'ready')
+        with open(product.audio_file.path, 'rb') as f:
+            self.assertEqual(f.read(), self.audio)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_expired_sessions_are_collected(self):
+        response = self.client.post('/api/uploads/', {'file_name': 'master.wav', 'total_size': len(self.audio)})
+        session = UploadSession.objects.get(pk=response.data['id'])
+        self.assertTrue(os.path.exists(part_path(session)))
+
+        self.assertEqual(collect_expired_sessions(ttl=3600), 0)
+        UploadSession.objects.filter(pk=session.pk).update(updated_at=session.updated_at - timedelta(hours=2))
+        self.assertEqual(collect_expired_sessions(ttl=3600), 1)
+        self.assertFalse(os.path.exists(part_path(session)))
+
+    def test_deleting_a_session_removes_its_files(self):
+        writing = create_session(self.owner, 'master.wav', len(self.audio), self.chunk_size)
+        UploadSession.objects.filter(pk=writing.pk).update(status='writing')
+        self.assertEqual(self.client.delete(f'/api/uploads/{writing.pk}/').status_code, 204)
+        self.assertFalse(os.path.exists(part_path(writing)))
+
+        complete = finalize_session(self.upload().pk)
+        shared = finalize_session(self.upload().pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/uploads/{complete.pk}/').status_code, 204)
+        # Still waiting to be attached by the other session
+        self.assertTrue(audio_storage().exists(shared.stored_name))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/uploads/{shared.pk}/').status_code, 204)
+        self.assertFalse(audio_storage().exists(shared.stored_name))
+        self.assertFalse(AudioBlob.objects.exists())
+
+    def test_chunk_body_is_streamed_outside_the_row_lock(self):
+        session = create_session(self.owner, 'master.wav', len(self.audio), self.chunk_size)
+        body = self.audio[:self.chunk_size]
+        depth = len(connection.atomic_blocks)
+        test = self
+
+        class Stream(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell() == 0:
+                    test.assertEqual(len(connection.atomic_blocks), depth)
+                    test.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'writing')
+                    # A retry racing this request is turned away rather than blocked
+                    with test.assertRaises(UploadError) as raised:
+                        write_chunk(session.pk, 0, 0, len(body), None, io.BytesIO(body))
+                    test.assertEqual(raised.exception.status, 409)
+                return super().read(size)
+
+        session = write_chunk(session.pk, 0, 0, len(body), None, Stream(body))
+        self.assertEqual((session.status, session.received), ('open', self.chunk_size))
+
+    def test_stale_chunk_claim_is_taken_over(self):
+        session = create_session(self.owner, 'master.wav', len(self.audio), self.chunk_size)
+        body = self.audio[:self.chunk_size]
+        # A request that died mid-chunk
+        UploadSession.objects.filter(pk=session.pk).update(
+            status='writing', updated_at=timezone.now() - CHUNK_CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+        session = write_chunk(session.pk, 0, 0, len(body), None, io.BytesIO(body))
+        self.assertEqual((session.status, session.received), ('open', self.chunk_size))
+
+    def test_finalize_hashes_outside_the_row_lock(self):
+        session = self.upload()
+        depth = len(connection.atomic_blocks)
+        test = self
+
+        class Parser(AudioHeaderParser):
+            def feed(self, data):
+                if not self.sniffed:
+                    test.assertEqual(len(connection.atomic_blocks), depth)
+                    test.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'finalizing')
+                    with test.assertRaises(UploadError) as raised:
+                        finalize_session(session.pk)
+                    test.assertEqual(raised.exception.status, 409)
+                super().feed(data)
+
+        with mock.patch('products.chunked_uploads.AudioHeaderParser', Parser):
+            session = finalize_session(session.pk)
+        self.assertEqual((session.status, session.sha256), ('complete', hashlib.sha256(self.audio).hexdigest()))
+        self.assertEqual(finalize_session(session.pk).stored_name, session.stored_name)
+
+    def test_finalized_file_is_kept_until_attached(self):
+        session = self.upload()
+        session = finalize_session(session.pk)
+        # The last product already using the same file goes away
+        self.assertFalse(delete_if_unreferenced(session.stored_name))
+        self.assertTrue(audio_storage().exists(session.stored_name))
+
+
+class ContentAddressedStorageTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        self.client.force_authenticate(self.owner)
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(os.urandom(16000))
+        self.audio = buffer.getvalue()
+
+    def create_product(self, title):
+        upload = io.BytesIO(self.audio)
+        upload.name = f'{title}.wav'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/products/', {
+                'title': title, 'description': 'Same take', 'price': '1.00', 'audio_file': upload,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Product.objects.get(title=title)
+
+    def test_duplicate_uploads_share_one_file_until_the_last_reference_goes(self):
+        first, second = self.create_product('first'), self.create_product('second')
+        self.assertEqual(first.audio_file.name, second.audio_file.name)
+        self.assertEqual(first.audio_file.name, content_name(hashlib.sha256(self.audio).hexdigest(), 'wav'))
+        self.assertEqual(AudioBlob.objects.get(name=first.audio_file.name).ref_count, 2)
+        path = first.audio_file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(AudioBlob.objects.exists())
+
+    def test_reused_file_is_held_until_the_saving_transaction_commits(self):
+        name = self.create_product('first').audio_file.name
+        # The last reference was just dropped; its delete hasn't run yet
+        AudioBlob.objects.filter(name=name).update(ref_count=0)
+
+        storage = audio_storage()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(storage.save('take.wav', ContentFile(self.audio)), name)
+            self.assertFalse(delete_if_unreferenced(name))
+            self.assertTrue(storage.exists(name))
+        # Nothing referenced it in the end, so the hold's release deletes it
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(AudioBlob.objects.exists())
+
+
+class ProductFacetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        rows = [('Drums', 4, 'wav', 20), ('Drums', 12, 'mp3', 45), ('Bass', 30, 'wav', 200), ('Bass', 8, None, None)]
+        for i, (category, price, file_format, duration) in enumerate(rows):
+            product = Product.objects.create(
+                title=f'Track {i}', description='', price=price, category=category, owner=owner
+            )
+            if file_format:
+                AudioMetadata.objects.create(product=product, file_format=file_format, duration=duration, status='ready')
+
+    def facet(self, data, name, **match):
+        return next(entry['count'] for entry in data[name] if all(entry[k] == v for k, v in match.items()))
+
+    def test_counts_in_one_query(self):
+        data = self.assertGetWithinBudget(1, '/api/products/facets/').data
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(data['category'], [{'value': 'Bass', 'count': 2}, {'value': 'Drums', 'count': 2}])
+        self.assertEqual(self.facet(data, 'price', min=10, max=25), 1)
+        self.assertEqual(self.facet(data, 'format', value='wav'), 2)
+        self.assertEqual(self.facet(data, 'duration', min=30, max=60), 1)
+
+    def test_facets_ignore_their_own_filter(self):
+        data = self.assertGetWithinBudget(1, '/api/products/facets/', {'category': 'Drums', 'maxPrice': 10}).data
+        self.assertEqual(data['count'], 1)
+        # Other categories are counted under the price filter only
+        self.assertEqual(data['category'], [{'value': 'Bass', 'count': 1}, {'value': 'Drums', 'count': 1}])
+        # Price buckets are counted within the category only
+        self.assertEqual(self.facet(data, 'price', min=10, max=25), 1)
+        self.assertEqual(self.facet(data, 'format', value='mp3'), 0)
+
+    def test_repeat_filter_sets_are_cached(self):
+        # Authenticated requests skip the response cache but share the facet cache
+        self.client.force_authenticate(User.objects.get())
+        self.assertGetWithinBudget(1, '/api/products/facets/', {'category': 'Bass'})
+        self.assertGetWithinBudget(0, '/api/products/facets/', {'category': 'Bass'})
+
+    def test_invalid_price_is_rejected(self):
+        for url in ['/api/products/facets/', '/api/products/']:
+            for value in ['abc', 'NaN', '-1', '1e999999']:
+                with self.subTest(url=url, value=value):
+                    response = self.client.get(url, {'minPrice': value})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('minPrice', response.data)
+        response = self.client.get('/api/products/facets/', {'minPrice': '9.50', 'maxPrice': '30'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductAudioFilterTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        rows = [
+            ('wav', 44100, 20, 1411200), ('mp3', 44100, 45, 320000), ('wav', 48000, 200, 2304000),
+            (None, None, None, None),
+        ]
+        for i, (file_format, sample_rate, duration, bit_rate) in enumerate(rows):
+            product = Product.objects.create(title=f'Track {i}', description='Loop', price=10, owner=owner)
+            if file_format:
+                AudioMetadata.objects.create(
+                    product=product, file_format=file_format, sample_rate=sample_rate, duration=duration,
+                    bit_rate=bit_rate, channels=2, status='ready',
+                )
+
+    def titles(self, params):
+        response = self.assertGetWithinBudget(1, '/api/products/', {'pagination': 'cursor', **params})
+        return [product['title'] for product in response.data['results']]
+
+    def test_metadata_is_mirrored_onto_products(self):
+        product = Product.objects.get(title='Track 2')
+        self.assertEqual((product.audio_format, product.audio_sample_rate, product.audio_duration), ('wav', 48000, 200))
+        product.audio_metadata.delete()
+        product.refresh_from_db()
+        self.assertIsNone(product.audio_format)
+
+    def test_filters(self):
+        self.assertEqual(self.titles({'fileFormat': 'WAV', 'ordering': 'created_at'}), ['Track 0', 'Track 2'])
+        self.assertEqual(self.titles({'fileFormat': 'wav', 'sampleRate': 48000}), ['Track 2'])
+        self.assertEqual(self.titles({'minDuration': 30, 'maxDuration': 60}), ['Track 1'])
+        # kbps
+        self.assertEqual(self.titles({'maxBitRate': 1411.2, 'ordering': '-bit_rate'}), ['Track 0', 'Track 1'])
+        self.assertEqual(self.titles({'minBitRate': 321, 'ordering': 'bit_rate'}), ['Track 0', 'Track 2'])
+        self.assertEqual(self.titles({'channels': 1}), [])
+
+    def test_invalid_number_is_rejected(self):
+        response = self.client.get('/api/products/', {'minDuration': 'long'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('minDuration', response.data)
+
+    def test_duration_ordering_skips_unanalysed_products(self):
+        self.assertEqual(self.titles({'ordering': '-duration'}), ['Track 2', 'Track 1', 'Track 0'])
+        with mock.patch.object(KeysetPagination, 'page_size', 2):
+            response = self.client.get('/api/products/', {'ordering': 'duration', 'pagination': 'cursor'})
+            self.assertEqual([p['title'] for p in response.data['results']], ['Track 0', 'Track 1'])
+            response = self.client.get(response.data['next'])
+            self.assertEqual([p['title'] for p in response.data['results']], ['Track 2'])
+
+    def test_filters_use_indexes(self):
+        products = Product.objects.all()
+        self.assertUsesIndex(
+            products.filter(audio_format__in=['wav'], audio_sample_rate=48000, audio_duration__gte=30),
+            'product_audio_filter_idx',
+        )
+        self.assertUsesIndex(
+            products.filter(audio_duration__isnull=False).order_by('-audio_duration', '-id'), 'product_duration_id_idx'
+        )
+        self.assertUsesIndex(
+            products.filter(audio_bit_rate__isnull=False).order_by('audio_bit_rate', 'id'), 'product_bitrate_id_idx'
+        )
+
+
+class ProductProjectionTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        for i in range(12):
+            product = Product.objects.create(
+                title=f'Drum loop {i}', description='Punchy', price=f'{i * 3}.{i % 10}5',
+                category=None if i % 4 == 0 else 'Drums', owner=owner,
+                audio_file=f'audio_files/ab/{i % 3:064d}.wav' if i % 2 else '',
+            )
+            if i % 3:
+                AudioMetadata.objects.update_or_create(product=product, defaults=dict(
+                    file_format='wav', duration=i * 1.5, sample_rate=44100,
+                    bit_rate=None if i % 5 == 0 else 1411200, channels=2, file_size=1000 + i, status='ready',
+                ))
+            Product.objects.filter(pk=product.pk).update(
+                rating_count=i, rating_average=i / 3, rating_2_count=i, rating_5_count=i % 2
+            )
+
+    def assertSameJson(self, url, budget=2):
+        fast = self.assertGetWithinBudget(budget, url)
+        with mock.patch.object(ProductViewSet, 'fast_list', False):
+            self.setUp()
+            slow = self.client.get(url)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_json_is_byte_identical(self):
+        for url in [
+            '/api/products/',
+            '/api/products/?page=2',
+            '/api/products/?ordering=-rating&pagination=cursor',
+            '/api/products/?ordering=duration&pagination=cursor',
+            '/api/products/?category=Drums&ordering=price',
+        ]:
+            with self.subTest(url=url):
+                self.assertSameJson(url)
+        # Two more for the search index
+        self.assertSameJson('/api/products/?search=drum', budget=4)
+
+    def test_cursor_pages_follow_from_projected_rows(self):
+        with mock.patch.object(KeysetPagination, 'page_size', 5):
+            response = self.assertSameJson('/api/products/?ordering=price&pagination=cursor', budget=1)
+            second = self.assertSameJson(response.data['next'], budget=1)
+        self.assertEqual(len(second.data['results']), 5)
+
+    def test_sparse_fields(self):
+        response = self.assertSameJson('/api/products/?fields=id,title,price,audio_file&ordering=price')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title', 'price', 'audio_file'])
+        response = self.assertSameJson('/api/products/?fields=id,audio_details.duration&pagination=cursor', budget=1)
+        self.assertEqual(
+            [row['audio_details'] for row in response.data['results'][:3]],
+            [{'duration': 16.5}, {'duration': 15.0}, {'duration': None}],
+        )
+
+    def test_sparse_fields_skip_the_metadata_join(self):
+        for url, joined in [
+            ('/api/products/?fields=id,title', False),
+            ('/api/products/?expand=audio_details', True),
+            ('/api/products/?fields=id&expand=audio_details', True),
+        ]:
+            self.setUp()
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                self.assertEqual('audio_details' in response.data['results'][0], joined)
+                self.assertEqual('products_audiometadata' in queries[-1]['sql'], joined)
+        self.assertEqual(list(self.client.get('/api/products/?expand=').data['results'][0])[-1], 'rating_histogram')
+
+    def test_search_cursor_pages_with_sparse_fields(self):
+        with mock.patch.object(KeysetPagination, 'page_size', 5):
+            response = self.assertSameJson('/api/products/?search=drum&pagination=cursor&fields=id,title', budget=3)
+            self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+            second = self.assertSameJson(response.data['next'], budget=3)
+        ids = [row['id'] for row in response.data['results'] + second.data['results']]
+        self.assertEqual(len(set(ids)), 10)
+
+    def test_cursor_over_an_unordered_queryset_uses_the_default_ordering(self):
+        unordered = ProductViewSet.get_queryset
+        with mock.patch.object(ProductViewSet, 'get_queryset', lambda view: unordered(view).order_by()):
+            response = self.assertGetWithinBudget(1, '/api/products/', {'pagination': 'cursor', 'fields': 'id,title'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        self.assertEqual(response.data['results'][0]['id'], Product.objects.latest('created_at', 'id').pk)
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.client.get('/api/products/?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/products/?expand=owner').status_code, 400)
+
+
+class AudioStreamTests(TestCase):
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        f.write(bytes(range(256)) * 4)
+        f.close()
+        self.addCleanup(os.unlink, f.name)
+        self.path = f.name
+        self.size = 1024
+        self.mtime = int(os.stat(self.path).st_mtime)
+
+    def get(self, **headers):
+        response = stream_file(RequestFactory().get('/', **headers), self.path)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_body(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), self.size)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_single_suffix_and_open_ended_ranges(self):
+        for header, start, end in [('bytes=10-19', 10, 19), ('bytes=-100', 924, 1023), ('bytes=1000-', 1000, 1023)]:
+            with self.subTest(header=header):
+                response, body = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{self.size}')
+                self.assertEqual(response['Content-Length'], str(end - start + 1))
+                self.assertEqual(body, (bytes(range(256)) * 4)[start:end + 1])
+
+    def test_multiple_ranges_are_multipart(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-1,100-101')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertIn(b'Content-Range: bytes 0-1/1024\r\n\r\n\x00\x01', body)
+        self.assertIn(b'Content-Range: bytes 100-101/1024\r\n\r\nde', body)
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{self.size}')
+
+    def test_if_none_match(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)[0].status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.mtime))[0].status_code, 206)
+        # A stale validator, or a date that isn't the exact Last-Modified, gets the whole file
+        for if_range in ['"stale"', http_date(self.mtime + 60), http_date(self.mtime - 60)]:
+            with self.subTest(if_range=if_range):
+                response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(body), self.size)
+
+
+class WaveformTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = self.settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+
+        # One second of a full-scale square wave: +1 then -1, 4000 frames each
+        with wave.open(os.path.join(self.media_root, 'square.wav'), 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(struct.pack('<h', 32767) * 4000 + struct.pack('<h', -32768) * 4000)
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        self.product = Product.objects.create(
+            title='Square', description='', price=1, owner=owner, audio_file='square.wav'
+        )
+        self.url = f'/api/products/{self.product.pk}/waveform/'
+
+    def test_compute_peaks(self):
+        ramp = np.linspace(-1, 1, 10_000, dtype=np.float32).reshape(-1, 1)
+        whole = compute_peaks([ramp])
+        # Chunk boundaries don't move block edges
+        self.assertEqual(compute_peaks([ramp[:3000], ramp[3000:3001], ramp[3001:]]), whole)
+        for resolution, bits in WAVEFORM_LEVELS.items():
+            stored_bits, data = whole[resolution]
+            self.assertEqual(stored_bits, bits)
+            peaks = np.frombuffer(data, dtype='<i1' if bits == 8 else '<i2')
+            self.assertEqual(len(peaks), resolution * 2)
+            scale = 127 if bits == 8 else 32767
+            self.assertEqual((peaks[0], peaks[-1]), (-scale, scale))
+
+    def test_endpoint(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(self.url, {'resolution': 'many'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'resolution': 100}).status_code, 400)
+
+        self.assertEqual(compute_waveforms([self.product.pk]), (1, 0))
+        response = self.client.get(self.url, {'resolution': 256})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response['X-Waveform-Resolution'], response['X-Waveform-Bits']), ('256', '8'))
+        peaks = np.frombuffer(response.content, dtype='<i1')
+        self.assertEqual((peaks[0], peaks[1], peaks[-2], peaks[-1]), (127, 127, -127, -127))
+
+        response = self.client.get(self.url, {'resolution': 256}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_decode_failures_are_logged(self):
+        os.unlink(os.path.join(self.media_root, 'square.wav'))
+        with self.assertLogs('products.waveform', 'ERROR') as logs:
+            self.assertEqual(compute_waveforms([self.product.pk]), (0, 1))
+        self.assertIn(f'product {self.product.pk}', logs.output[0])
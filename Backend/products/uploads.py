@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+from audio_marketplace.metrics import UPLOAD_BYTES
+
+from .audio_headers import AudioHeaderParser
+
+AUDIO_UPLOAD_FIELDS = ('audio_file',)
+SUPPORTED_AUDIO_FORMATS = ('mp3', 'wav', 'flac')
+
+
+def ingest_temp_dir():
+    # Under MEDIA_ROOT so the final save is a rename rather than a copy
+    directory = os.path.join(settings.MEDIA_ROOT, 'tmp')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class IngestedAudioFile(TemporaryUploadedFile):
+    """
+    An upload that was hashed, sniffed and header-parsed while it streamed
+    to disk. ``error`` is set when the upload was rejected part way.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext, dir=ingest_temp_dir())
+        super(TemporaryUploadedFile, self).__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = None
+        self.audio_metadata = None
+        self.error = None
+
+
+class AudioIngestUploadHandler(FileUploadHandler):
+    """
+    Streams audio uploads to their final temp file in a single pass. Each
+    chunk is hashed and fed to the header parser before being written, so
+    nothing beyond the current chunk and the parsed header is held in memory.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = field_name in AUDIO_UPLOAD_FIELDS
+        if not self.active:
+            return
+
+        self.file = IngestedAudioFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash = hashlib.sha256()
+        self.parser = AudioHeaderParser()
+        self.max_size = getattr(settings, 'MAX_AUDIO_UPLOAD_SIZE', 50 * 1024 * 1024)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.file.error:
+            # Drain the rest of the upload without storing it
+            return None
+
+        self.parser.feed(raw_data)
+        if self.parser.sniffed and self.parser.format not in SUPPORTED_AUDIO_FORMATS:
+            self.file.error = f"Unsupported audio format. supported formats are: {','.join(SUPPORTED_AUDIO_FORMATS)}"
+        elif self.parser.size > self.max_size:
+            self.file.error = f"File size exceeds {self.max_size / (1024 * 1024):g}MB limit"
+        else:
+            self.hash.update(raw_data)
+            self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+
+        self.file.seek(0)
+        self.file.size = file_size
+        UPLOAD_BYTES.inc(file_size, path='multipart')
+        if not self.file.error:
+            if self.parser.format is None:
+                self.file.error = 'File is too small to be an audio file'
+            else:
+                self.file.sha256 = self.hash.hexdigest()
+                self.file.audio_metadata = self.parser.result()
+        return self.file
+
+    def upload_interrupted(self):
+        if getattr(self, 'active', False) and hasattr(self, 'file'):
+            self.file.close()
@@ -1,57 +1,47 @@
 import os
-import tempfile
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import wave
-import contextlib
-from mutagen import File as MutagenFile
+
+from django.conf import settings
+
+from audio_marketplace.timing import span
+
+from .audio_headers import AudioHeaderParser
+from .uploads import SUPPORTED_AUDIO_FORMATS
+
 
 def validate_audio_file(file):
-    valid_extensions = ['.mp3','.wav','.flac']
-    ext = os.path.splitext(file.name)[1]
+    # Uploads that went through AudioIngestUploadHandler were already checked by content
+    error = getattr(file, 'error', None)
+    if error:
+        return False, error
+
+    metadata = get_audio_metadata(file)
+    if metadata['file_format'] not in SUPPORTED_AUDIO_FORMATS:
+        return False, f"Unsupported audio format. supported formats are: {','.join(SUPPORTED_AUDIO_FORMATS)}"
+
+    max_size = getattr(settings, 'MAX_AUDIO_UPLOAD_SIZE', 50 * 1024 * 1024)
+    if file.size > max_size:
+        return False, f"File size exceeds {max_size / (1024 * 1024):g}MB limit"
 
-    if not ext.lower() in valid_extensions:
-        return False, f"Unsupported file extension. supported extensions are: {','.join(valid_extensions)}"
-    
-    if file.size > 50 * 1024 * 1024:  #(50MB)
-        return False, "File size exceeds 50MB limit"
-    
     return True, ""
     
 
 def get_audio_metadata(file):
-    metadata = {
-        'file_size': file.size,
-        'format': os.path.splitext(file.name)[1][1:],
-        'duration': 0,
-        'sample_rate': 44100
-    }
-
-    # Save to a temporary file
-    path = default_storage.save(f'tmp/{file.name}', ContentFile(file.read()))
-    temp_file_path = os.path.join(default_storage.location, path)
-
-    try:
-        if metadata['format'].lower() == 'wav':
-            with contextlib.closing(wave.open(temp_file_path, 'r')) as f:
-                frames = f.getnframes()
-                rate = f.getframerate()
-                duration = frames / float(rate)
-
-                metadata['duration'] = duration
-                metadata['sample_rate'] = rate
-        else:
-            # Use mutagen for other formats
-            audio = MutagenFile(temp_file_path)
-            if audio is not None:
-                metadata['duration'] = audio.info.length
-                if hasattr(audio.info, 'sample_rate'):
-                    metadata['sample_rate'] = audio.info.sample_rate
-    except Exception as e:
-        print(f"Error extracting audio metadata: {e}")
-        # Still return the metadata with default values
-    finally:
+    """
+    Return header metadata for an uploaded file, parsing it chunk by chunk
+    when the upload handler hasn't done so already
+    """
+    metadata = getattr(file, 'audio_metadata', None)
+    if metadata is not None:
+        return metadata
+
+    with span('audio'):
+        parser = AudioHeaderParser()
+        for chunk in file.chunks():
+            parser.feed(chunk)
         file.seek(0)  # Reset file pointer
-        default_storage.delete(path)  # Clean up
-    
-    return metadata
\ No newline at end of file
+
+    metadata = parser.result()
+    if metadata['file_format'] is None:
+        metadata['file_format'] = os.path.splitext(file.name)[1][1:].lower()
+    file.audio_metadata = metadata
+    return metadata
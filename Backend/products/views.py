@@ -1,45 +1,212 @@
-import os
+import math
+from decimal import Decimal
+
 from django.conf import settings
-from rest_framework import viewsets, status, permissions
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from rest_framework import mixins, viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from .models import Product, AudioMetadata
-from .serializers import ProductSerializer, AudioMetadataSerializer, ProductCreateSerializer
-import mutagen
+from audio_marketplace.cache import ResponseCacheMixin
+from audio_marketplace.fieldsets import SparseFieldsMixin, read_columns
+from audio_marketplace.pagination import CatalogPagination, KeysetPagination
+from audio_marketplace.timing import span
+from .chunked_uploads import UploadError, create_session, discard_session, finalize_session, write_chunk
+from .facets import get_facets
+from .models import Product, AudioMetadata, AudioWaveform, UploadSession
+from .projections import ProductProjection, ProjectedRows
+from .search import rank_products
+from .serializers import (
+    ProductSerializer, AudioMetadataSerializer, ProductCreateSerializer, UploadSessionSerializer
+)
+from .streaming import PassthroughRenderer, stream_file
+from .uploads import AudioIngestUploadHandler
+from .utils import get_audio_metadata, validate_audio_file
+from .waveform import DEFAULT_WAVEFORM_RESOLUTION, WAVEFORM_LEVELS
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CatalogPagination
+    # Anonymous catalog reads are served from the shared response cache
+    response_cache_namespaces = {'list': ('products',), 'retrieve': ('products',), 'facets': ('products',)}
+    
+    # ?ordering= values; each ends in id so keyset cursors are unique
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        'created_at': ('created_at', 'id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'rating': ('rating_average', 'rating_count', 'id'),
+        '-rating': ('-rating_average', '-rating_count', '-id'),
+        'duration': ('audio_duration', 'id'),
+        '-duration': ('-audio_duration', '-id'),
+        'bit_rate': ('audio_bit_rate', 'id'),
+        '-bit_rate': ('-audio_bit_rate', '-id'),
+    }
+    # Keyset cursors can't step over NULLs, so these orderings leave out
+    # products whose audio hasn't been analysed yet
+    ordering_requires = {
+        'duration': 'audio_duration', '-duration': 'audio_duration',
+        'bit_rate': 'audio_bit_rate', '-bit_rate': 'audio_bit_rate',
+    }
+    default_ordering = '-created_at'
+    
+    # list() builds its rows from a values() projection (products.projections)
+    # instead of running ProductSerializer per product; same JSON, less CPU
+    fast_list = True
+    
+    # ?fields= responses leave the metadata join out unless asked for it
+    expandable_fields = ('audio_details',)
+    # Columns behind ProductSerializer fields that aren't columns themselves
+    field_columns = {'rating_histogram': [f'rating_{star}_count' for star in range(1, 6)]}
+    
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        # Audio uploads are sniffed, hashed and parsed as they stream to disk
+        if self.action in ['create', 'update', 'partial_update', 'upload_audio']:
+            request._request.upload_handlers = [AudioIngestUploadHandler(request._request)]
+        return request
     
     def get_serializer_class(self):
         if self.action == 'create':
             return ProductCreateSerializer
         return ProductSerializer
     
+    def get_filters(self):
+        """
+        Active query-parameter filters by facet name, see products.facets
+        """
+        params = self.request.query_params
+        filters = {}
+        if params.get('category'):
+            filters['category'] = Q(category=params['category'])
+        
+        price = self._range_filter('price', 'minPrice', 'maxPrice', Decimal)
+        if price:
+            filters['price'] = price
+        
+        # Audio properties are mirrored onto Product (see products.metadata.copy_to_products)
+        # so these filter and sort on indexed columns without joining audio_metadata
+        if params.get('fileFormat'):
+            formats = [value.strip().lower() for value in params['fileFormat'].split(',') if value.strip()]
+            filters['format'] = Q(audio_format__in=formats)
+        
+        duration = self._range_filter('audio_duration', 'minDuration', 'maxDuration', float)
+        if duration:
+            filters['duration'] = duration
+        
+        if params.get('sampleRate'):
+            filters['sample_rate'] = Q(audio_sample_rate=self._number_param('sampleRate', int))
+        
+        # Bit rates are stored in bits per second but filtered in kbps (?minBitRate=320)
+        bit_rate = self._range_filter('audio_bit_rate', 'minBitRate', 'maxBitRate', lambda value: float(value) * 1000)
+        if bit_rate:
+            filters['bit_rate'] = bit_rate
+        
+        if params.get('channels'):
+            filters['channels'] = Q(audio_channels=self._number_param('channels', int))
+        return filters
+    
+    def _number_param(self, name, parse):
+        try:
+            value = parse(self.request.query_params[name])
+            if not math.isfinite(value) or value < 0:
+                raise ValueError(value)
+        except (ValueError, ArithmeticError):
+            # ArithmeticError covers decimal.InvalidOperation
+            raise ValidationError({name: "A valid number is required."})
+        return value
+    
+    def _range_filter(self, field, min_param, max_param, parse):
+        q = Q()
+        if self.request.query_params.get(min_param):
+            q &= Q(**{f'{field}__gte': self._number_param(min_param, parse)})
+        if self.request.query_params.get(max_param):
+            q &= Q(**{f'{field}__lte': self._number_param(max_param, parse)})
+        return q
+    
     def get_queryset(self):
         queryset = Product.objects.all()
         
+        # Only the columns the (possibly sparse) serializer reads; metadata in
+        # the same joined query instead of one query per product
+        if self.action in ['list', 'retrieve']:
+            columns, related = read_columns(self.read_serializer(), self.field_columns)
+            if related:
+                queryset = queryset.select_related(*related)
+            queryset = queryset.only(*columns)
+        
         # Apply filters based on query parameters
-        category = self.request.query_params.get('category')
         search = self.request.query_params.get('search')
-        min_price = self.request.query_params.get('minPrice')
-        max_price = self.request.query_params.get('maxPrice')
+        ordering = self.request.query_params.get('ordering')
         
-        if category:
-            queryset = queryset.filter(category=category)
+        for q in self.get_filters().values():
+            queryset = queryset.filter(q)
         if search:
-            queryset = queryset.filter(title__icontains=search)
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+            # Ranked through the inverted index, after the filters above
+            queryset = rank_products(queryset, search)
+        
+        # Search results keep their relevance order unless a sort is requested
+        if search and ordering not in self.orderings:
+            queryset = queryset.order_by('-search_score', 'id')
+        else:
+            if ordering in self.ordering_requires:
+                queryset = queryset.filter(**{f'{self.ordering_requires[ordering]}__isnull': False})
+            queryset = queryset.order_by(*self.orderings.get(ordering, self.orderings[self.default_ordering]))
             
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, self.projected_list)
+    
+    def projected_list(self, request):
+        projection = ProductProjection(self.read_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        cursor = self.paginator is not None and self.paginator.use_cursor(request)
+        # Keyset cursors read their position from the rows, so the columns of
+        # the ordering the paginator will apply (its default if none) ride along
+        ordering = KeysetPagination().get_ordering(queryset) if cursor else ()
+        ordering = ['id' if field.lstrip('-') == 'pk' else field.lstrip('-') for field in ordering]
+        columns = tuple(dict.fromkeys([*projection.columns, *ordering]))
+        
+        if self.paginator is not None and not cursor:
+            page = self.paginate_queryset(ProjectedRows(queryset, columns))
+        else:
+            page = self.paginate_queryset(queryset.values(*columns))
+        rows = queryset.values(*columns) if page is None else page
+        with span('serialize'):
+            data = [projection(row) for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
+    # Storing the audio and referencing it commit together (see products.blobs.hold_stored_blob)
+    @transaction.atomic
     def perform_create(self, serializer):
         # Set the owner to the current user
         serializer.save(owner=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Endpoint to get result counts per category, price bucket, audio
+        format and duration bucket for the current filters
+        """
+        return self.cached_response(
+            request, lambda request: Response(get_facets(self.get_filters(), request.query_params.get('search')))
+        )
     
     @action(detail=True, methods=['get'], url_path='audio-metadata')
     def audio_metadata(self, request, pk=None):
@@ -53,54 +220,66 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({"error": "This product doesn't have an audio file"}, 
                             status=status.HTTP_404_NOT_FOUND)
         
-        # Try to get existing metadata or create new
-        try:
-            metadata = AudioMetadata.objects.get(product=product)
-        except AudioMetadata.DoesNotExist:
-            # Extract metadata from the audio file
-            metadata = self._extract_audio_metadata(product)
+        # Metadata is extracted by the background worker (extract_audio_metadata)
+        metadata = AudioMetadata.objects.filter(product=product).first()
+        if metadata is None or metadata.status in ('pending', 'processing'):
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED)
             
         serializer = AudioMetadataSerializer(metadata)
         return Response(serializer.data)
     
-    def _extract_audio_metadata(self, product):
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PassthroughRenderer])
+    def stream(self, request, pk=None):
         """
-        Extract metadata from the audio file and save it to the database
+        Endpoint to stream a product's audio file with HTTP Range support
         """
-        audio_file_path = os.path.join(settings.MEDIA_ROOT, product.audio_file.name)
-        
+        product = self.get_object()
+
+        if not product.audio_file:
+            return Response({"error": "This product doesn't have an audio file"},
+                            status=status.HTTP_404_NOT_FOUND)
+
         try:
-            # Use mutagen to extract audio metadata
-            audio = mutagen.File(audio_file_path)
-            
-            # Create or update metadata object
-            metadata, created = AudioMetadata.objects.get_or_create(product=product)
-            
-            # Extract common metadata (implementation depends on file format)
-            if hasattr(audio, 'info'):
-                metadata.duration = getattr(audio.info, 'length', None)
-                metadata.sample_rate = getattr(audio.info, 'sample_rate', None)
-                metadata.bit_rate = getattr(audio.info, 'bitrate', None)
-                metadata.channels = getattr(audio.info, 'channels', None)
-            
-            # Get file format from extension
-            if product.audio_file.name:
-                metadata.file_format = os.path.splitext(product.audio_file.name)[1][1:].lower()
-            
-            # Get file size
-            metadata.file_size = product.audio_file.size
-            
-            metadata.save()
-            return metadata
-            
-        except Exception as e:
-            # In case of error, create minimal metadata
-            metadata, created = AudioMetadata.objects.get_or_create(product=product)
-            metadata.file_format = os.path.splitext(product.audio_file.name)[1][1:].lower()
-            metadata.file_size = product.audio_file.size
-            metadata.save()
-            return metadata
-    
+            return stream_file(request, product.audio_file.path)
+        except FileNotFoundError:
+            return Response({"error": "Audio file is missing"},
+                            status=status.HTTP_404_NOT_FOUND)
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PassthroughRenderer])
+    def waveform(self, request, pk=None):
+        """
+        Endpoint to get precomputed waveform peaks as packed min/max pairs
+        """
+        product = self.get_object()
+
+        try:
+            resolution = int(request.query_params.get('resolution', DEFAULT_WAVEFORM_RESOLUTION))
+        except ValueError:
+            resolution = None
+        if resolution not in WAVEFORM_LEVELS:
+            return Response({"error": f"resolution must be one of {sorted(WAVEFORM_LEVELS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not product.audio_file:
+            return Response({"error": "This product doesn't have an audio file"},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        # Waveforms are computed in batch by compute_waveforms
+        waveform = AudioWaveform.objects.filter(product=product, resolution=resolution).first()
+        if waveform is None:
+            return Response({"status": "pending"}, status=status.HTTP_202_ACCEPTED)
+
+        etag = f'"{product.pk}-{resolution}-{int(waveform.created_at.timestamp())}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(bytes(waveform.peaks), content_type='application/octet-stream')
+            response['X-Waveform-Resolution'] = str(waveform.resolution)
+            response['X-Waveform-Bits'] = str(waveform.bits)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, max-age=86400, stale-while-revalidate=604800'
+        return response
+
     @action(detail=False, methods=['post'], url_path='upload-audio')
     def upload_audio(self, request):
         """
@@ -111,19 +290,86 @@ class ProductViewSet(viewsets.ModelViewSet):
                            status=status.HTTP_400_BAD_REQUEST)
             
         audio_file = request.FILES['audio_file']
+        valid, error = validate_audio_file(audio_file)
+        if not valid:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Save the file temporarily
-        file_path = os.path.join(settings.MEDIA_ROOT, 'temp', audio_file.name)
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        metadata = get_audio_metadata(audio_file)
         
-        with open(file_path, 'wb+') as destination:
-            for chunk in audio_file.chunks():
-                destination.write(chunk)
+        # Name the file by content so re-uploads don't pile up copies; saving
+        # moves the streamed temp file into place instead of copying it
+        name = f"temp/{audio_file.sha256}.{metadata['file_format']}"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, audio_file)
         
         # Return the file path to be used later when creating the product
         return Response({
             "file_name": audio_file.name,
-            "file_path": file_path,
+            "file_path": default_storage.path(name),
             "file_size": audio_file.size,
-            "file_type": audio_file.content_type
-        })
\ No newline at end of file
+            "file_type": audio_file.content_type,
+            "sha256": audio_file.sha256,
+            "audio_details": metadata,
+        })
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads: create a session, PUT its chunks in order, then
+    finalize and pass the session id as ``upload`` when saving a product
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = create_session(
+            owner=self.request.user,
+            file_name=data['file_name'],
+            total_size=data['total_size'],
+            chunk_size=data.get('chunk_size', getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)),
+        )
+
+    def perform_destroy(self, instance):
+        discard_session(instance)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<number>\d+)')
+    def chunk(self, request, pk=None, number=None):
+        """
+        Endpoint to store one chunk. Headers: X-Upload-Offset (required) and
+        X-Chunk-SHA256 (hex digest of the body, recommended)
+        """
+        session = self.get_object()
+        try:
+            offset = int(request.META['HTTP_X_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({"error": "X-Upload-Offset and Content-Length headers are required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session = write_chunk(
+                session.pk, int(number), offset, length, request.META.get('HTTP_X_CHUNK_SHA256'), request.stream
+            )
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response(self.get_serializer(session).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """
+        Endpoint to complete an upload once every chunk has been received
+        """
+        session = self.get_object()
+        try:
+            session = finalize_session(session.pk)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response({
+            **self.get_serializer(session).data,
+            "audio_details": session.audio_metadata,
+        })
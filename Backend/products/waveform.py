@@ -0,0 +1,165 @@
+import contextlib
+import logging
+import os
+import subprocess
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import AudioWaveform, Product
+
+logger = logging.getLogger(__name__)
+
+# Peak pairs per level -> bits per stored value
+WAVEFORM_LEVELS = {256: 8, 1024: 8, 4096: 16}
+DEFAULT_WAVEFORM_RESOLUTION = 1024
+
+# Frames reduced to one min/max pair before the levels are built
+BLOCK_FRAMES = 256
+CHUNK_FRAMES = BLOCK_FRAMES * 256
+
+DEFAULT_DECODERS = {
+    'wav': 'products.waveform.decode_wav',
+    'mp3': 'products.waveform.decode_with_ffmpeg',
+    'flac': 'products.waveform.decode_with_ffmpeg',
+}
+
+
+def _pcm_to_float(raw, sample_width, channels):
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif sample_width == 3:
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = packed[:, 0] | (packed[:, 1] << 8) | (packed[:, 2] << 16)
+        samples = np.where(values & 0x800000, values - 0x1000000, values).astype(np.float32) / 8388608
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    return samples.reshape(-1, channels)
+
+
+def decode_wav(path):
+    """
+    Yield (frames, channels) float32 arrays from a PCM WAV file
+    """
+    with contextlib.closing(wave.open(path, 'rb')) as f:
+        channels, sample_width = f.getnchannels(), f.getsampwidth()
+        while True:
+            raw = f.readframes(CHUNK_FRAMES)
+            if not raw:
+                break
+            yield _pcm_to_float(raw, sample_width, channels)
+
+
+def decode_with_ffmpeg(path):
+    """
+    Yield mono float32 arrays decoded by an ffmpeg subprocess
+    """
+    process = subprocess.Popen(
+        ['ffmpeg', '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', '22050', '-'],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        carry = b''
+        while True:
+            raw = process.stdout.read(CHUNK_FRAMES * 2)
+            if not raw:
+                break
+            raw = carry + raw
+            usable = len(raw) - len(raw) % 2
+            carry = raw[usable:]
+            yield _pcm_to_float(raw[:usable], 2, 1)
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}")
+
+
+def get_decoder(file_format):
+    decoders = {**DEFAULT_DECODERS, **getattr(settings, 'WAVEFORM_DECODERS', {})}
+    if file_format not in decoders:
+        raise ValueError(f"No waveform decoder for '{file_format}' files")
+    return import_string(decoders[file_format])
+
+
+def compute_peaks(chunks, levels=WAVEFORM_LEVELS):
+    """
+    Reduce decoded chunks to per-block min/max values, then build each level
+    from those blocks. Only one chunk and the block arrays are held at once.
+    """
+    block_mins, block_maxs = [], []
+    carry = None
+    for chunk in chunks:
+        samples = chunk if carry is None else np.concatenate([carry, chunk])
+        usable = len(samples) - len(samples) % BLOCK_FRAMES
+        if usable:
+            blocks = samples[:usable].reshape(usable // BLOCK_FRAMES, -1)
+            block_mins.append(blocks.min(axis=1))
+            block_maxs.append(blocks.max(axis=1))
+        carry = samples[usable:]
+    if carry is not None and len(carry):
+        block_mins.append(np.array([carry.min()], dtype=np.float32))
+        block_maxs.append(np.array([carry.max()], dtype=np.float32))
+
+    mins = np.concatenate(block_mins) if block_mins else np.zeros(1, dtype=np.float32)
+    maxs = np.concatenate(block_maxs) if block_maxs else np.zeros(1, dtype=np.float32)
+
+    peaks = {}
+    for resolution, bits in levels.items():
+        starts = np.linspace(0, len(mins), resolution, endpoint=False).astype(np.intp)
+        level_mins = np.minimum.reduceat(mins, starts)
+        level_maxs = np.maximum.reduceat(maxs, starts)
+
+        scale = 127 if bits == 8 else 32767
+        dtype = '<i1' if bits == 8 else '<i2'
+        pairs = np.column_stack([level_mins, level_maxs])
+        peaks[resolution] = (bits, np.clip(np.round(pairs * scale), -scale, scale).astype(dtype).tobytes())
+    return peaks
+
+
+def _compute(job):
+    product_id, path = job
+    try:
+        file_format = os.path.splitext(path)[1][1:].lower()
+        return product_id, compute_peaks(get_decoder(file_format)(path)), None
+    except Exception as e:
+        logger.exception("Waveform decoding failed for product %s (%s)", product_id, path)
+        return product_id, None, str(e)
+
+
+def compute_waveforms(product_ids, workers=None):
+    """
+    Compute and store all waveform levels for ``product_ids``. Decoding runs
+    in a process pool when ``workers`` > 1. Returns (succeeded, failed).
+    """
+    products = Product.objects.filter(pk__in=product_ids).exclude(audio_file='').only('id', 'audio_file')
+    jobs = [(product.pk, os.path.join(settings.MEDIA_ROOT, product.audio_file.name)) for product in products]
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_compute, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = list(map(_compute, jobs))
+
+    waveforms = []
+    succeeded_ids = []
+    for product_id, peaks, error in results:
+        if error is not None:
+            continue
+        succeeded_ids.append(product_id)
+        waveforms.extend(
+            AudioWaveform(product_id=product_id, resolution=resolution, bits=bits, peaks=data)
+            for resolution, (bits, data) in peaks.items()
+        )
+
+    with transaction.atomic():
+        AudioWaveform.objects.filter(product_id__in=succeeded_ids).delete()
+        AudioWaveform.objects.bulk_create(waveforms)
+    return len(succeeded_ids), len(jobs) - len(succeeded_ids)
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild product rating aggregates from the Review table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        reviewed = reconcile_ratings(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Reconciled ratings for {reviewed} products in {elapsed:.2f}s'))
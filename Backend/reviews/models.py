@@ -15,6 +15,11 @@ class Review(models.Model):
     
     class Meta:
         unique_together = ('product', 'user')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_id_idx'),
+            # A product's reviews, newest first
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.user.username} for {self.product.title}"
\ No newline at end of file
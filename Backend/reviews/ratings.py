@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, When
+from django.db.models.functions import Cast
+
+from audio_marketplace.cache import bump_generation
+from products.models import Product
+from .models import Review
+
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_average'] + [f'rating_{star}_count' for star in range(1, 6)]
+
+
+def _apply(product_id, rating, delta):
+    """
+    Add (delta=1) or remove (delta=-1) one rating from a product's
+    aggregates with F() expressions, so concurrent reviews don't race
+    """
+    Product.objects.filter(pk=product_id).update(**{
+        'rating_count': F('rating_count') + delta,
+        'rating_sum': F('rating_sum') + delta * rating,
+        f'rating_{rating}_count': F(f'rating_{rating}_count') + delta,
+    })
+    # Separate statement: MySQL and SQLite disagree on whether SET sees new values
+    Product.objects.filter(pk=product_id).update(rating_average=Case(
+        When(rating_count=0, then=0.0),
+        default=Cast(F('rating_sum'), FloatField()) / F('rating_count'),
+        output_field=FloatField(),
+    ))
+
+
+def rating_added(review):
+    with transaction.atomic():
+        _apply(review.product_id, review.rating, 1)
+
+
+def rating_removed(review):
+    with transaction.atomic():
+        _apply(review.product_id, review.rating, -1)
+
+
+def rating_changed(old_product_id, old_rating, review):
+    if (old_product_id, old_rating) == (review.product_id, review.rating):
+        return
+    with transaction.atomic():
+        _apply(old_product_id, old_rating, -1)
+        _apply(review.product_id, review.rating, 1)
+
+
+def reconcile_ratings(batch_size=1000):
+    """
+    Recompute every product's rating aggregates from the Review table.
+    Returns the number of products that have reviews.
+    """
+    aggregates = {}
+    rows = Review.objects.values('product_id', 'rating').annotate(total=Count('id')).order_by()
+    for row in rows:
+        histogram = aggregates.setdefault(row['product_id'], dict.fromkeys(range(1, 6), 0))
+        histogram[row['rating']] = row['total']
+
+    products = []
+    for product_id, histogram in aggregates.items():
+        product = Product(pk=product_id)
+        product.rating_count = sum(histogram.values())
+        product.rating_sum = sum(star * count for star, count in histogram.items())
+        product.rating_average = product.rating_sum / product.rating_count
+        for star, count in histogram.items():
+            setattr(product, f'rating_{star}_count', count)
+        products.append(product)
+
+    with transaction.atomic():
+        Product.objects.update(**{field: 0 for field in RATING_FIELDS})
+        Product.objects.bulk_update(products, RATING_FIELDS, batch_size=batch_size)
+        bump_generation('products')
+    return len(products)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from audio_marketplace.timing import TimedSerializerMixin
 from .models import Review
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source='user.username')
     
     class Meta:
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from audio_marketplace.cache import bump_generation
+from .models import Review
+
+
+# Reviews also change the rating aggregates served with products
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_responses(sender, **kwargs):
+    bump_generation('reviews', 'products')
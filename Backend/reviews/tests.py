@@ -1,3 +1,131 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from audio_marketplace.testing import QueryBudgetTestCase
+from products.models import Product
+from .models import Review
+from .ratings import reconcile_ratings
+from .views import ReviewViewSet
+
+
+class ReviewQueryBudgetTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        cls.product = Product.objects.create(title='Track', description='', price=1, owner=owner)
+        for i in range(20):
+            user = User.objects.create_user(f'listener{i}', f'listener{i}@example.com', 'pass')
+            Review.objects.create(product=cls.product, user=user, rating=i % 5 + 1, comment='')
+
+    def test_list(self):
+        response = self.assertGetWithinBudget(2, '/api/reviews/')
+        self.assertTrue(response.data['results'][0]['username'].startswith('listener'))
+
+    def test_list_for_product(self):
+        self.assertGetWithinBudget(2, '/api/reviews/', {'product': self.product.pk})
+
+    def test_sparse_fields_skip_the_user_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reviews/', {'fields': 'id,rating'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'rating'})
+        self.assertNotIn('auth_user', queries[-1]['sql'])
+        self.assertNotIn('comment', queries[-1]['sql'])
+
+
+class RatingAggregateTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('seller', 'seller@example.com', 'pass')
+        cls.product = Product.objects.create(title='Track', description='', price=1, owner=owner)
+        cls.other = Product.objects.create(title='Other', description='', price=1, owner=owner)
+        cls.listeners = [
+            User.objects.create_user(f'listener{i}', f'listener{i}@example.com', 'pass')
+            for i in range(3)
+        ]
+
+    def review(self, user, rating, product=None):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/reviews/', {
+            'product': (product or self.product).pk, 'rating': rating, 'comment': 'Nice',
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def assertRatings(self, product, count, average, histogram):
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, count)
+        self.assertAlmostEqual(product.rating_average, average)
+        self.assertEqual(product.rating_sum, sum(star * n for star, n in zip(range(1, 6), histogram)))
+        self.assertEqual([getattr(product, f'rating_{star}_count') for star in range(1, 6)], histogram)
+
+    def test_create_adds_to_the_aggregates(self):
+        self.review(self.listeners[0], 5)
+        self.review(self.listeners[1], 2)
+        self.assertRatings(self.product, 2, 3.5, [0, 1, 0, 0, 1])
+
+    def test_update_moves_the_rating(self):
+        review_id = self.review(self.listeners[0], 5)
+        self.review(self.listeners[1], 4)
+        response = self.client.patch(f'/api/reviews/{review_id}/', {'rating': 1})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(self.listeners[0])
+        response = self.client.patch(f'/api/reviews/{review_id}/', {'rating': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertRatings(self.product, 2, 2.5, [1, 0, 0, 1, 0])
+
+    def test_update_moves_the_rating_between_products(self):
+        review_id = self.review(self.listeners[0], 3)
+        response = self.client.patch(f'/api/reviews/{review_id}/', {'product': self.other.pk, 'rating': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertRatings(self.product, 0, 0.0, [0, 0, 0, 0, 0])
+        self.assertRatings(self.other, 1, 4.0, [0, 0, 0, 1, 0])
+
+    def test_delete_removes_the_rating(self):
+        self.review(self.listeners[0], 5)
+        review_id = self.review(self.listeners[1], 3)
+        response = self.client.delete(f'/api/reviews/{review_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertRatings(self.product, 1, 5.0, [0, 0, 0, 0, 1])
+
+        self.client.force_authenticate(self.listeners[0])
+        review_id = Review.objects.get(user=self.listeners[0]).pk
+        self.client.delete(f'/api/reviews/{review_id}/')
+        self.assertRatings(self.product, 0, 0.0, [0, 0, 0, 0, 0])
+
+    def test_concurrent_edits_apply_each_delta_once(self):
+        review_id = self.review(self.listeners[0], 5)
+        # Read by a request that is still in flight while another one changes the rating
+        stale = Review.objects.get(pk=review_id)
+        self.client.patch(f'/api/reviews/{review_id}/', {'rating': 1})
+
+        with mock.patch.object(ReviewViewSet, 'get_object', return_value=stale):
+            response = self.client.patch(f'/api/reviews/{review_id}/', {'rating': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertRatings(self.product, 1, 3.0, [0, 0, 1, 0, 0])
+
+    def test_concurrent_deletes_remove_the_rating_once(self):
+        review_id = self.review(self.listeners[0], 5)
+        self.review(self.listeners[1], 4)
+        self.client.force_authenticate(self.listeners[0])
+        stale = Review.objects.get(pk=review_id)
+        self.client.delete(f'/api/reviews/{review_id}/')
+
+        with mock.patch.object(ReviewViewSet, 'get_object', return_value=stale):
+            response = self.client.delete(f'/api/reviews/{review_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertRatings(self.product, 1, 4.0, [0, 0, 0, 1, 0])
+
+    def test_reconcile_fixes_drift(self):
+        self.review(self.listeners[0], 4)
+        self.review(self.listeners[1], 2)
+        # Rows written around the API, as a failed deploy or a manual fix would
+        Review.objects.create(product=self.product, user=self.listeners[2], rating=3, comment='')
+        Product.objects.filter(pk=self.other.pk).update(rating_count=7, rating_sum=9, rating_average=1.3, rating_1_count=7)
+
+        self.assertEqual(reconcile_ratings(), 1)
+        self.assertRatings(self.product, 3, 3.0, [0, 1, 1, 1, 0])
+        self.assertRatings(self.other, 0, 0.0, [0, 0, 0, 0, 0])
@@ -1,20 +1,59 @@
+from django.db import transaction
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
+from audio_marketplace.cache import ResponseCacheMixin
+from audio_marketplace.fieldsets import SparseFieldsMixin, read_columns
+from audio_marketplace.pagination import CatalogPagination
 from .models import Review
+from .ratings import rating_added, rating_changed, rating_removed
 from .serializers import ReviewSerializer
 from .permissions import IsReviewOwnerOrReadOnly
 
 # Create your views here.
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseFieldsMixin, ResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsReviewOwnerOrReadOnly]
+    pagination_class = CatalogPagination
+    response_cache_namespaces = {'list': ('reviews',)}
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by('-created_at', '-id')
+        # username comes from the user row; join it rather than query per
+        # review, unless ?fields= leaves it out
+        columns, related = read_columns(self.read_serializer())
+        if related:
+            queryset = queryset.select_related(*related)
+        if self.request.method == 'GET':
+            # Writes load whole rows: save() on a deferred instance skips the deferred columns
+            queryset = queryset.only(*columns)
         product_id = self.request.query_params.get('product', None)
         
         if product_id:
             queryset = queryset.filter(product_id=product_id)
             
         return queryset
+    
+    # Product rating aggregates change in the same transaction as the review
+    @transaction.atomic
+    def perform_create(self, serializer):
+        review = serializer.save()
+        rating_added(review)
+    
+    # Deltas come from the locked row: a concurrent edit or delete of the
+    # same review may have changed it since get_object() read it
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.instance = Review.objects.select_for_update().get(pk=serializer.instance.pk)
+        old_product_id, old_rating = serializer.instance.product_id, serializer.instance.rating
+        review = serializer.save()
+        rating_changed(old_product_id, old_rating, review)
+    
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance = Review.objects.select_for_update().filter(pk=instance.pk).first()
+        if instance is None:
+            # Deleted by a concurrent request, which already removed the rating
+            return
+        rating_removed(instance)
+        instance.delete()